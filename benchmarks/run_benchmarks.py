@@ -0,0 +1,311 @@
+"""
+Benchmarks sem janela (QT_QPA_PLATFORM=offscreen) em mapas sintéticos.
+
+Mede salvar/carregar (PersistenceManager), open_project/save_project da
+janela principal, arraste via itemChange com conexões, renderização da
+InfiniteCanvas num QImage e exclusão em massa. O resultado sai em JSON;
+com --baseline, compara com uma execução anterior e aponta regressões.
+
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output atual.json
+    python benchmarks/run_benchmarks.py --baseline base.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt, QEventLoop, QSize, QTimer
+from PySide6.QtGui import QImage, QPainter
+
+from core.records import NodeRecord, ConnectionRecord
+from core.binary_format import write_map
+from core.loader import MapLoader
+from core.scene import MindMapScene
+from core.persistence import PersistenceManager
+from core.commands import DeleteCommand, UndoHistory
+
+SIZES = (1000, 10000, 100000)
+NODE_W, NODE_H = 160, 60
+VIEWPORT = QSize(1600, 900)
+# Cor explícita (ARGB) nas conexões sintéticas: a pintura das linhas entra na medição
+EDGE_COLOR = 0xFF0078D4
+
+
+def synthetic_records(count, density=1.0, seed=1):
+    """
+    Mapa sintético: nós numa grade e density * count conexões (coloridas); as
+    primeiras formam uma árvore (pai próximo do filho), o resto liga vizinhos
+    ao acaso.
+    """
+    rng = random.Random(seed)
+    cols = max(int(count ** 0.5), 1)
+    nodes = [NodeRecord(i + 1, "ellipse" if i % 7 == 0 else "rectangle",
+                        (i % cols) * (NODE_W + 40), (i // cols) * (NODE_H + 40),
+                        NODE_W, NODE_H, f"Nó {i + 1}", None, None)
+             for i in range(count)]
+    edges = {}
+    wanted = int(round(density * count))
+    for i in range(1, count):
+        if len(edges) >= wanted:
+            break
+        edges[(i - rng.randint(1, min(i, 50)) + 1, i + 1)] = None
+    while len(edges) < min(wanted, count * (count - 1) // 2):
+        a = rng.randrange(count)
+        b = min(count - 1, max(0, a + rng.randint(-cols - 1, cols + 1)))
+        if a != b:
+            edges[(a + 1, b + 1)] = None
+    connections = [ConnectionRecord(s, t, EDGE_COLOR, "") for s, t in edges]
+    return nodes, connections
+
+
+def timed(fn, repeat=1):
+    """Mediana (ms) de repeat execuções"""
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples)
+
+
+def load_scene(scene, path):
+    scene.clear()
+    MapLoader(scene, path).run_to_completion()
+    scene.flush_connections()
+
+
+def wait_for(signal, timeout_ms=600000):
+    loop = QEventLoop()
+    signal.connect(loop.quit)
+    QTimer.singleShot(timeout_ms, loop.quit)
+    loop.exec()
+
+
+def bench_persistence(scene, fixture, workdir, repeat):
+    results = {}
+    persistence = PersistenceManager(scene)
+    load_scene(scene, fixture)
+    for ext in ("amind", "amarelo"):
+        path = os.path.join(workdir, f"saved.{ext}")
+        results[f"save_{ext}_ms"] = timed(lambda: persistence.save_to_file(path), repeat)
+        results[f"load_{ext}_ms"] = timed(lambda: load_scene(scene, path), repeat)
+    return results
+
+
+def bench_drag(scene, repeat, steps=60, selection=200, snap=False):
+    """Arrasta um bloco de nós conectados, um frame por passo (itemChange + flush das conexões)"""
+    doc = scene.document
+    rows = doc.live_rows()[:selection].tolist()
+    nodes = [doc.views[r] for r in rows]
+    scene.snapping.set_enabled(snap)
+
+    def drag():
+        origins = [(n.pos().x(), n.pos().y()) for n in nodes]
+        scene.begin_drag(nodes)
+        for step in range(1, steps + 1):
+            # Como no Qt: origem + deslocamento acumulado do mouse; com magnetismo,
+            # a posição proposta passa pelo snap_position do itemChange
+            dx, dy = 7.0 * step, 5.0 * step * (1 if step % 20 < 10 else -1)
+            for node, (x, y) in zip(nodes, origins):
+                node.setPos(x + dx, y + dy)
+            scene.flush_connections()
+        scene.end_drag()
+        for node, (x, y) in zip(nodes, origins):
+            node.setPos(x, y)
+        scene.flush_connections()
+
+    total = timed(drag, repeat)
+    scene.snapping.set_enabled(False)
+    return total / steps
+
+
+def bench_render(view, repeat, fit):
+    scene = view.scene()
+    bounds = scene.itemsBoundingRect()
+    view.resetTransform()
+    if fit:
+        view.fitInView(bounds, Qt.KeepAspectRatio)
+    else:
+        view.centerOn(bounds.center())
+    if hasattr(view, 'apply_level_of_detail'):
+        view.apply_level_of_detail()
+    image = QImage(VIEWPORT, QImage.Format_ARGB32_Premultiplied)
+
+    def render():
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        view.render(painter)
+        painter.end()
+
+    # A primeira pintura aquece os caches (sombras, glifos); fica fora da medição
+    render()
+    return timed(render, repeat)
+
+
+def bench_delete(scene, fixture, repeat, fraction=0.5):
+    stack = UndoHistory()
+    scene.undo_stack = stack
+    results = {"delete_ms": [], "delete_undo_ms": []}
+    for _ in range(repeat):
+        load_scene(scene, fixture)
+        stack.clear()
+        doc = scene.document
+        rows = doc.live_rows()
+        doomed = [doc.views[r] for r in rows[: int(len(rows) * fraction)].tolist()]
+        gc.collect()
+        started = time.perf_counter()
+        stack.push(DeleteCommand(scene, doomed))
+        results["delete_ms"].append((time.perf_counter() - started) * 1000.0)
+        started = time.perf_counter()
+        stack.undo()
+        results["delete_undo_ms"].append((time.perf_counter() - started) * 1000.0)
+    scene.undo_stack = None
+    return {k: statistics.median(v) for k, v in results.items()}
+
+
+def bench_window(fixture, workdir, repeat):
+    """open_project/save_project pela janela principal (sem os diálogos de arquivo)"""
+    from main import AmareloMainWindow
+
+    window = AmareloMainWindow()
+    window.autosave_timer.stop()
+    results = {"open_project_ms": [], "save_project_ms": [], "save_project_ui_ms": []}
+    for i in range(repeat):
+        started = time.perf_counter()
+        loader = window.open_path(fixture)
+        wait_for(loader.finished)
+        results["open_project_ms"].append((time.perf_counter() - started) * 1000.0)
+
+        window.current_file = os.path.join(workdir, f"project_{i}.amind")
+        started = time.perf_counter()
+        window.save_project()
+        # Quanto a interface fica parada (retrato) e o total até o arquivo estar no disco
+        results["save_project_ui_ms"].append((time.perf_counter() - started) * 1000.0)
+        PersistenceManager.wait_for_saves()
+        results["save_project_ms"].append((time.perf_counter() - started) * 1000.0)
+    if window.scene.journal is not None:
+        window.scene.journal.flush()
+    window.scene.journal = None
+    window.close()
+    window.deleteLater()
+    return {k: statistics.median(v) for k, v in results.items()}
+
+
+def run(sizes, density, repeat, include_window=True):
+    from main import InfiniteCanvas
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pyside": PySide6.__version__,
+            "platform": platform.platform(),
+            "density": density,
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="amarelo-bench-") as workdir:
+        for size in sizes:
+            print(f"[{size} nós] gerando mapa...", file=sys.stderr)
+            fixture = os.path.join(workdir, f"map_{size}.amind")
+            nodes, connections = synthetic_records(size, density)
+            write_map(fixture, nodes, connections)
+            del nodes, connections
+
+            scene = MindMapScene()
+            view = InfiniteCanvas(scene)
+            view.resize(VIEWPORT)
+            results = {"nodes": size}
+            results.update(bench_persistence(scene, fixture, workdir, repeat))
+            load_scene(scene, fixture)
+            results["edges"] = scene.document.edge_count
+            results["drag_step_ms"] = bench_drag(scene, repeat)
+            results["drag_step_snap_ms"] = bench_drag(scene, repeat, snap=True)
+            results["render_fit_ms"] = bench_render(view, repeat, fit=True)
+            results["render_1x_ms"] = bench_render(view, repeat, fit=False)
+            results.update(bench_delete(scene, fixture, repeat))
+            view.deleteLater()
+            scene.clear()
+            del view, scene
+            gc.collect()
+            if include_window:
+                results.update(bench_window(fixture, workdir, repeat))
+            report["results"][str(size)] = results
+            print(f"[{size} nós] " + ", ".join(f"{k}={v:.1f}" for k, v in results.items()
+                                                 if k.endswith("_ms")), file=sys.stderr)
+    return report
+
+
+def compare(current, baseline, tolerance=0.15, min_delta_ms=1.0):
+    """
+    Regressões: métricas mais lentas que a base por mais de tolerance (fração)
+    e por mais de min_delta_ms (ruído de medidas muito curtas).
+    """
+    regressions, lines = [], []
+    for size, metrics in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if base is None:
+            continue
+        for name, value in metrics.items():
+            old = base.get(name)
+            if not name.endswith("_ms") or old is None:
+                continue
+            ratio = value / old if old > 0 else float("inf")
+            regressed = value - old > min_delta_ms and ratio > 1.0 + tolerance
+            lines.append(f"{'REGRESSÃO' if regressed else 'ok':>9}  {size:>7} {name:<22} "
+                         f"{old:10.2f} -> {value:10.2f} ms ({ratio:5.2f}x)")
+            if regressed:
+                regressions.append({"size": int(size), "metric": name, "baseline_ms": old,
+                                    "current_ms": value, "ratio": ratio})
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do Amarelo Mind em mapas sintéticos")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--density", type=float, default=1.0, help="conexões por nó")
+    parser.add_argument("--repeat", type=int, default=3, help="execuções por medida (vale a mediana)")
+    parser.add_argument("--output", help="grava o resultado em JSON (senão, vai para a saída padrão)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="piora relativa aceita (0.15 = 15%%)")
+    parser.add_argument("--no-window", action="store_true", help="pula open_project/save_project")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    report = run(args.sizes, args.density, max(args.repeat, 1), include_window=not args.no_window)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions, lines = compare(report, baseline, args.tolerance)
+        report["regressions"] = regressions
+        print("\n".join(lines), file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}", file=sys.stderr)
+            status = 1
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
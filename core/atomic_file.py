@@ -0,0 +1,41 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# umask do processo, lida uma vez (os.umask só se consulta trocando o valor, e
+# as gravações rodam em threads)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _target_mode(file_path):
+    """Permissões do arquivo final: as do que já existe, ou as de um open() comum"""
+    try:
+        return os.stat(file_path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_write(file_path, mode='wb', encoding=None):
+    """
+    Escreve num arquivo temporário da mesma pasta e só no fim o renomeia
+    por cima do destino: uma falha no meio da gravação não corrompe o mapa.
+    O mkstemp cria o temporário com 0600; antes da troca ele recebe as
+    permissões do destino.
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _target_mode(file_path))
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,359 @@
+"""
+Formato binário .amind (versão 2), little-endian:
+
+    cabeçalho | nós (registros fixos) | conexões (registros fixos) |
+    índice de strings (u32 * (n + 1)) | blob UTF-8 das strings | estilos
+
+Os IDs dos nós são persistentes e as conexões referenciam esses IDs.
+Textos repetidos são gravados uma única vez na tabela de strings, e cada
+nó aponta para uma tabela de estilos compartilhados (0 = só as cores).
+A versão 1 (sem estilos) continua sendo lida. O bit FLAG_FOLDED marca os
+nós cujo ramo está recolhido. Conexões sem cor própria gravam NO_COLOR.
+"""
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+from core.records import NodeRecord, ConnectionRecord
+from core.atomic_file import atomic_write
+
+MAGIC = b"AMND"
+VERSION = 2
+NO_STRING = 0xFFFFFFFF
+# Cor de conexão "padrão" (ARGB 0, transparente, não seria desenhada)
+NO_COLOR = 0
+
+KINDS = ("rectangle", "ellipse")
+FLAG_FILL = 0x01
+FLAG_FOLDED = 0x02
+
+# magic, versão, tamanho do cabeçalho, nós, conexões, strings e offsets das seções
+HEADER_V1 = struct.Struct("<4sHHIII4xQQQQ")
+# versão 2: + quantidade de estilos e offset da tabela de estilos
+HEADER = struct.Struct("<4sHHIIIIQQQQQ")
+# id, tipo, flags, estilo (1-based, 0 = nenhum), x, y, w, h, cor topo, cor base, índice do texto
+NODE = struct.Struct("<IBBHddddIII")
+# preenchimento topo/base, borda, espessura, fonte (string), cor do texto,
+# sombra: desfoque (< 0 = sem sombra), dx, dy, cor
+STYLE = struct.Struct("<IIIfIIfffI")
+MAX_STYLES = 0xFFFF
+# id origem, id destino, cor, índice do rótulo
+CONNECTION = struct.Struct("<IIII")
+
+# Os mesmos layouts como dtypes NumPy, para gravar/ler colunas inteiras de uma vez
+NODE_DTYPE = {
+    "names": ["id", "kind", "flags", "style", "x", "y", "w", "h", "fill", "fill_end", "text"],
+    "formats": ["<u4", "u1", "u1", "<u2", "<f8", "<f8", "<f8", "<f8", "<u4", "<u4", "<u4"],
+    "offsets": [0, 4, 5, 6, 8, 16, 24, 32, 40, 44, 48],
+    "itemsize": NODE.size,
+}
+CONNECTION_DTYPE = {
+    "names": ["source", "target", "color", "label"],
+    "formats": ["<u4", "<u4", "<u4", "<u4"],
+    "offsets": [0, 4, 8, 12],
+    "itemsize": CONNECTION.size,
+}
+
+
+# Nós dentro de ramos recolhidos, lidos de uma vez: linhas da tabela de nós
+# (NODE_DTYPE), textos e a tabela de estilos do arquivo (StyleKeys)
+HiddenNodes = namedtuple("HiddenNodes", "table texts styles")
+# Conexões que tocam esses nós: linhas da tabela (CONNECTION_DTYPE) e rótulos
+HiddenConnections = namedtuple("HiddenConnections", "table labels")
+
+
+def is_binary_map(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, text):
+        if not text:
+            return NO_STRING
+        idx = self.index.get(text)
+        if idx is None:
+            idx = self.index[text] = len(self.strings)
+            self.strings.append(text.encode('utf-8'))
+        return idx
+
+
+def _pack_styles(styles, strings):
+    blob = bytearray()
+    for key in styles:
+        blur, dx, dy, color = key.shadow if key.shadow is not None else (-1.0, 0.0, 0.0, 0)
+        blob += STYLE.pack(key.fill, key.fill_end, key.border, key.border_width, strings.add(key.font),
+                           key.text_color, blur, dx, dy, color)
+    return blob
+
+
+def write_map(file_path, nodes, connections):
+    """Grava NodeRecords e ConnectionRecords no formato binário"""
+    strings = _StringTable()
+    styles = {}
+    node_blob = bytearray()
+    for n in nodes:
+        flags = (FLAG_FILL if n.fill is not None else 0) | (FLAG_FOLDED if n.folded else 0)
+        fill = n.fill if n.fill is not None else 0
+        fill_end = n.fill_end if n.fill_end is not None else fill
+        style = 0
+        if n.style is not None:
+            style = styles.setdefault(n.style, len(styles) + 1)
+            style = style if style <= MAX_STYLES else 0
+        node_blob += NODE.pack(n.id, KINDS.index(n.kind) if n.kind in KINDS else 0, flags, style,
+                               n.x, n.y, n.w, n.h, fill, fill_end, strings.add(n.text))
+
+    conn_blob = bytearray()
+    for c in connections:
+        conn_blob += CONNECTION.pack(c.source_id, c.target_id, c.color if c.color is not None else NO_COLOR,
+                                     strings.add(c.label))
+
+    style_blob = _pack_styles(list(styles)[:MAX_STYLES], strings)
+    _write_sections(file_path, node_blob, conn_blob, strings, style_blob)
+
+
+def write_document(file_path, snapshot):
+    """Grava um DocumentSnapshot: as tabelas de nós e conexões saem direto dos arrays"""
+    import numpy as np
+
+    strings = _StringTable()
+    nodes = np.zeros(len(snapshot.ids), NODE_DTYPE)
+    nodes["id"] = snapshot.ids
+    nodes["kind"] = snapshot.kind
+    nodes["flags"] = np.where(snapshot.folded, FLAG_FILL | FLAG_FOLDED, FLAG_FILL)
+    for name in ("x", "y", "w", "h", "fill", "fill_end"):
+        nodes[name] = getattr(snapshot, name)
+    nodes["text"] = [strings.add(t) for t in snapshot.texts]
+    if len(snapshot.styles) <= MAX_STYLES:
+        nodes["style"] = snapshot.style + 1
+
+    conns = np.zeros(len(snapshot.edge_source), CONNECTION_DTYPE)
+    conns["source"] = snapshot.edge_source
+    conns["target"] = snapshot.edge_target
+    conns["color"] = snapshot.edge_color
+    conns["label"] = [strings.add(t) for t in snapshot.edge_labels]
+
+    style_blob = _pack_styles(snapshot.styles, strings) if len(snapshot.styles) <= MAX_STYLES else b""
+    _write_sections(file_path, nodes.tobytes(), conns.tobytes(), strings, style_blob)
+
+
+def _write_sections(file_path, node_blob, conn_blob, strings, style_blob=b""):
+    offsets, pos = [], 0
+    for s in strings.strings:
+        offsets.append(pos)
+        pos += len(s)
+    offsets.append(pos)
+
+    nodes_off = HEADER.size
+    conns_off = nodes_off + len(node_blob)
+    strings_off = conns_off + len(conn_blob)
+    blob_off = strings_off + 4 * len(offsets)
+    styles_off = blob_off + pos
+    header = HEADER.pack(MAGIC, VERSION, HEADER.size,
+                         len(node_blob) // NODE.size, len(conn_blob) // CONNECTION.size,
+                         len(strings.strings), len(style_blob) // STYLE.size,
+                         nodes_off, conns_off, strings_off, blob_off, styles_off)
+
+    with atomic_write(file_path, 'wb') as f:
+        f.write(header)
+        f.write(node_blob)
+        f.write(conn_blob)
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for s in strings.strings:
+            f.write(s)
+        f.write(style_blob)
+
+
+class BinaryMapReader:
+    """
+    Leitor via mmap: os registros são desempacotados direto do arquivo mapeado,
+    sem montar dicts intermediários. Use como context manager.
+    """
+
+    def __init__(self, file_path):
+        self._file = open(file_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version = struct.unpack_from("<4sH", self._view)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Arquivo .amind binário inválido")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"Versão de arquivo não suportada: {version}")
+        self.style_count, self._styles_off = 0, 0
+        if version == 1:
+            (_, _, _, self.node_count, self.connection_count, self.string_count,
+             self._nodes_off, self._conns_off, self._strings_off, self._blob_off) = HEADER_V1.unpack_from(self._view)
+        else:
+            (_, _, _, self.node_count, self.connection_count, self.string_count, self.style_count,
+             self._nodes_off, self._conns_off, self._strings_off, self._blob_off,
+             self._styles_off) = HEADER.unpack_from(self._view)
+        self._styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def string(self, idx):
+        if idx == NO_STRING:
+            return ""
+        start, end = struct.unpack_from("<II", self._view, self._strings_off + 4 * idx)
+        return str(self._view[self._blob_off + start:self._blob_off + end], 'utf-8')
+
+    def strings(self, indices):
+        """Várias strings de uma vez (tabelas de nós ocultos)"""
+        import numpy as np
+
+        offsets = np.frombuffer(self._view, "<u4", self.string_count + 1, self._strings_off).tolist()
+        blob = bytes(self._view[self._blob_off:self._blob_off + offsets[-1]]) if self.string_count else b""
+        return [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') if i != NO_STRING else "" for i in indices]
+
+    def styles(self):
+        """Tabela de estilos do arquivo, como StyleKeys (índice 0 = estilo 1 dos nós)"""
+        if self._styles is None:
+            from core.style_manager import StyleKey
+
+            end = self._styles_off + self.style_count * STYLE.size
+            self._styles = [
+                StyleKey(fill, fill_end, border, width, self.string(font), text_color,
+                         (blur, dx, dy, color) if blur >= 0 else None)
+                for fill, fill_end, border, width, font, text_color, blur, dx, dy, color
+                in STYLE.iter_unpack(self._view[self._styles_off:end])]
+        return self._styles
+
+    def _nodes_table(self):
+        import numpy as np
+        return np.frombuffer(self._view, NODE_DTYPE, self.node_count, self._nodes_off)
+
+    def _connections_table(self):
+        import numpy as np
+        return np.frombuffer(self._view, CONNECTION_DTYPE, self.connection_count, self._conns_off)
+
+    def hidden_mask(self):
+        """
+        Máscara (sobre a tabela de nós) dos que ficam dentro de ramos
+        recolhidos: descendentes de um nó com FLAG_FOLDED. None se não há ramo
+        recolhido. Tudo em arrays sobre o arquivo mapeado.
+        """
+        import numpy as np
+        from core.folding import branch_tree, inside_folded
+
+        table = self._nodes_table()
+        folded = table["flags"] & FLAG_FOLDED != 0
+        if not folded.any():
+            return None
+        ids, conns = table["id"], self._connections_table()
+        order = np.argsort(ids)
+        # IDs de origem/destino -> linha da tabela de nós (conexões soltas saem)
+        src = np.minimum(np.searchsorted(ids, conns["source"], sorter=order), len(ids) - 1)
+        tgt = np.minimum(np.searchsorted(ids, conns["target"], sorter=order), len(ids) - 1)
+        ok = (ids[order[src]] == conns["source"]) & (ids[order[tgt]] == conns["target"])
+        return inside_folded(*branch_tree(order[src[ok]], order[tgt[ok]], len(ids), ids), len(ids), folded)
+
+    def hidden_nodes(self, mask):
+        table = self._nodes_table()[mask]
+        return HiddenNodes(table, self.strings(table["text"].tolist()), self.styles())
+
+    def hidden_connections(self, mask):
+        """Máscara (sobre a tabela de conexões) das que tocam um nó oculto, e as conexões"""
+        import numpy as np
+
+        hidden_ids = self._nodes_table()["id"][mask]
+        conns = self._connections_table()
+        touching = np.isin(conns["source"], hidden_ids) | np.isin(conns["target"], hidden_ids)
+        table = conns[touching]
+        return touching, HiddenConnections(table, self.strings(table["label"].tolist()))
+
+    def nodes(self, skip=None):
+        """NodeRecords da tabela; skip: máscara das linhas a pular"""
+        end = self._nodes_off + self.node_count * NODE.size
+        styles = self.styles()
+        unpacked = NODE.iter_unpack(self._view[self._nodes_off:end])
+        if skip is not None:
+            unpacked = (n for n, hidden in zip(unpacked, skip.tolist()) if not hidden)
+        for node_id, kind, flags, style, x, y, w, h, fill, fill_end, text in unpacked:
+            has_fill = flags & FLAG_FILL
+            yield NodeRecord(node_id, KINDS[kind] if kind < len(KINDS) else KINDS[0], x, y, w, h,
+                             self.string(text), fill if has_fill else None, fill_end if has_fill else None,
+                             styles[style - 1] if 0 < style <= len(styles) else None,
+                             bool(flags & FLAG_FOLDED))
+
+    def connections(self, skip=None):
+        end = self._conns_off + self.connection_count * CONNECTION.size
+        unpacked = CONNECTION.iter_unpack(self._view[self._conns_off:end])
+        if skip is not None:
+            unpacked = (c for c, hidden in zip(unpacked, skip.tolist()) if not hidden)
+        for src, tgt, color, label in unpacked:
+            yield ConnectionRecord(src, tgt, color if color != NO_COLOR else None, self.string(label))
+
+
+def iter_binary_records(file_path):
+    """
+    Registros ("node" | "connection", registro, posição) no mesmo formato do
+    carregador. Os nós de ramos recolhidos saem de uma vez, como tabelas:
+    ("hidden_nodes", HiddenNodes) antes de todos e ("hidden_connections",
+    HiddenConnections) depois de todos.
+    """
+    with BinaryMapReader(file_path) as reader:
+        mask = reader.hidden_mask()
+        skip_conns = hidden_conns = None
+        pos = 0
+        if mask is not None and mask.any():
+            skip_conns, hidden_conns = reader.hidden_connections(mask)
+            pos += int(mask.sum())
+            yield "hidden_nodes", reader.hidden_nodes(mask), pos
+        for record in reader.nodes(mask if hidden_conns is not None else None):
+            pos += 1
+            yield "node", record, pos
+        for record in reader.connections(skip_conns):
+            pos += 1
+            yield "connection", record, pos
+        if hidden_conns is not None:
+            yield "hidden_connections", hidden_conns, reader.node_count + reader.connection_count
+
+
+def convert(source_path, target_path=None):
+    """Converte um mapa .amarelo ou .amind (JSON) para o formato binário"""
+    from core.loader import iter_map_records
+
+    if is_binary_map(source_path):
+        raise ValueError(f"{source_path} já está no formato binário")
+    if target_path is None:
+        target_path = os.path.splitext(source_path)[0] + ".amind"
+    with open(source_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    # IDs antigos (posição no arquivo ou id() da sessão) viram IDs persistentes 1..n
+    ids, nodes, connections = {}, [], []
+    for kind, record, _ in iter_map_records(text):
+        if kind == "node":
+            ids[record.id] = len(ids) + 1
+            nodes.append(record._replace(id=ids[record.id]))
+        elif record.source_id in ids and record.target_id in ids:
+            connections.append(record._replace(source_id=ids[record.source_id],
+                                               target_id=ids[record.target_id]))
+    write_map(target_path, nodes, connections)
+    return target_path
+
+
+if __name__ == "__main__":
+    # Uso: python -m core.binary_format mapa.amarelo [saida.amind]
+    if len(sys.argv) < 2:
+        print("Uso: python -m core.binary_format <entrada> [saida.amind]")
+        sys.exit(1)
+    print(convert(*sys.argv[1:3]))
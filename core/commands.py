@@ -1,40 +1,762 @@
-from PySide6.QtGui import QUndoCommand
+import time
+import numpy as np
+from PySide6.QtGui import QUndoCommand, QUndoStack
 from PySide6.QtCore import QPointF
+from items.shapes import StyledNode
+from items.group_item import GroupNode, detach
+from core.connection import SmartConnection
+from core.records import NodeRecord, ConnectionRecord
+from core.style_manager import StyleManager
 
-class MoveCommand(QUndoCommand):
+# Estimativa de memória de um nó (ou conexão) vivo guardado fora da cena por um comando
+ITEM_BYTES = 4096
+COMMAND_BYTES = 256
+
+
+def node_record_op(node):
+    """Operação de diário que recria o nó inteiro (usada em adição e restauração)"""
+    fill, fill_end = node.fill_colors
+    return {
+        "op": "add", "id": node.node_id,
+        "kind": node.kind,
+        "x": node.scenePos().x(), "y": node.scenePos().y(),
+        "w": node.rect().width(), "h": node.rect().height(),
+        "text": node.text_item.toPlainText(), "fill": fill, "fill_end": fill_end,
+        "style": node.style.key,
+    }
+
+
+def connection_op(op, conn):
+    return {
+        "op": op, "source": conn.source.node_id, "target": conn.target.node_id,
+        "color": conn.line_color.rgba(),
+        "label": conn.label.toPlainText() if conn.label else "",
+    }
+
+
+def node_from_op(op):
+    from core.loader import build_node
+    return build_node(NodeRecord(op["id"], op["kind"], op["x"], op["y"], op["w"], op["h"],
+                                 op["text"], op["fill"], op["fill_end"], op["style"]))
+
+
+def connection_from_op(op, nodes):
+    from core.loader import build_connection
+    return build_connection(ConnectionRecord(op["source"], op["target"], op["color"], op["label"]), nodes)
+
+
+def current_connection(scene, conn):
+    """
+    A conexão guardada, ou uma nova igual a ela se alguma ponta foi recriada
+    nesse meio tempo (ramo recolhido e expandido)
+    """
+    if conn.source.scene() is scene and conn.target.scene() is scene:
+        return conn
+    return connection_from_op(connection_op("connect", conn), scene.document.by_id)
+
+
+class JournaledCommand(QUndoCommand):
+    """Base dos comandos: ao executar ou desfazer, registra o novo estado no diário da cena"""
+    compacted = False
+
+    def __init__(self, text, scene):
+        super().__init__(text)
+        self.scene = scene
+
+    def record(self, *ops):
+        journal = getattr(self.scene, 'journal', None)
+        if journal is not None:
+            journal.record(ops)
+
+    def resolve(self, node_id):
+        """Nó vivo com o ID persistente (os comandos guardam IDs, não itens)"""
+        return self.scene.document.node(node_id)
+
+    def cost(self):
+        """Memória aproximada (bytes) retida pelo comando"""
+        return COMMAND_BYTES
+
+    def compact(self):
+        """Troca itens guardados por registros leves; devolve os bytes liberados"""
+        self.compacted = True
+        return 0
+
+
+class MoveCommand(JournaledCommand):
     """Comando para desfazer/refazer movimento de objetos"""
     def __init__(self, item, old_pos, new_pos):
-        super().__init__("Mover Objeto")
+        super().__init__("Mover Objeto", item.scene())
         self.item = item
-        self.old_pos = old_pos
-        self.new_pos = new_pos
+        self.old_pos = QPointF(old_pos)
+        self.new_pos = QPointF(new_pos)
+
+    def _apply(self, pos):
+        if hasattr(self.item, 'node_id'):
+            # O item pode ter sido recriado (ramo recolhido e expandido)
+            node = self.resolve(self.item.node_id)
+            if node is None:
+                return
+            self.item = node
+            node.setPos(pos)
+            nodes = [node]
+        else:
+            # Grupo: os membros mudaram de lugar na cena sem um comando próprio
+            self.item.setPos(pos)
+            nodes = list(getattr(self.item, 'member_nodes', lambda: ())())
+        self.record(*[{"op": "move", "id": n.node_id, "x": n.scenePos().x(), "y": n.scenePos().y()}
+                      for n in nodes])
 
     def undo(self):
-        self.item.setPos(self.old_pos)
+        self._apply(self.old_pos)
 
     def redo(self):
-        self.item.setPos(self.new_pos)
+        self._apply(self.new_pos)
+
+class MoveNodesCommand(JournaledCommand):
+    """
+    Movimento de muitos nós num só comando (arraste em grupo, setas, layout,
+    alinhamento). As posições são coordenadas da cena, como no documento.
+    Movimentos seguidos dos mesmos nós, com o mesmo texto e dentro de
+    MERGE_WINDOW segundos, se fundem num único passo de desfazer.
+    """
+    MERGE_ID = 1
+    MERGE_WINDOW = 0.6
+
+    def __init__(self, scene, nodes, old_positions, new_positions, text="Mover Objetos"):
+        super().__init__(text, scene)
+        # IDs e posições em arrays: leve mesmo com milhares de nós
+        self.node_ids = np.array([n.node_id for n in nodes], dtype=np.uint32)
+        self.old_positions = np.array(list(old_positions), dtype=float).reshape(-1, 2)
+        self.new_positions = np.array(list(new_positions), dtype=float).reshape(-1, 2)
+        self.timestamp = time.monotonic()
+
+    def _moving(self, positions):
+        """Quantos nós mudam de lugar de fato (o push depois de um arraste não move nada)"""
+        if len(self.node_ids) < self.scene.BULK_INDEX_MIN:
+            return len(self.node_ids)
+        doc = self.scene.document
+        rows = doc.rows_of_ids(self.node_ids)
+        known = rows >= 0
+        rows = rows[known]
+        return int(np.count_nonzero((doc.x[rows] != positions[known, 0]) | (doc.y[rows] != positions[known, 1])))
+
+    def _apply(self, positions):
+        ops = []
+        with self.scene.bulk_index(self._moving(positions)):
+            for node_id, (x, y) in zip(self.node_ids.tolist(), positions.tolist()):
+                node = self.resolve(node_id)
+                if node is not None:
+                    node.set_scene_pos(x, y)
+                    ops.append({"op": "move", "id": node_id, "x": x, "y": y})
+        self.record(*ops)
+
+    def undo(self):
+        self._apply(self.old_positions)
+
+    def redo(self):
+        self._apply(self.new_positions)
+
+    def id(self):
+        return self.MERGE_ID
 
-class AddNodeCommand(QUndoCommand):
+    def mergeWith(self, other):
+        if (other.text() != self.text() or other.timestamp - self.timestamp > self.MERGE_WINDOW
+                or not np.array_equal(other.node_ids, self.node_ids)):
+            return False
+        self.new_positions = other.new_positions
+        self.timestamp = other.timestamp
+        return True
+
+    def cost(self):
+        return COMMAND_BYTES + self.node_ids.nbytes + self.old_positions.nbytes + self.new_positions.nbytes
+
+class AddNodeCommand(JournaledCommand):
     """Comando para desfazer/refazer criação de objetos"""
     def __init__(self, scene, node):
-        super().__init__("Adicionar Objeto")
-        self.scene = scene
+        super().__init__("Adicionar Objeto", scene)
         self.node = node
+        self.node_id = node.node_id
+        # Depois de compactado (e desfeito), o nó é recriado a partir deste registro
+        self.op = None
+        self.undone = False
 
     def undo(self):
         # Remove o objeto da cena (Desfazer)
-        self.scene.removeItem(self.node)
+        node = self.resolve(self.node_id)
+        if node is None:
+            return
+        if self.node is None:
+            self.op = node_record_op(node)
+        else:
+            self.node = node
+        self.scene.removeItem(node)
+        self.undone = True
+        self.record({"op": "remove", "id": self.node_id})
 
     def redo(self):
         # Adiciona o objeto à cena (Redo / Execução inicial)
-        self.scene.addItem(self.node)
-        
+        self.undone = False
+        node = self.node
+        if node is None:
+            node, self.op = node_from_op(self.op), None
+        self.scene.addItem(node)
+        self.record(node_record_op(node))
+        if self.compacted:
+            return
+
         # --- REQUISITOS DE INTERAÇÃO ---
         # 1. Garante que o novo objeto seja o único selecionado
         self.scene.clearSelection()
-        self.node.setSelected(True)
-        
+        node.setSelected(True)
+
         # 2. Habilita o foco de texto imediatamente
         # Isso permite que o usuário comece a digitar sem clicar
-        self.node.text_item.setFocus()
\ No newline at end of file
+        node.text_item.setFocus()
+
+    def cost(self):
+        # Desfeito, o nó só existe aqui (removido por outro comando, é aquele que o retém)
+        if self.node is not None and self.undone:
+            return COMMAND_BYTES + ITEM_BYTES
+        return COMMAND_BYTES
+
+    def compact(self):
+        freed = self.cost() - COMMAND_BYTES
+        if self.node is not None and self.node.scene() is None:
+            self.op = node_record_op(self.node)
+        self.node = None
+        self.compacted = True
+        return freed
+
+class ResizeNodesCommand(JournaledCommand):
+    """Redimensionamento de vários nós num passo; geometria = (x, y, largura, altura)"""
+    def __init__(self, scene, nodes, old_geometries, new_geometries, text="Redimensionar Objetos"):
+        super().__init__(text, scene)
+        self.node_ids = np.array([n.node_id for n in nodes], dtype=np.uint32)
+        self.old_geometries = np.array(list(old_geometries), dtype=float).reshape(-1, 4)
+        self.new_geometries = np.array(list(new_geometries), dtype=float).reshape(-1, 4)
+
+    def _apply(self, geometries):
+        ops = []
+        for node_id, (x, y, w, h) in zip(self.node_ids.tolist(), geometries.tolist()):
+            node = self.resolve(node_id)
+            if node is None:
+                continue
+            node.set_scene_geometry(x, y, w, h)
+            ops += [{"op": "move", "id": node_id, "x": x, "y": y},
+                    {"op": "resize", "id": node_id, "w": w, "h": h}]
+        self.record(*ops)
+
+    def undo(self):
+        self._apply(self.old_geometries)
+
+    def redo(self):
+        self._apply(self.new_geometries)
+
+    def cost(self):
+        return COMMAND_BYTES + self.node_ids.nbytes + self.old_geometries.nbytes + self.new_geometries.nbytes
+
+def _geometry(geometry):
+    pos, rect = geometry
+    return pos.x(), pos.y(), rect.width(), rect.height()
+
+class ResizeCommand(ResizeNodesCommand):
+    """Comando para desfazer/refazer redimensionamento (posição + retângulo)"""
+    def __init__(self, item, old_geometry, new_geometry):
+        # Geometria = (QPointF posição, QRectF retângulo local)
+        super().__init__(item.scene(), [item], [_geometry(old_geometry)], [_geometry(new_geometry)],
+                         "Redimensionar Objeto")
+
+class TextCommand(JournaledCommand):
+    """Comando para desfazer/refazer edição do texto de um nó"""
+    def __init__(self, item, old_text, new_text):
+        super().__init__("Editar Texto", item.scene())
+        self.node_id = item.node_id
+        self.old_text = old_text
+        self.new_text = new_text
+
+    def _apply(self, text):
+        node = self.resolve(self.node_id)
+        if node is None:
+            return
+        if node.text_item.toPlainText() != text:
+            node.text_item.setPlainText(text)
+        self.record({"op": "text", "id": self.node_id, "text": text})
+
+    def undo(self):
+        self._apply(self.old_text)
+
+    def redo(self):
+        self._apply(self.new_text)
+
+    def cost(self):
+        return COMMAND_BYTES + 2 * (len(self.old_text) + len(self.new_text))
+
+class StyleNodesCommand(JournaledCommand):
+    """Troca de estilo (cor, borda, fonte, sombra) de vários nós num passo"""
+    def __init__(self, scene, nodes, old_styles, new_styles, text="Alterar Estilo"):
+        super().__init__(text, scene)
+        # Estilos internados: basta guardar os IDs do registro
+        self.node_ids = np.array([n.node_id for n in nodes], dtype=np.uint32)
+        self.old_styles = np.array([s.id for s in old_styles], dtype=np.uint32)
+        self.new_styles = np.array([s.id for s in new_styles], dtype=np.uint32)
+
+    def _apply(self, style_ids):
+        registry = StyleManager.registry
+        ops = []
+        for node_id, style_id in zip(self.node_ids.tolist(), style_ids.tolist()):
+            node = self.resolve(node_id)
+            if node is None:
+                continue
+            style = registry.get(style_id)
+            node.set_style(style)
+            ops.append({"op": "style", "id": node_id, "style": style.key})
+        self.record(*ops)
+
+    def undo(self):
+        self._apply(self.old_styles)
+
+    def redo(self):
+        self._apply(self.new_styles)
+
+    def cost(self):
+        return COMMAND_BYTES + self.node_ids.nbytes + self.old_styles.nbytes + self.new_styles.nbytes
+
+class ConnectCommand(JournaledCommand):
+    """Comando para desfazer/refazer a criação de uma conexão"""
+    def __init__(self, scene, conn):
+        super().__init__("Conectar Objetos", scene)
+        self.conn = conn
+        self.op = connection_op("connect", conn)
+
+    def _find(self):
+        doc = self.scene.document
+        return self.scene.graph.connection_between(doc.node(self.op["source"]), doc.node(self.op["target"]))
+
+    def undo(self):
+        conn = self.conn
+        if conn is None or conn.scene() is not self.scene:
+            conn = self._find()
+        if conn is None:
+            return
+        if self.conn is not None:
+            self.conn = conn
+        self.op = connection_op("connect", conn)
+        self.scene.removeItem(conn)
+        self.record(connection_op("disconnect", conn))
+
+    def redo(self):
+        conn = self.conn
+        if conn is not None:
+            conn = current_connection(self.scene, conn)
+        else:
+            conn = connection_from_op(self.op, self.scene.document.by_id)
+        if conn is None:
+            return
+        self.scene.addItem(conn)
+        self.record(connection_op("connect", conn))
+
+    def cost(self):
+        if self.conn is not None and self.conn.scene() is None:
+            return COMMAND_BYTES + ITEM_BYTES
+        return COMMAND_BYTES
+
+    def compact(self):
+        freed = self.cost() - COMMAND_BYTES
+        if self.conn is not None:
+            self.op = connection_op("connect", self.conn)
+        self.conn = None
+        self.compacted = True
+        return freed
+
+def top_groups(items):
+    """Grupos da lista que não estão dentro de outro grupo da lista"""
+    groups = [i for i in items if isinstance(i, GroupNode)]
+    return [g for g in groups if not any(other.isAncestorOf(g) for other in groups)]
+
+class GroupCommand(JournaledCommand):
+    """
+    Agrupa nós e grupos numa moldura (Ctrl+G). Os grupos não entram no
+    arquivo nem no diário: o comando guarda a moldura e os membros (nós por
+    ID) para refazer e desfazer.
+    """
+    def __init__(self, scene, items):
+        super().__init__("Agrupar Objetos", scene)
+        self.group = None
+        self.parent = None
+        self.members = self._members(items)
+
+    @staticmethod
+    def _members(items):
+        items = [i for i in items if isinstance(i, (StyledNode, GroupNode))]
+        # Só o nível de cima da seleção (membros de um grupo selecionado vão com ele)
+        return [("node", i.node_id) if isinstance(i, StyledNode) else ("group", i)
+                for i in items if not any(isinstance(o, GroupNode) and o.isAncestorOf(i) for o in items)]
+
+    def _items(self):
+        items = []
+        for kind, ref in self.members:
+            item = self.resolve(ref) if kind == "node" else ref
+            if item is not None and item.scene() is self.scene:
+                items.append(item)
+        return items
+
+    def redo(self):
+        items = self._items()
+        if not items:
+            return
+        # O grupo novo fica dentro do grupo em comum dos membros, se houver
+        parents = {i.parentItem() for i in items}
+        parent = parents.pop() if len(parents) == 1 else None
+        if self.group is None:
+            for item in items:
+                if parent is None:
+                    detach(item)
+            self.group = GroupNode(items)
+        else:
+            self.scene.addItem(self.group)
+            for item in items:
+                if parent is None:
+                    detach(item)
+                self.group.add_member(item)
+        if parent is not None and isinstance(parent, GroupNode):
+            parent.add_member(self.group)
+        self.scene.clearSelection()
+        self.group.setSelected(True)
+
+    def undo(self):
+        if self.group is not None and self.group.scene() is self.scene:
+            self.group.dissolve()
+
+    def cost(self):
+        return COMMAND_BYTES + ITEM_BYTES // 4
+
+class UngroupCommand(JournaledCommand):
+    """Desfaz grupos selecionados; os membros ficam onde estão (Ctrl+Shift+G)"""
+    def __init__(self, scene, groups):
+        super().__init__("Desagrupar Objetos", scene)
+        self.groups = [(g, None, GroupCommand._members(list(g.members))) for g in top_groups(groups)]
+
+    def redo(self):
+        placed = []
+        for group, _, members in self.groups:
+            parent = group.parentItem()
+            scene_pos = group.scenePos()
+            group.dissolve()
+            placed.append((group, (parent, scene_pos), members))
+        self.groups = placed
+
+    def undo(self):
+        for group, (parent, scene_pos), members in self.groups:
+            self.scene.addItem(group)
+            group.setPos(scene_pos)
+            for kind, ref in members:
+                item = self.resolve(ref) if kind == "node" else ref
+                if item is not None and item.scene() is self.scene:
+                    group.add_member(item)
+            if isinstance(parent, GroupNode) and parent.scene() is self.scene:
+                parent.add_member(group)
+
+    def cost(self):
+        return COMMAND_BYTES + (ITEM_BYTES // 4) * len(self.groups)
+
+class DeleteCommand(JournaledCommand):
+    """Comando para desfazer/refazer exclusão (com as conexões removidas em cascata)"""
+    def __init__(self, scene, items):
+        super().__init__("Excluir Objetos", scene)
+        items = list(items)
+        # Grupos selecionados levam junto os nós de dentro; as molduras não vão
+        # para o diário (não são salvas) e voltam por referência no desfazer
+        self.groups = top_groups(items)
+        chosen = dict.fromkeys(i for i in items if not isinstance(i, GroupNode))
+        for group in self.groups:
+            chosen.update(dict.fromkeys(group.member_nodes()))
+        self.items = list(chosen)
+        self.removed = []
+        # Grupo de cada nó excluído / (grupo, pai, posição na cena) de cada moldura
+        self.memberships = {}
+        self.group_places = []
+        # Compactado: nós por ID (na cena) ou registros (fora dela)
+        self.node_ids = [i.node_id for i in self.items if isinstance(i, StyledNode)]
+        self.edge_ids = [(i.source.node_id, i.target.node_id) for i in self.items if isinstance(i, SmartConnection)]
+        self.records = None
+        # Nós excluídos que estavam recolhidos (o ramo volta à cena antes e é
+        # recolhido de novo no desfazer) e conexões ocultas que saíram com eles
+        self.folded_ids = []
+        self.hidden_links = None
+
+    def _resolve_items(self):
+        doc, graph = self.scene.document, self.scene.graph
+        items = [n for n in map(self.resolve, self.node_ids) if n is not None]
+        for source, target in self.edge_ids:
+            conn = graph.connection_between(doc.node(source), doc.node(target))
+            if conn is not None:
+                items.append(conn)
+        return items
+
+    def _detach_groups(self, items):
+        """Solta os nós dos grupos (guardando de qual eram) e tira as molduras da cena"""
+        self.memberships = {}
+        for item in items:
+            if isinstance(item, StyledNode) and isinstance(item.parentItem(), GroupNode):
+                self.memberships[item.node_id] = detach(item)
+        self.group_places = []
+        for group in self.groups:
+            if group.scene() is self.scene:
+                self.group_places.append((group, group.parentItem(), group.scenePos()))
+                detach(group)
+                self.scene.removeItem(group)
+
+    def _restore_groups(self):
+        for group, parent, scene_pos in self.group_places:
+            self.scene.addItem(group)
+            group.setPos(scene_pos)
+            if parent is not None and parent.scene() is self.scene:
+                parent.add_member(group)
+
+    def _restore_memberships(self):
+        for node_id, group in self.memberships.items():
+            node = self.resolve(node_id)
+            if node is not None and group.scene() is self.scene:
+                group.add_member(node)
+
+    def redo(self):
+        items = self.items
+        if items is None or any(i.scene() is not self.scene for i in items):
+            # Compactado, ou com itens recriados desde então (ramo recolhido e expandido)
+            items = self._resolve_items()
+        items = self._release_branches(items)
+        self._detach_groups(items)
+        self.removed = self.scene.remove_items(items)
+        conns = [i for i in self.removed if isinstance(i, SmartConnection)]
+        nodes = [i for i in self.removed if isinstance(i, StyledNode)]
+        self.record(*[connection_op("disconnect", c) for c in conns],
+                    *[{"op": "remove", "id": n.node_id} for n in nodes])
+        if self.items is None:
+            self.records = ([node_record_op(n) for n in nodes], [connection_op("connect", c) for c in conns])
+            self.removed = []
+
+    def _release_branches(self, items):
+        """
+        Excluir um nó não leva os filhos: o ramo recolhido volta à cena. As
+        conexões ocultas que sobram (para dentro de outros ramos recolhidos)
+        saem do documento e ficam guardadas.
+        """
+        folding = getattr(self.scene, 'folding', None)
+        nodes = [i for i in items if isinstance(i, StyledNode)]
+        if folding is None or not nodes:
+            return items
+        self.folded_ids = [n.node_id for n in nodes if folding.is_folded(n)]
+        if self.folded_ids:
+            folding.unfold(self.folded_ids, batched=False)
+            self.record({"op": "fold", "ids": self.folded_ids, "folded": False})
+        self.hidden_links = self.scene.document.take_hidden_edges([n.doc_row for n in nodes])
+        return items
+
+    def _restore_branches(self):
+        doc = self.scene.document
+        if self.hidden_links is not None and len(self.hidden_links[0]):
+            source_ids, target_ids, colors, labels = self.hidden_links
+            source, target = doc.rows_of_ids(source_ids), doc.rows_of_ids(target_ids)
+            keep = (source >= 0) & (target >= 0)
+            labels = [label for label, ok in zip(labels, keep.tolist()) if ok]
+            doc.add_hidden_edges(source[keep], target[keep], colors[keep], labels)
+            self.record(*[{"op": "connect", "source": s, "target": t, "color": c or None, "label": l}
+                          for s, t, c, l in zip(source_ids[keep].tolist(), target_ids[keep].tolist(),
+                                                colors[keep].tolist(), labels)])
+        self.hidden_links = None
+        if self.folded_ids:
+            self.scene.folding.fold(self.folded_ids)
+            self.record({"op": "fold", "ids": self.folded_ids, "folded": True})
+
+    def undo(self):
+        self._restore_groups()
+        if self.records is not None:
+            self._restore_records()
+        else:
+            # Nós primeiro, depois as conexões que dependem deles
+            others = [i for i in self.removed if not isinstance(i, SmartConnection)]
+            for item in others:
+                self.scene.addItem(item)
+            conns = [current_connection(self.scene, i) for i in self.removed if isinstance(i, SmartConnection)]
+            conns = [c for c in conns if c is not None]
+            for item in conns:
+                self.scene.addItem(item)
+            self.record(*[node_record_op(n) for n in others if isinstance(n, StyledNode)],
+                        *[connection_op("connect", c) for c in conns])
+        self._restore_memberships()
+        self._restore_branches()
+
+    def _restore_records(self):
+        """Recria nós e conexões (com os mesmos IDs) a partir dos registros compactados"""
+        node_ops, conn_ops = self.records
+        self.records = None
+        for op in node_ops:
+            self.scene.addItem(node_from_op(op))
+        nodes = self.scene.document.by_id
+        for op in conn_ops:
+            conn = connection_from_op(op, nodes)
+            if conn is not None:
+                self.scene.addItem(conn)
+        self.record(*node_ops, *conn_ops)
+
+    def cost(self):
+        if self.items is None:
+            return COMMAND_BYTES + (ITEM_BYTES // 4) * (sum(map(len, self.records)) if self.records else 0)
+        return COMMAND_BYTES + ITEM_BYTES * (len(self.items) + len(self.removed))
+
+    def compact(self):
+        if self.compacted:
+            return 0
+        before = self.cost()
+        if self.removed and self.removed[0].scene() is None:
+            # Executado: os itens removidos só existem aqui
+            nodes = [i for i in self.removed if isinstance(i, StyledNode)]
+            conns = [i for i in self.removed if isinstance(i, SmartConnection)]
+            self.records = ([node_record_op(n) for n in nodes], [connection_op("connect", c) for c in conns])
+        self.items = None
+        self.removed = []
+        self.compacted = True
+        return before - self.cost()
+
+
+class FoldCommand(JournaledCommand):
+    """
+    Recolher/expandir ramos. Guarda só os IDs: o ramo oculto continua no
+    documento, e o diário registra só a troca de estado.
+    """
+    def __init__(self, scene, node_ids, folded, text=None):
+        super().__init__(text or ("Recolher Ramo" if folded else "Expandir Ramo"), scene)
+        self.node_ids = list(node_ids)
+        self.folded = folded
+        # Só a primeira expansão aparece em lotes; desfazer/refazer é imediato
+        self.batched = True
+
+    def _apply(self, folded):
+        folding = self.scene.folding
+        if folded:
+            folding.fold(self.node_ids)
+        else:
+            folding.unfold(self.node_ids, batched=self.batched)
+        self.batched = False
+        self.record({"op": "fold", "ids": self.node_ids, "folded": folded})
+
+    def undo(self):
+        self._apply(not self.folded)
+
+    def redo(self):
+        self._apply(self.folded)
+
+    def cost(self):
+        return COMMAND_BYTES + 8 * len(self.node_ids)
+
+class UndoHistory(QUndoStack):
+    """
+    Pilha de desfazer com limite de memória: passando do limite, os comandos
+    mais antigos são compactados (itens guardados viram registros e IDs),
+    sempre do mais velho para o mais novo. Os últimos KEEP_RECENT passos
+    ficam intactos.
+    """
+    DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+    KEEP_RECENT = 20
+
+    def __init__(self, parent=None, memory_limit=DEFAULT_MEMORY_LIMIT):
+        super().__init__(parent)
+        self.memory_limit = memory_limit
+        self._macro_depth = 0
+        # Custo de cada comando e o total, mantidos a cada push e a cada
+        # desfazer/refazer: somar a pilha inteira a cada push seria O(histórico)
+        self._costs = []
+        self._usage = 0
+        self._compacted = 0   # comandos do início já compactados
+        self._index = 0
+        self.indexChanged.connect(self._index_changed)
+
+    def set_memory_limit(self, limit):
+        self.memory_limit = limit
+        self.enforce_memory_limit()
+
+    @staticmethod
+    def _leaves(command):
+        """A macro conta pelos seus filhos"""
+        if command.childCount():
+            return [command.child(j) for j in range(command.childCount())]
+        return [command]
+
+    def _cost(self, command):
+        return sum(c.cost() if isinstance(c, JournaledCommand) else COMMAND_BYTES for c in self._leaves(command))
+
+    def _update_cost(self, i):
+        cost = self._cost(self.command(i))
+        self._usage += cost - self._costs[i]
+        self._costs[i] = cost
+
+    def _refresh(self, start):
+        """
+        Refaz os custos de start em diante: o push descarta os comandos à
+        frente do índice e pode fundir o novo com o anterior (mergeWith)
+        """
+        start = max(min(start, len(self._costs)), 0)
+        self._usage -= sum(self._costs[start:])
+        del self._costs[start:]
+        for i in range(start, self.count()):
+            cost = self._cost(self.command(i))
+            self._costs.append(cost)
+            self._usage += cost
+        self._compacted = min(self._compacted, start)
+
+    def _index_changed(self, index):
+        """Desfazer e refazer mudam o que os comandos percorridos retêm (um nó desfeito só existe no comando)"""
+        end = min(max(index, self._index), len(self._costs), self.count())
+        for i in range(min(index, self._index), end):
+            self._update_cost(i)
+        self._index = index
+
+    def memory_usage(self):
+        return self._usage
+
+    def enforce_memory_limit(self):
+        if self.memory_limit is None:
+            return 0
+        freed = 0
+        end = max(self.count() - self.KEEP_RECENT, 0)
+        while self._compacted < end and self._usage > self.memory_limit:
+            i = self._compacted
+            for command in self._leaves(self.command(i)):
+                if isinstance(command, JournaledCommand) and not command.compacted:
+                    command.compact()
+            before = self._costs[i]
+            self._update_cost(i)
+            freed += before - self._costs[i]
+            self._compacted += 1
+        return freed
+
+    def push(self, command):
+        # Dentro de uma macro, custos e limite são vistos só no endMacro()
+        if self._macro_depth:
+            super().push(command)
+            return
+        start = self.index() - 1
+        super().push(command)
+        self._refresh(start)
+        self.enforce_memory_limit()
+
+    def beginMacro(self, text):
+        start = self.index()
+        super().beginMacro(text)
+        if not self._macro_depth:
+            self._refresh(start)
+        self._macro_depth += 1
+
+    def endMacro(self):
+        super().endMacro()
+        self._macro_depth -= 1
+        if not self._macro_depth:
+            self._refresh(self.count() - 1)
+            self.enforce_memory_limit()
+
+    def clear(self):
+        super().clear()
+        self._costs = []
+        self._usage = 0
+        self._compacted = 0
+        self._index = 0
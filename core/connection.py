@@ -1,27 +1,158 @@
-from PySide6.QtWidgets import QGraphicsLineItem
+from PySide6.QtWidgets import QGraphicsLineItem, QGraphicsItem
 from PySide6.QtCore import QLineF, Qt
-from PySide6.QtGui import QPen, QColor
+from PySide6.QtGui import QPen, QColor, QPainterPathStroker
+from core.level_of_detail import LevelOfDetail
+from core.perf_monitor import PerfMonitor, profiled_paint, counted_item_change
+from items.connection_label import ConnectionLabel
 
 class SmartConnection(QGraphicsLineItem):
     def __init__(self, source, target):
         super().__init__()
         self.source = source
         self.target = target
+        # Geometria "suja": precisa ser recalculada antes do próximo frame
+        self._geometry_dirty = False
+        self.label = None
+        # Rota desviando dos nós (QPainterPath da cena); None = reta centro a centro
+        self.route = None
+        # Linha desta conexão no documento da cena (None enquanto fora da cena)
+        self.doc_row = None
         # Azul conforme solicitado para o ícone de conexão
-        self.setPen(QPen(QColor("#0078d4"), 3, Qt.SolidLine, Qt.RoundCap))
+        self.change_color("#0078d4")
         self.setZValue(-1) # Garante que a linha fique por baixo dos nós
         self.update_path()
 
+    def change_color(self, color):
+        self.line_color = QColor(color)
+        self.setPen(QPen(self.line_color, 3, Qt.SolidLine, Qt.RoundCap))
+        self._hairline_pen = QPen(self.line_color, 0)
+        doc = self.document()
+        if doc is not None:
+            doc.edge_color[self.doc_row] = self.line_color.rgba()
+
+    def document(self):
+        if self.doc_row is None:
+            return None
+        return getattr(self.scene(), 'document', None)
+
+    highlighted = False
+
+    def search_text(self):
+        return self.label.toPlainText() if self.label is not None else ""
+
+    def set_highlighted(self, on):
+        if on != self.highlighted:
+            self.highlighted = on
+            if self.label is not None:
+                self.label.update()
+
+    def set_label_text(self, text):
+        """Cria (ou atualiza) o texto preso no meio da linha"""
+        if self.label is None:
+            self.label = ConnectionLabel(text, self)
+        else:
+            self.label.setPlainText(text)
+        self.label.update_position()
+        doc = self.document()
+        if doc is not None:
+            doc.edge_labels[self.doc_row] = text
+        search = getattr(self.scene(), 'search', None)
+        if search is not None:
+            search.mark_dirty(self)
+
+    def invalidate(self):
+        """Marca a linha como desatualizada; o recálculo é feito em lote pela cena"""
+        if self._geometry_dirty:
+            return
+        self._geometry_dirty = True
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'schedule_connection_update'):
+            scene.schedule_connection_update(self)
+        else:
+            self.update_path()
+
     def update_path(self):
+        if PerfMonitor.enabled:
+            PerfMonitor.count_update_path()
         # Verifica se os objetos ainda existem na cena antes de calcular
         if not self.source.scene() or not self.target.scene():
             return
-            
+        self._geometry_dirty = False
+
         # Conecta o centro do objeto A ao centro do objeto B
-        line = QLineF(self.source.sceneBoundingRect().center(), 
-                      self.target.sceneBoundingRect().center())
-        self.setLine(line)
+        source_rect = self.source.sceneBoundingRect()
+        target_rect = self.target.sceneBoundingRect()
+        line = QLineF(source_rect.center(), target_rect.center())
+        router = getattr(self.scene(), 'router', None)
+        route = router.route(self, source_rect, target_rect) if router is not None else None
+        # setLine invalida o índice e agenda repintura: só chama se mudou
+        # (a rota pode mudar com as pontas paradas: um nó entrou no caminho)
+        if line != self.line() or route != self.route:
+            if route != self.route:
+                self.prepareGeometryChange()
+                self.route = route
+            self.setLine(line)
+            if self.label is not None:
+                self.label.update_position()
+
+    @counted_item_change
+    def itemChange(self, change, value):
+        # Mantém o índice de adjacência da cena em dia ao entrar/sair dela
+        if change == QGraphicsItem.ItemSceneChange:
+            graph = getattr(self.scene(), 'graph', None)
+            if graph is not None:
+                graph.remove(self)
+            router = getattr(self.scene(), 'router', None)
+            if router is not None:
+                router.forget(self)
+            doc = self.document()
+            if doc is not None:
+                doc.remove_edge(self)
+            search = getattr(self.scene(), 'search', None)
+            if search is not None:
+                search.remove(self)
+        elif change == QGraphicsItem.ItemSceneHasChanged:
+            graph = getattr(value, 'graph', None)
+            if graph is not None:
+                graph.add(self)
+            doc = getattr(value, 'document', None)
+            if doc is not None:
+                doc.add_edge(self)
+            # Só conexões com rótulo têm o que indexar
+            search = getattr(value, 'search', None)
+            if search is not None and self.label is not None:
+                search.mark_dirty(self)
+            if value is not None:
+                # Os nós podem ter entrado na cena depois da conexão ser criada
+                self._geometry_dirty = False
+                self.invalidate()
+        return super().itemChange(change, value)
+
+    def boundingRect(self):
+        if self.route is None:
+            return super().boundingRect()
+        half = self.pen().widthF() / 2
+        return self.route.controlPointRect().adjusted(-half, -half, half, half)
+
+    def shape(self):
+        if self.route is None:
+            return super().shape()
+        stroker = QPainterPathStroker()
+        stroker.setWidth(self.pen().widthF())
+        return stroker.createStroke(self.route)
 
-    def paint(self, painter, option, widget):
-        self.update_path() # Força o ajuste da linha durante o movimento (ou snap do magnetismo)
-        super().paint(painter, option, widget)
\ No newline at end of file
+    @profiled_paint
+    def paint(self, painter, option, widget=None):
+        if LevelOfDetail.draws("hairline", LevelOfDetail.from_painter(painter)):
+            if self.route is None:
+                super().paint(painter, option, widget)
+                return
+            painter.setPen(self.pen())
+        else:
+            # Mapa afastado: linha fina de 1px, independente do zoom
+            painter.setPen(self._hairline_pen)
+        painter.setBrush(Qt.NoBrush)
+        if self.route is None:
+            painter.drawLine(self.line())
+        else:
+            painter.drawPath(self.route)
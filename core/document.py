@@ -0,0 +1,471 @@
+from collections import namedtuple
+import numpy as np
+from core.style_manager import StyleManager
+
+KIND_CODES = {"rectangle": 0, "ellipse": 1}
+
+# Cópia imutável das colunas (só linhas vivas), usada ao salvar em outra thread
+DocumentSnapshot = namedtuple("DocumentSnapshot", [
+    "ids", "kind", "x", "y", "w", "h", "fill", "fill_end", "texts",
+    "edge_source", "edge_target", "edge_color", "edge_labels",
+    "style", "styles",  # índice por nó na tabela local de StyleKeys usados
+    "folded",
+])
+
+
+class MapDocument:
+    """
+    Modelo do mapa em arrays colunares (NumPy): uma linha por nó, uma por conexão.
+    Os itens da cena são vistas finas que mantêm sua linha atualizada, então
+    salvar, alinhar ou calcular limites não precisa consultar o Qt item a item.
+
+    Linhas ocultas (ramos recolhidos) continuam vivas, mas sem vista: entram
+    no arquivo e nos ramos, não na cena. live_rows()/live_edges() são só as
+    linhas à mostra.
+    """
+
+    def __init__(self, capacity=1024):
+        self._alloc_nodes(capacity)
+        self._alloc_edges(capacity)
+        # Conta as renumerações: quem guarda linhas entre eventos sabe quando refazê-las
+        self.compactions = 0
+
+    # --- Armazenamento ---
+
+    def _alloc_nodes(self, capacity):
+        self.ids = np.zeros(capacity, np.uint32)
+        self.kind = np.zeros(capacity, np.uint8)
+        self.x = np.zeros(capacity, np.float64)
+        self.y = np.zeros(capacity, np.float64)
+        self.w = np.zeros(capacity, np.float64)
+        self.h = np.zeros(capacity, np.float64)
+        self.fill = np.zeros(capacity, np.uint32)
+        self.fill_end = np.zeros(capacity, np.uint32)
+        self.style = np.zeros(capacity, np.uint32)  # ID no StyleRegistry
+        self.alive = np.zeros(capacity, bool)
+        self.folded = np.zeros(capacity, bool)   # ramo recolhido a partir deste nó
+        self.hidden = np.zeros(capacity, bool)   # dentro de um ramo recolhido (sem vista)
+        self.texts = [""] * capacity
+        self.views = [None] * capacity
+        # ID persistente -> nó (comandos de desfazer e diário resolvem nós por ID)
+        self.by_id = {}
+        # ID persistente -> linha, para os nós ocultos
+        self.hidden_ids = {}
+        self._node_end = 0
+        self._dead_nodes = 0
+
+    def _alloc_edges(self, capacity):
+        self.edge_source = np.zeros(capacity, np.int64)  # linha do nó de origem
+        self.edge_target = np.zeros(capacity, np.int64)
+        self.edge_color = np.zeros(capacity, np.uint32)
+        self.edge_alive = np.zeros(capacity, bool)
+        self.edge_hidden = np.zeros(capacity, bool)
+        self.edge_labels = [""] * capacity
+        self.edge_views = [None] * capacity
+        # Linha oculta que a próxima conexão a entrar na cena retoma (claim_edge)
+        self._claimed_edge = None
+        self._edge_end = 0
+        self._dead_edges = 0
+
+    @staticmethod
+    def _grown(array, capacity):
+        grown = np.zeros(capacity, array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _grow_nodes(self):
+        if self._dead_nodes * 2 > self._node_end:
+            self.compact()
+            if self._node_end < len(self.ids):
+                return
+        capacity = len(self.ids) * 2
+        for name in ("ids", "kind", "x", "y", "w", "h", "fill", "fill_end", "style", "alive", "folded", "hidden"):
+            setattr(self, name, self._grown(getattr(self, name), capacity))
+        self.texts.extend([""] * (capacity - len(self.texts)))
+        self.views.extend([None] * (capacity - len(self.views)))
+
+    def _grow_edges(self):
+        if self._dead_edges * 2 > self._edge_end:
+            self.compact()
+            if self._edge_end < len(self.edge_source):
+                return
+        capacity = len(self.edge_source) * 2
+        for name in ("edge_source", "edge_target", "edge_color", "edge_alive", "edge_hidden"):
+            setattr(self, name, self._grown(getattr(self, name), capacity))
+        self.edge_labels.extend([""] * (capacity - len(self.edge_labels)))
+        self.edge_views.extend([None] * (capacity - len(self.edge_views)))
+
+    def compact(self):
+        """Descarta as linhas removidas e renumera as vistas (raro: só ao crescer)"""
+        live = np.flatnonzero(self.alive[:self._node_end])
+        remap = np.full(max(self._node_end, 1), -1, np.int64)
+        remap[live] = np.arange(len(live))
+        n = len(live)
+        for name in ("ids", "kind", "x", "y", "w", "h", "fill", "fill_end", "style", "folded", "hidden"):
+            column = getattr(self, name)
+            column[:n] = column[live]
+        self.alive[:] = False
+        self.alive[:n] = True
+        self.folded[n:] = False
+        self.hidden[n:] = False
+        self.texts[:n] = [self.texts[i] for i in live]
+        self.views[:n] = [self.views[i] for i in live]
+        for i in range(n, self._node_end):
+            self.texts[i] = ""
+            self.views[i] = None
+        for row, view in enumerate(self.views[:n]):
+            if view is not None:
+                view.doc_row = row
+        self.hidden_ids = {node_id: int(remap[row]) for node_id, row in self.hidden_ids.items()}
+        self._node_end, self._dead_nodes = n, 0
+
+        # Conexões cujo nó sumiu também são descartadas
+        edge_end = self._edge_end
+        keep = (self.edge_alive[:edge_end]
+                & (remap[self.edge_source[:edge_end]] >= 0)
+                & (remap[self.edge_target[:edge_end]] >= 0))
+        for i in np.flatnonzero(self.edge_alive[:edge_end] & ~keep):
+            if self.edge_views[i] is not None:
+                self.edge_views[i].doc_row = None
+        live = np.flatnonzero(keep)
+        m = len(live)
+        self.edge_source[:m] = remap[self.edge_source[live]]
+        self.edge_target[:m] = remap[self.edge_target[live]]
+        self.edge_color[:m] = self.edge_color[live]
+        self.edge_hidden[:m] = self.edge_hidden[live]
+        self.edge_hidden[m:] = False
+        self.edge_alive[:] = False
+        self.edge_alive[:m] = True
+        self.edge_labels[:m] = [self.edge_labels[i] for i in live]
+        self.edge_views[:m] = [self.edge_views[i] for i in live]
+        for i in range(m, self._edge_end):
+            self.edge_labels[i] = ""
+            self.edge_views[i] = None
+        for row, view in enumerate(self.edge_views[:m]):
+            if view is not None:
+                view.doc_row = row
+        self._claimed_edge = None
+        self._edge_end, self._dead_edges = m, 0
+        self.compactions += 1
+
+    def clear(self):
+        for view in self.views[:self._node_end] + self.edge_views[:self._edge_end]:
+            if view is not None:
+                view.doc_row = None
+        self._alloc_nodes(len(self.ids))
+        self._alloc_edges(len(self.edge_source))
+
+    # --- Vistas (itens da cena) ---
+
+    def _new_node_row(self):
+        if self._node_end == len(self.ids):
+            self._grow_nodes()
+        row = self._node_end
+        self._node_end += 1
+        self.alive[row] = True
+        self.folded[row] = self.hidden[row] = False
+        return row
+
+    def add_node(self, node):
+        """
+        Registra o nó (chamado quando ele entra na cena) e copia seu estado.
+        Um nó oculto que volta à cena retoma a própria linha.
+        """
+        row = self.hidden_ids.pop(node.node_id, None)
+        if row is None:
+            row = self._new_node_row()
+        else:
+            self.hidden[row] = False
+        self.views[row] = node
+        self.by_id[node.node_id] = node
+        node.doc_row = row
+        self.ids[row] = node.node_id
+        self.kind[row] = KIND_CODES.get(node.kind, 0)
+        pos, rect = node.scenePos(), node.rect()
+        self.x[row], self.y[row] = pos.x(), pos.y()
+        self.w[row], self.h[row] = rect.width(), rect.height()
+        self.set_style(row, node.style)
+        self.texts[row] = node.text_item.toPlainText()
+        return row
+
+    def remove_node(self, node):
+        row = node.doc_row
+        if row is None:
+            return
+        self.alive[row] = False
+        self.views[row] = None
+        self.texts[row] = ""
+        if self.by_id.get(node.node_id) is node:
+            del self.by_id[node.node_id]
+        node.doc_row = None
+        self._dead_nodes += 1
+
+    def _new_edge_row(self):
+        if self._edge_end == len(self.edge_source):
+            self._grow_edges()
+        row = self._edge_end
+        self._edge_end += 1
+        self.edge_alive[row] = True
+        self.edge_hidden[row] = False
+        return row
+
+    def add_edge(self, conn):
+        if conn.source.doc_row is None or conn.target.doc_row is None:
+            return None
+        row, self._claimed_edge = self._claimed_edge, None
+        if (row is not None and self.edge_hidden[row] and self.edge_source[row] == conn.source.doc_row
+                and self.edge_target[row] == conn.target.doc_row):
+            self.edge_hidden[row] = False
+        else:
+            row = self._new_edge_row()
+        self.edge_views[row] = conn
+        conn.doc_row = row
+        self.edge_source[row] = conn.source.doc_row
+        self.edge_target[row] = conn.target.doc_row
+        self.edge_color[row] = conn.line_color.rgba()
+        self.edge_labels[row] = conn.label.toPlainText() if conn.label else ""
+        return row
+
+    def remove_edge(self, conn):
+        row = conn.doc_row
+        if row is None:
+            return
+        self.edge_alive[row] = False
+        self.edge_views[row] = None
+        self.edge_labels[row] = ""
+        conn.doc_row = None
+        self._dead_edges += 1
+
+    # --- Linhas ocultas (ramos recolhidos) ---
+
+    def add_hidden_nodes(self, ids, kind, x, y, w, h, style_ids, texts, folded):
+        """Linhas de nós que nascem ocultos (sem item na cena), de uma vez: só dados do modelo"""
+        count = len(ids)
+        while self._node_end + count > len(self.ids):
+            self._grow_nodes()
+        rows = np.arange(self._node_end, self._node_end + count)
+        self._node_end += count
+        self.alive[rows] = self.hidden[rows] = True
+        self.folded[rows] = folded
+        self.ids[rows], self.kind[rows] = ids, kind
+        self.x[rows], self.y[rows], self.w[rows], self.h[rows] = x, y, w, h
+        # Cores de cada estilo usado, para as colunas de preenchimento
+        used, inverse = np.unique(style_ids, return_inverse=True)
+        keys = [StyleManager.registry.get(int(i)).key for i in used]
+        self.style[rows] = style_ids
+        self.fill[rows] = np.array([k.fill for k in keys], np.uint32)[inverse]
+        self.fill_end[rows] = np.array([k.fill_end for k in keys], np.uint32)[inverse]
+        self.texts[rows[0]:rows[0] + count] = texts
+        self.hidden_ids.update(zip(np.asarray(ids).tolist(), rows.tolist()))
+        return rows
+
+    def add_hidden_edges(self, source_rows, target_rows, colors, labels):
+        """Linhas de conexões ocultas (alguma ponta num ramo recolhido), de uma vez"""
+        count = len(source_rows)
+        while self._edge_end + count > len(self.edge_source):
+            self._grow_edges()
+        rows = np.arange(self._edge_end, self._edge_end + count)
+        self._edge_end += count
+        self.edge_alive[rows] = self.edge_hidden[rows] = True
+        self.edge_source[rows], self.edge_target[rows] = source_rows, target_rows
+        self.edge_color[rows] = colors
+        self.edge_labels[self._edge_end - count:self._edge_end] = labels
+        return rows
+
+    def row_of_id(self, node_id):
+        """Linha do nó com o ID, à mostra ou oculto (None se não existir)"""
+        node = self.by_id.get(node_id)
+        return node.doc_row if node is not None else self.hidden_ids.get(node_id)
+
+    def hide(self, rows, edge_rows):
+        """
+        Oculta as linhas (o ramo foi recolhido): as vistas se soltam do
+        documento antes de sair da cena, então as linhas continuam vivas.
+        Devolve (nós, conexões) a remover da cena.
+        """
+        nodes, conns = [], []
+        for row in edge_rows:
+            conn = self.edge_views[row]
+            self.edge_views[row] = None
+            self.edge_hidden[row] = True
+            if conn is not None:
+                conn.doc_row = None
+                conns.append(conn)
+        for row in rows:
+            node = self.views[row]
+            self.views[row] = None
+            self.hidden[row] = True
+            node_id = int(self.ids[row])
+            self.hidden_ids[node_id] = row
+            if node is not None:
+                self.texts[row] = node.text_item.toPlainText()
+                if self.by_id.get(node_id) is node:
+                    del self.by_id[node_id]
+                node.doc_row = None
+                nodes.append(node)
+        return nodes, conns
+
+    def edges_touching(self, rows):
+        """Linhas de conexões vivas com alguma ponta nas linhas dadas"""
+        end = self._edge_end
+        mask = np.zeros(self._node_end, bool)
+        mask[rows] = True
+        alive = self.edge_alive[:end]
+        return np.flatnonzero(alive & (mask[self.edge_source[:end]] | mask[self.edge_target[:end]]))
+
+    def take_hidden_edges(self, rows):
+        """
+        Descarta as conexões ocultas ligadas às linhas (nós que vão sair da
+        cena) e as devolve como (IDs de origem, IDs de destino, cores,
+        rótulos), para voltarem com add_hidden_edges
+        """
+        edges = self.edges_touching(rows)
+        edges = edges[self.edge_hidden[edges]]
+        taken = (self.ids[self.edge_source[edges]], self.ids[self.edge_target[edges]],
+                 self.edge_color[edges], [self.edge_labels[e] for e in edges.tolist()])
+        self.edge_alive[edges] = False
+        for e in edges.tolist():
+            self.edge_labels[e] = ""
+        self._dead_edges += len(edges)
+        return taken
+
+    def claim_edge(self, row):
+        """A próxima conexão a entrar na cena (com as mesmas pontas) retoma esta linha oculta"""
+        self._claimed_edge = row
+
+    def rows_of_ids(self, ids):
+        """Linha de cada ID (à mostra ou oculto), -1 se não existir; vetorizado"""
+        live = np.flatnonzero(self.alive[:self._node_end])
+        known = self.ids[live]
+        order = np.argsort(known)
+        ids = np.asarray(ids, np.uint32)
+        if len(known) == 0:
+            return np.full(len(ids), -1, np.int64)
+        pos = np.minimum(np.searchsorted(known, ids, sorter=order), len(known) - 1)
+        return np.where(known[order[pos]] == ids, live[order[pos]], -1)
+
+    def tree_edges(self):
+        """
+        Arestas pai -> filho dos ramos (arrays de linhas de origem e destino):
+        a primeira conexão viva que chega a cada nó, sem fechar ciclos
+        (folding.branch_tree). Ligações extras (ex. arrowlinks) não puxam
+        outros ramos para dentro de um ramo recolhido.
+        """
+        from core.folding import branch_tree
+
+        end = self._edge_end
+        src, tgt = self.edge_source[:end], self.edge_target[:end]
+        live = np.flatnonzero(self.edge_alive[:end] & self.alive[src] & self.alive[tgt])
+        return branch_tree(src[live], tgt[live], len(self.ids), self.ids)
+
+    def record_of(self, row):
+        """NodeRecord da linha (para criar o item de um nó oculto)"""
+        from core.records import NodeRecord
+
+        kind = next((k for k, c in KIND_CODES.items() if c == self.kind[row]), "rectangle")
+        return NodeRecord(int(self.ids[row]), kind, float(self.x[row]), float(self.y[row]),
+                          float(self.w[row]), float(self.h[row]), self.texts[row], None, None,
+                          StyleManager.registry.get(int(self.style[row])).key, bool(self.folded[row]))
+
+    def set_style(self, row, style):
+        self.style[row] = style.id
+        self.fill[row], self.fill_end[row] = style.key.fill, style.key.fill_end
+
+    def rows_with_style(self, style_ids):
+        """Linhas à mostra que usam algum dos estilos (reestilizar uma classe de nós)"""
+        end = self._node_end
+        return np.flatnonzero(self.alive[:end] & ~self.hidden[:end] & np.isin(self.style[:end], list(style_ids)))
+
+    def node(self, node_id):
+        return self.by_id.get(node_id)
+
+    @property
+    def node_count(self):
+        return self._node_end - self._dead_nodes
+
+    @property
+    def edge_count(self):
+        return self._edge_end - self._dead_edges
+
+    def live_rows(self):
+        end = self._node_end
+        return np.flatnonzero(self.alive[:end] & ~self.hidden[:end])
+
+    def live_edges(self):
+        end = self._edge_end
+        return np.flatnonzero(self.edge_alive[:end] & ~self.edge_hidden[:end])
+
+    def rows_of(self, items):
+        return np.array([i.doc_row for i in items if getattr(i, 'doc_row', None) is not None], np.int64)
+
+    # --- Operações em lote (vetorizadas) ---
+
+    def bounds(self, rows=None):
+        """Retângulo (x0, y0, x1, y1) que envolve os nós (todos ou as linhas dadas)"""
+        if rows is None:
+            rows = self.live_rows()
+        if len(rows) == 0:
+            return None
+        return (float(self.x[rows].min()), float(self.y[rows].min()),
+                float((self.x[rows] + self.w[rows]).max()), float((self.y[rows] + self.h[rows]).max()))
+
+    def visible_counts(self, x0, y0, x1, y1):
+        """{tipo: (visíveis, total)} de nós por forma e de conexões dentro da área"""
+        rows = self.live_rows()
+        x, y = self.x[rows], self.y[rows]
+        inside = (x <= x1) & (x + self.w[rows] >= x0) & (y <= y1) & (y + self.h[rows] >= y0)
+        kinds = self.kind[rows]
+        counts = {}
+        for name, code in KIND_CODES.items():
+            of_kind = kinds == code
+            counts[name] = (int(np.count_nonzero(inside & of_kind)), int(np.count_nonzero(of_kind)))
+
+        edges = self.live_edges()
+        src, tgt = self.edge_source[edges], self.edge_target[edges]
+        # Caixa da linha entre os centros dos dois nós
+        sx, sy = self.x[src] + self.w[src] / 2, self.y[src] + self.h[src] / 2
+        tx, ty = self.x[tgt] + self.w[tgt] / 2, self.y[tgt] + self.h[tgt] / 2
+        seen = ((np.minimum(sx, tx) <= x1) & (np.maximum(sx, tx) >= x0) &
+                (np.minimum(sy, ty) <= y1) & (np.maximum(sy, ty) >= y0))
+        counts["connection"] = (int(np.count_nonzero(seen)), len(edges))
+        return counts
+
+    def aligned_positions(self, rows, edge):
+        """Novas posições (x, y) para alinhar as linhas por uma borda ou centro"""
+        x, y, w, h = self.x[rows], self.y[rows], self.w[rows], self.h[rows]
+        new_x, new_y = x.copy(), y.copy()
+        if edge == "left":
+            new_x[:] = x.min()
+        elif edge == "right":
+            new_x = (x + w).max() - w
+        elif edge == "hcenter":
+            new_x = (x + w / 2).mean() - w / 2
+        elif edge == "top":
+            new_y[:] = y.min()
+        elif edge == "bottom":
+            new_y = (y + h).max() - h
+        elif edge == "vcenter":
+            new_y = (y + h / 2).mean() - h / 2
+        else:
+            raise ValueError(f"Alinhamento desconhecido: {edge}")
+        return new_x, new_y
+
+    def snapshot(self):
+        """Cópia das colunas vivas (ocultas inclusive), com as conexões já traduzidas para IDs de nó"""
+        rows = np.flatnonzero(self.alive[:self._node_end])
+        # Conexões só entram se as duas pontas ainda estiverem vivas
+        end = self._edge_end
+        edges = np.flatnonzero(self.edge_alive[:end]
+                               & self.alive[self.edge_source[:end]]
+                               & self.alive[self.edge_target[:end]])
+        # Só os estilos usados vão para o arquivo, renumerados 0..k-1
+        used, local = np.unique(self.style[rows], return_inverse=True)
+        registry = StyleManager.registry
+        return DocumentSnapshot(
+            self.ids[rows], self.kind[rows], self.x[rows], self.y[rows], self.w[rows], self.h[rows],
+            self.fill[rows], self.fill_end[rows], [self.texts[i] for i in rows],
+            self.ids[self.edge_source[edges]], self.ids[self.edge_target[edges]],
+            self.edge_color[edges], [self.edge_labels[i] for i in edges],
+            local.astype(np.uint32), [registry.get(int(i)).key for i in used],
+            self.folded[rows],
+        )
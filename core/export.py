@@ -0,0 +1,261 @@
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PySide6.QtCore import Qt, QRectF, QSize, QSizeF, QMarginsF
+from PySide6.QtGui import QImage, QPainter, QColor, QPdfWriter, QPageSize, QPageLayout
+from core.atomic_file import atomic_write
+
+SCREEN_DPI = 96.0  # uma unidade da cena = um pixel de tela a 96 DPI
+FORMATS = ("png", "svg", "pdf")
+
+
+class ExportCanceled(Exception):
+    pass
+
+
+def _png_chunk(kind, data):
+    return (struct.pack(">I", len(data)) + kind + data +
+            struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+
+def _deflate_band(data, level):
+    """Comprime uma faixa como bloco deflate independente (roda numa thread; o zlib solta o GIL)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def export_rect(scene, selection_only=False, margin=20.0):
+    """Área da cena a exportar: o mapa todo ou só a seleção, com margem"""
+    if selection_only:
+        rect = QRectF()
+        for item in scene.selectedItems():
+            rect = rect.united(item.sceneBoundingRect())
+    else:
+        rect = scene.itemsBoundingRect()
+    if rect.isEmpty():
+        return rect
+    return rect.adjusted(-margin, -margin, margin, margin)
+
+
+class MapExporter:
+    """
+    Exporta uma área da cena em ladrilhos, nunca numa imagem inteira.
+    PNG: cada faixa de linhas é desenhada ladrilho a ladrilho na thread da
+    interface (a cena não pode ser pintada de outras threads), comprimida em
+    paralelo num pool de threads e gravada em ordem no arquivo; a memória
+    fica limitada a poucas faixas, qualquer que seja o DPI. SVG e PDF
+    percorrem os mesmos ladrilhos, cada um recortado no próprio retângulo.
+    """
+
+    def __init__(self, scene, rect=None, dpi=SCREEN_DPI, background="#ffffff", tile=2048,
+                 workers=None, memory_budget=64 * 1024 * 1024, level=6):
+        self.scene = scene
+        self.rect = QRectF(rect) if rect is not None else export_rect(scene)
+        self.dpi = float(dpi)
+        self.scale = self.dpi / SCREEN_DPI
+        # background=None: PNG com fundo transparente
+        self.background = QColor(background) if background is not None else None
+        self.tile = int(tile)
+        self.workers = workers or max(1, min(8, os.cpu_count() or 1))
+        self.memory_budget = memory_budget
+        self.level = level
+
+    def pixel_size(self):
+        return (max(1, int(round(self.rect.width() * self.scale))),
+                max(1, int(round(self.rect.height() * self.scale))))
+
+    def export(self, file_path, progress=None):
+        """Escolhe o formato pela extensão; progress(feito, total) devolvendo False cancela"""
+        ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+        if ext not in FORMATS:
+            raise ValueError(f"Formato de exportação desconhecido: {ext or file_path}")
+        if self.rect.isEmpty():
+            raise ValueError("Nada a exportar: a área está vazia")
+        # Conexões pendentes e contornos de seleção não devem sair no arquivo
+        flush = getattr(self.scene, 'flush_connections', None)
+        if flush is not None:
+            flush()
+        selected = self.scene.selectedItems()
+        self.scene.clearSelection()
+        try:
+            if ext == "png":
+                self._export_png(file_path, progress)
+            else:
+                self._export_vector(file_path, ext, progress)
+        finally:
+            for item in selected:
+                if item.scene() is self.scene:
+                    item.setSelected(True)
+        return file_path
+
+    # --- Ladrilhos ---
+
+    def _source(self, x, y, w, h):
+        """Retângulo da cena correspondente a um retângulo em pixels da saída"""
+        s = self.scale
+        return QRectF(self.rect.x() + x / s, self.rect.y() + y / s, w / s, h / s)
+
+    def _render_tile(self, painter, x, y, w, h, target_x, target_y):
+        self.scene.render(painter, QRectF(target_x, target_y, w, h), self._source(x, y, w, h),
+                          Qt.IgnoreAspectRatio)
+
+    def _band_height(self, width, bpp, pending):
+        # Faixa em voo: bytes da imagem + cópia filtrada, vezes as que aguardam compressão
+        per_row = width * bpp * 2 * (pending + 1)
+        return max(16, min(self.tile, self.memory_budget // max(per_row, 1)))
+
+    def _render_band(self, y, width, height, fmt, bpp):
+        """Desenha uma faixa de linhas, ladrilho a ladrilho; devolve um array (altura, largura*bpp)"""
+        rows = np.empty((height, width * bpp), np.uint8)
+        for x in range(0, width, self.tile):
+            w = min(self.tile, width - x)
+            image = QImage(w, height, QImage.Format_ARGB32_Premultiplied)
+            image.fill(self.background if self.background is not None else Qt.transparent)
+            painter = QPainter(image)
+            painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing |
+                                   QPainter.SmoothPixmapTransform)
+            self._render_tile(painter, x, y, w, height, 0, 0)
+            painter.end()
+            image = image.convertToFormat(fmt)
+            # Copia já: a memória do QImage some com ele
+            pixels = np.frombuffer(image.constBits(), np.uint8, count=image.sizeInBytes())
+            rows[:, x * bpp:(x + w) * bpp] = pixels.reshape(height, image.bytesPerLine())[:, :w * bpp]
+        return rows
+
+    def _export_png(self, file_path, progress):
+        width, height = self.pixel_size()
+        opaque = self.background is not None and self.background.alpha() == 255
+        fmt, bpp, color_type = ((QImage.Format_RGB888, 3, 2) if opaque else
+                                (QImage.Format_RGBA8888, 4, 6))
+        pending_max = self.workers * 2
+        band = self._band_height(width, bpp, pending_max)
+        ppm = int(round(self.dpi / 0.0254))
+
+        with atomic_write(file_path) as f, ThreadPoolExecutor(self.workers) as pool:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+            f.write(_png_chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1)))
+            # Fluxo zlib montado à mão: cabeçalho, blocos deflate das faixas, bloco final e adler32
+            f.write(_png_chunk(b"IDAT", b"\x78\x9c"))
+            adler = 1
+            previous = np.zeros((1, width * bpp), np.uint8)
+            futures = deque()
+            for y in range(0, height, band):
+                h = min(band, height - y)
+                rows = self._render_band(y, width, h, fmt, bpp)
+                # Filtro "Up" do PNG (diferença para a linha de cima), vetorizado
+                filtered = np.empty((h, width * bpp + 1), np.uint8)
+                filtered[:, 0] = 2
+                np.subtract(rows, np.vstack((previous, rows[:-1])), out=filtered[:, 1:])
+                previous = rows[-1:].copy()
+                raw = filtered.tobytes()
+                del rows, filtered
+                # O adler32 é do fluxo descomprimido (filtro incluído), em ordem
+                adler = zlib.adler32(raw, adler)
+                futures.append(pool.submit(_deflate_band, raw, self.level))
+                del raw
+                while futures and (len(futures) > pending_max or futures[0].done()):
+                    f.write(_png_chunk(b"IDAT", futures.popleft().result()))
+                if progress is not None and progress(y + h, height) is False:
+                    for future in futures:
+                        future.cancel()
+                    raise ExportCanceled()
+            while futures:
+                f.write(_png_chunk(b"IDAT", futures.popleft().result()))
+            tail = zlib.compressobj(self.level, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+            f.write(_png_chunk(b"IDAT", tail + struct.pack(">I", adler & 0xFFFFFFFF)))
+            f.write(_png_chunk(b"IEND", b""))
+
+    def _export_vector(self, file_path, ext, progress):
+        width, height = self.pixel_size()
+        if ext == "svg":
+            from PySide6.QtSvg import QSvgGenerator
+            device = QSvgGenerator()
+            device.setFileName(file_path)
+            device.setSize(QSize(width, height))
+            device.setViewBox(QRectF(0, 0, width, height))
+            device.setResolution(int(round(self.dpi)))
+            device.setTitle("Amarelo Mind")
+        else:
+            device = QPdfWriter(file_path)
+            device.setResolution(int(round(self.dpi)))
+            size_mm = QSizeF(width / self.dpi * 25.4, height / self.dpi * 25.4)
+            device.setPageLayout(QPageLayout(QPageSize(size_mm, QPageSize.Millimeter),
+                                             QPageLayout.Portrait, QMarginsF(0, 0, 0, 0)))
+            device.setTitle("Amarelo Mind")
+
+        painter = QPainter(device)
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing)
+        if self.background is not None:
+            painter.fillRect(QRectF(0, 0, width, height), self.background)
+        # Ladrilhos grandes: cada item na borda sai uma vez por ladrilho que toca
+        tile = self.tile * 4
+        tiles = [(x, y) for y in range(0, height, tile) for x in range(0, width, tile)]
+        try:
+            for done, (x, y) in enumerate(tiles, 1):
+                w, h = min(tile, width - x), min(tile, height - y)
+                painter.save()
+                painter.setClipRect(QRectF(x, y, w, h))
+                self._render_tile(painter, x, y, w, h, x, y)
+                painter.restore()
+                if progress is not None and progress(done, len(tiles)) is False:
+                    raise ExportCanceled()
+        finally:
+            painter.end()
+
+
+def export_map(map_path, output_path, dpi=SCREEN_DPI, background="#ffffff", tile=2048, workers=None):
+    """Carrega um mapa numa cena sem janela e o exporta (usado pela linha de comando)"""
+    from core.scene import MindMapScene
+    from core.loader import MapLoader
+
+    scene = MindMapScene()
+    MapLoader(scene, map_path).run_to_completion()
+    exporter = MapExporter(scene, dpi=dpi, background=background, tile=tile, workers=workers)
+    exporter.export(output_path)
+    scene.clear()
+    return output_path, exporter.pixel_size()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m core.export",
+                                     description="Exporta mapas .amind/.amarelo para PNG, SVG ou PDF, sem janela")
+    parser.add_argument("maps", nargs="+", help="mapas de entrada")
+    parser.add_argument("-o", "--output", help="arquivo de saída (um mapa) ou pasta (vários)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="png")
+    parser.add_argument("--dpi", type=float, default=SCREEN_DPI)
+    parser.add_argument("--transparent", action="store_true", help="PNG sem fundo")
+    parser.add_argument("--tile", type=int, default=2048, help="lado do ladrilho, em pixels")
+    parser.add_argument("--workers", type=int, help="threads de compressão")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    single = len(args.maps) == 1 and args.output and os.path.splitext(args.output)[1]
+    status = 0
+    for map_path in args.maps:
+        if single:
+            output = args.output
+        else:
+            name = os.path.splitext(os.path.basename(map_path))[0] + "." + args.format
+            output = os.path.join(args.output or os.path.dirname(map_path), name)
+        try:
+            _, (w, h) = export_map(map_path, output, args.dpi, None if args.transparent else "#ffffff",
+                                   args.tile, args.workers)
+            print(f"{map_path} -> {output} ({w}x{h})")
+        except Exception as e:
+            print(f"Erro ao exportar {map_path}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+"""
+Ramos recolhidos. Recolher um nó tira da cena o ramo que sai dele (os
+filhos, netos...): as linhas continuam no documento, sem item nenhum, e o
+nó mostra um selo "+N". Expandir recria os itens a partir das linhas, em
+fatias de poucos milissegundos por frame (como o carregador), então um mapa
+grande quase todo recolhido abre e desenha como um pequeno.
+
+O ramo segue as arestas pai -> filho de branch_tree: em geral a primeira
+conexão que chega a cada nó, sem nunca fechar um ciclo (ver
+MapDocument.tree_edges). Nós dentro de grupos ficam de fora.
+"""
+import time
+from collections import deque
+import numpy as np
+from PySide6.QtCore import QTimer
+
+
+def branch_graph(src, tgt, n):
+    """Arestas src -> tgt (linhas 0..n-1) em CSR: (início de cada linha, destinos)"""
+    order = np.argsort(src, kind='stable')
+    return np.searchsorted(src[order], np.arange(n + 1)), tgt[order].astype(np.int64)
+
+
+def _expand(indptr, targets, frontier):
+    """Vizinhos de todos os nós da fronteira de uma vez"""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return targets[:0]
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return targets[offsets]
+
+
+def reachable(graph, starts, blocked=None, stop=None):
+    """
+    Linhas alcançáveis a partir de starts no grafo (branch_graph), sem as
+    próprias starts, em ordem de busca em largura. blocked: máscara de
+    linhas onde não se entra; stop: máscara de linhas onde se entra, mas
+    não se segue adiante.
+    """
+    indptr, targets = graph
+    starts = np.unique(np.asarray(starts, np.int64))
+    if len(starts) == 0 or len(targets) == 0:
+        return np.zeros(0, np.int64)
+    seen = np.zeros(len(indptr) - 1, bool) if blocked is None else blocked.copy()
+    seen[starts] = True
+    found = []
+    frontier = starts
+    while len(frontier):
+        near = np.unique(_expand(indptr, targets, frontier))
+        near = near[~seen[near]]
+        seen[near] = True
+        found.append(near)
+        frontier = near if stop is None else near[~stop[near]]
+    return np.concatenate(found) if found else np.zeros(0, np.int64)
+
+
+def branch_rows(graph, starts, blocked=None, stop=None):
+    """
+    União dos ramos de cada start (na ordem dada). Uma start só entra se
+    estiver no ramo de outra (recolhido dentro de recolhido), nunca por um
+    ciclo que volta a ela mesma; starts já cobertas não são percorridas de novo.
+    """
+    covered = np.zeros(len(graph[0]) - 1, bool)
+    found = []
+    for start in starts:
+        if covered[start]:
+            continue
+        rows = reachable(graph, [start], blocked, stop)
+        rows = rows[~covered[rows]]
+        covered[rows] = True
+        found.append(rows)
+    return np.concatenate(found) if found else np.zeros(0, np.int64)
+
+
+def branch_tree(src, tgt, n, rank=None):
+    """
+    Floresta dos ramos sobre as arestas src -> tgt (linhas 0..n-1): cada nó
+    fica com a primeira aresta (na ordem dada) que chega a ele, se ela vier
+    de um nó ligado a uma raiz. Uma ligação de volta para um ancestral nunca
+    vira pai: os nós presos num ciclo entram pela primeira aresta que vem de
+    fora dele ou, se não houver nenhuma, o de menor rank vira raiz (os IDs,
+    que não mudam entre salvar e abrir; sem rank, a linha). Devolve as
+    arestas pai -> filho (origens, destinos).
+    """
+    keep = src != tgt
+    src, tgt = src[keep].astype(np.int64), tgt[keep].astype(np.int64)
+    _, first = np.unique(tgt, return_index=True)
+    parent = np.full(n, -1, np.int64)
+    parent[tgt[first]] = src[first]
+    children = branch_graph(src[first], tgt[first], n)
+    anchored = parent < 0
+    anchored[reachable(children, np.flatnonzero(anchored))] = True
+    while not anchored.all():
+        entering = anchored[src] & ~anchored[tgt]
+        if entering.any():
+            _, pick = np.unique(tgt[entering], return_index=True)
+            new = tgt[entering][pick]
+            parent[new] = src[entering][pick]
+        else:
+            loose = np.flatnonzero(~anchored)
+            new = loose[[np.argmin(rank[loose])]] if rank is not None else loose[:1]
+            parent[new] = -1
+        anchored[new] = True
+        # O resto do ciclo (e o que pende dele) segue pela primeira aresta
+        anchored[reachable(children, new, anchored)] = True
+    rows = np.flatnonzero(parent >= 0)
+    return parent[rows], rows
+
+
+def _levels(src, tgt, n):
+    """Pai de cada linha (-1 nas raízes) e os níveis da floresta, da raiz para as folhas"""
+    parent = np.full(n, -1, np.int64)
+    parent[tgt] = src
+    indptr, targets = branch_graph(src, tgt, n)
+    level = np.flatnonzero(parent < 0)
+    seen = np.zeros(n, bool)
+    seen[level] = True
+    levels = []
+    while len(level):
+        levels.append(level)
+        # Um pai só por linha: a fronteira não se repete
+        level = _expand(indptr, targets, level)
+        level = level[~seen[level]]
+        seen[level] = True
+    return parent, levels
+
+
+def branch_sizes(src, tgt, n, weight):
+    """
+    Soma de weight nos descendentes de cada linha (sem ela mesma), pelas
+    arestas pai -> filho (branch_tree), para todas as linhas numa passada:
+    dos níveis mais fundos para a raiz.
+    """
+    parent, levels = _levels(src, tgt, n)
+    total = weight.astype(np.int64)
+    for level in reversed(levels[1:]):
+        np.add.at(total, parent[level], total[level])
+    return total - weight
+
+
+def inside_folded(src, tgt, n, folded):
+    """Máscara das linhas que têm algum ancestral recolhido (numa passada, da raiz para as folhas)"""
+    parent, levels = _levels(src, tgt, n)
+    inside = np.zeros(n, bool)
+    for level in levels[1:]:
+        up = parent[level]
+        inside[level] = inside[up] | folded[up]
+    return inside
+
+
+class BranchFolding:
+    """
+    Recolhe e expande ramos da cena (scene.folding). As operações recebem
+    IDs de nó: um ramo dentro de outro pode ser expandido junto com ele, antes
+    de ter item.
+    """
+    BUDGET_MS = 12
+    # Ramos pequenos aparecem de uma vez, sem esperar os frames seguintes
+    SYNC_LIMIT = 200
+
+    def __init__(self, scene):
+        self.scene = scene
+        # ID -> posição do nó quando o ramo foi recolhido: se ele se mover, o
+        # ramo oculto vai junto na hora de aparecer (ou de salvar)
+        self._anchors = {}
+        # IDs, não linhas: um nó criado entre duas fatias pode compactar o documento
+        self._queue = deque()   # IDs de nós à espera de item
+        self._waiting = {}      # ID de nó -> linhas das conexões ocultas que dependem dele
+        self._compactions = 0   # documento.compactions quando _waiting foi montado
+        self._timer = QTimer(scene)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._materialize_slice)
+
+    def clear(self):
+        self._timer.stop()
+        self._anchors.clear()
+        self._queue.clear()
+        self._waiting.clear()
+
+    def is_folded(self, node):
+        return node.doc_row is not None and bool(self.scene.document.folded[node.doc_row])
+
+    def has_pending(self):
+        return bool(self._queue)
+
+    def _graph(self):
+        doc = self.scene.document
+        return branch_graph(*doc.tree_edges(), len(doc.ids))
+
+    def _rows(self, node_ids):
+        doc = self.scene.document
+        rows = (doc.row_of_id(i) for i in node_ids)
+        return [r for r in rows if r is not None and doc.alive[r]]
+
+    def hidden_count(self, row, graph):
+        """Quantos nós estão ocultos no ramo que sai da linha (número do selo)"""
+        return int(np.count_nonzero(self.scene.document.hidden[reachable(graph, [row])]))
+
+    def _set_badge(self, row, graph):
+        doc = self.scene.document
+        node = doc.views[row]
+        if node is not None:
+            node.set_fold_count(self.hidden_count(row, graph) if doc.folded[row] else 0)
+
+    def _set_badges(self, rows):
+        """Selos de muitos nós de uma vez (carregar o mapa, desfazer "expandir tudo")"""
+        doc = self.scene.document
+        counts = branch_sizes(*doc.tree_edges(), len(doc.ids), doc.hidden)
+        for row in rows:
+            node = doc.views[row]
+            if node is not None:
+                node.set_fold_count(int(counts[row]) if doc.folded[row] else 0)
+
+    def folded_ids(self):
+        doc = self.scene.document
+        end = len(doc.ids)
+        return doc.ids[np.flatnonzero(doc.alive[:end] & doc.folded[:end])].tolist()
+
+    # --- Comandos ---
+
+    def set_folded(self, nodes, folded):
+        """Recolhe/expande pela pilha de desfazer (quando a cena tem uma)"""
+        nodes = [n for n in nodes if n.doc_row is not None and self.is_folded(n) != folded]
+        if folded:
+            # Folhas não têm o que recolher
+            graph = self._graph()
+            nodes = [n for n in nodes if len(reachable(graph, [n.doc_row]))]
+        if nodes:
+            self.push([n.node_id for n in nodes], folded)
+
+    def toggle(self, nodes):
+        self.set_folded(nodes, not all(self.is_folded(n) for n in nodes))
+
+    def push(self, node_ids, folded, text=None):
+        stack = getattr(self.scene, 'undo_stack', None)
+        if stack is None:
+            (self.fold if folded else self.unfold)(node_ids)
+            return
+        from core.commands import FoldCommand
+        stack.push(FoldCommand(self.scene, node_ids, folded, text))
+
+    # --- Recolher ---
+
+    def fold(self, node_ids):
+        """Oculta os ramos: as linhas ficam no documento, os itens saem da cena"""
+        self.flush()
+        doc = self.scene.document
+        starts = self._rows(node_ids)
+        if not starts:
+            return
+        graph = self._graph()
+        blocked = doc.hidden.copy()
+        rows = branch_rows(graph, starts, blocked)
+        grouped = [r for r in rows.tolist() if doc.views[r] is not None and doc.views[r].parentItem() is not None]
+        if grouped:
+            blocked[grouped] = True
+            rows = branch_rows(graph, starts, blocked)
+        edges = doc.edges_touching(rows)
+        nodes, conns = doc.hide(rows.tolist(), edges[~doc.edge_hidden[edges]].tolist())
+        for item in conns + nodes:
+            self.scene.removeItem(item)
+        for row in starts:
+            doc.folded[row] = True
+            self._anchors[int(doc.ids[row])] = (float(doc.x[row]), float(doc.y[row]))
+        if len(starts) == 1:
+            self._set_badge(starts[0], graph)
+        else:
+            self._set_badges(starts)
+
+    def settle(self, rows=None):
+        """
+        Leva os ramos ocultos junto com os nós recolhidos que se moveram
+        desde que foram recolhidos (antes de expandir ou de salvar)
+        """
+        doc = self.scene.document
+        if rows is None:
+            end = len(doc.ids)
+            rows = np.flatnonzero(doc.alive[:end] & doc.folded[:end] & ~doc.hidden[:end])
+        graph = None
+        for row in np.asarray(rows, np.int64).tolist():
+            node_id = int(doc.ids[row])
+            x, y = float(doc.x[row]), float(doc.y[row])
+            ax, ay = self._anchors.get(node_id, (x, y))
+            self._anchors[node_id] = (x, y)
+            if (ax, ay) == (x, y):
+                continue
+            graph = graph if graph is not None else self._graph()
+            inside = reachable(graph, [row])
+            inside = inside[doc.hidden[inside]]
+            doc.x[inside] += x - ax
+            doc.y[inside] += y - ay
+            for nested in doc.ids[inside[doc.folded[inside]]].tolist():
+                if nested in self._anchors:
+                    nx, ny = self._anchors[nested]
+                    self._anchors[nested] = (nx + x - ax, ny + y - ay)
+
+    def refresh(self):
+        """Depois de carregar um mapa: selos dos nós recolhidos à mostra e posições de referência"""
+        doc = self.scene.document
+        end = len(doc.ids)
+        rows = np.flatnonzero(doc.alive[:end] & doc.folded[:end])
+        if len(rows) == 0:
+            return
+        for row in rows.tolist():
+            self._anchors.setdefault(int(doc.ids[row]), (float(doc.x[row]), float(doc.y[row])))
+        self._set_badges(rows[~doc.hidden[rows]].tolist())
+
+    # --- Expandir ---
+
+    def unfold(self, node_ids, batched=True):
+        """Mostra os ramos de novo; os recolhidos lá dentro que não foram pedidos continuam recolhidos"""
+        self.flush()
+        doc = self.scene.document
+        starts = [r for r in self._rows(node_ids) if doc.folded[r]]
+        shown = [r for r in starts if not doc.hidden[r]]
+        if not shown:
+            return
+        self.settle(shown)
+        doc.folded[starts] = False
+        for row in shown:
+            doc.views[row].set_fold_count(0)
+        # Os recolhidos dentro dos pedidos aparecem já expandidos; os que não
+        # estão no ramo de nenhum deles continuam como estavam
+        rows = branch_rows(self._graph(), shown, ~doc.hidden, doc.folded)
+        inside = np.zeros(len(doc.ids), bool)
+        inside[rows] = True
+        doc.folded[[r for r in starts if doc.hidden[r] and not inside[r]]] = True
+        self._show(rows, batched)
+
+    def _show(self, rows, batched):
+        doc = self.scene.document
+        rows = rows[doc.alive[rows] & doc.hidden[rows]]
+        if len(rows) == 0:
+            return
+        self._wait_for(rows)
+        self._queue.extend(doc.ids[rows].tolist())
+        if batched and len(rows) > self.SYNC_LIMIT:
+            self._timer.start()
+        else:
+            self.flush()
+
+    def _wait_for(self, rows):
+        """Liga cada conexão oculta às pontas ainda na fila: ela entra junto com a última"""
+        doc = self.scene.document
+        pending = np.zeros(len(doc.ids), bool)
+        pending[rows] = True
+        edges = doc.edges_touching(rows)
+        for e in edges[doc.edge_hidden[edges]].tolist():
+            for end in (int(doc.edge_source[e]), int(doc.edge_target[e])):
+                if pending[end]:
+                    self._waiting.setdefault(int(doc.ids[end]), []).append(e)
+        self._compactions = doc.compactions
+
+    def flush(self):
+        """Cria de uma vez os itens que ainda esperam sua vez"""
+        self._timer.stop()
+        if self._queue:
+            self._materialize(None)
+
+    def _materialize_slice(self):
+        if self._materialize(time.perf_counter() + self.BUDGET_MS / 1000.0):
+            self._timer.stop()
+
+    def _materialize(self, deadline):
+        """Cria itens a partir das linhas da fila; devolve se a fila acabou"""
+        from core.loader import build_node, build_connection
+        from core.records import ConnectionRecord
+
+        doc, scene = self.scene.document, self.scene
+        if self._compactions != doc.compactions:
+            # O documento foi renumerado desde a última fatia: refaz as conexões à espera
+            self._waiting.clear()
+            rows = doc.rows_of_ids(list(self._queue))
+            self._wait_for(rows[rows >= 0])
+        graph = None
+        while self._queue:
+            node_id = self._queue.popleft()
+            row = doc.row_of_id(node_id)
+            if row is None or not (doc.alive[row] and doc.hidden[row]):
+                continue
+            scene.addItem(build_node(doc.record_of(row)))
+            if doc.folded[row]:
+                graph = graph if graph is not None else self._graph()
+                self._set_badge(row, graph)
+            for e in self._waiting.pop(node_id, ()):
+                source, target = doc.views[doc.edge_source[e]], doc.views[doc.edge_target[e]]
+                if not (doc.edge_alive[e] and doc.edge_hidden[e]) or source is None or target is None:
+                    continue
+                doc.claim_edge(e)
+                scene.addItem(build_connection(ConnectionRecord(source.node_id, target.node_id,
+                                                                int(doc.edge_color[e]) or None, doc.edge_labels[e]),
+                                               doc.by_id))
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        if not self._queue:
+            self._waiting.clear()
+            return True
+        return False
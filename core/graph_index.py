@@ -0,0 +1,40 @@
+class GraphIndex:
+    """Índice de adjacência nó -> conexões, mantido pela própria cena"""
+
+    def __init__(self):
+        # dict usado como conjunto ordenado: {nó: {conexão: None}}
+        self._edges = {}
+
+    def add(self, conn):
+        """Registra uma conexão nas listas de adjacência da origem e do destino"""
+        for node in (conn.source, conn.target):
+            self._edges.setdefault(node, {})[conn] = None
+
+    def remove(self, conn):
+        """Remove a conexão do índice (chamado quando ela sai da cena)"""
+        for node in (conn.source, conn.target):
+            edges = self._edges.get(node)
+            if edges is None:
+                continue
+            edges.pop(conn, None)
+            if not edges:
+                del self._edges[node]
+
+    def connections_of(self, node):
+        """Conexões que tocam o nó, sem varrer a cena"""
+        return tuple(self._edges.get(node, ()))
+
+    def connection_between(self, source, target):
+        """Conexão de source para target, se existir"""
+        for conn in self._edges.get(source, ()):
+            if conn.target is target:
+                return conn
+        return None
+
+    def update_node(self, node):
+        """Invalida apenas as linhas ligadas ao nó que se moveu ou mudou de tamanho"""
+        for conn in self._edges.get(node, ()):
+            conn.invalidate()
+
+    def clear(self):
+        self._edges.clear()
@@ -0,0 +1,293 @@
+"""
+Importadores de mapas de outras ferramentas: FreeMind/Freeplane (.mm), OPML
+e tópicos em Markdown (.md).
+
+Os arquivos são lidos em fluxo (iterparse para XML, linha a linha para
+Markdown): cada ramo é descartado assim que termina, então um mapa de 50 mil
+nós nunca vira uma árvore DOM inteira na memória. Os registros saem no mesmo
+formato dos leitores nativos ("node" | "connection", registro, posição) e
+passam pelo mesmo carregador em lotes (MapLoader(records=...)).
+
+Posição automática: árvore da esquerda para a direita, montada em pós-ordem
+(as folhas ocupam linhas seguidas e o pai fica no meio dos filhos), sem
+guardar mais que o ramo aberto.
+"""
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from PySide6.QtGui import QColor
+from core.records import NodeRecord, ConnectionRecord, DEFAULT_NODE_SIZE
+from core.style_manager import DEFAULT_STYLE
+from core.layout import H_GAP, V_GAP
+
+
+class _Branch:
+    __slots__ = ("id", "depth", "text", "fill", "text_color", "edge_color", "children", "first_y", "last_y")
+
+    def __init__(self, node_id, depth, text, fill, text_color, edge_color):
+        self.id = node_id
+        self.depth = depth
+        self.text = text
+        self.fill = fill
+        self.text_color = text_color
+        self.edge_color = edge_color
+        self.children = []
+        self.first_y = self.last_y = None
+
+
+class OutlineBuilder:
+    """
+    Converte aberturas e fechamentos de tópicos (open/close) em registros.
+    Um nó só é emitido ao fechar, quando já se sabe onde ficam os filhos;
+    as conexões pai -> filho saem logo depois do pai.
+    """
+
+    def __init__(self, size=DEFAULT_NODE_SIZE):
+        self.width, self.height = size
+        self._stack = []
+        self._next_id = 1
+        self._y = 0.0
+
+    @property
+    def current(self):
+        return self._stack[-1] if self._stack else None
+
+    def open(self, text="", fill=None, text_color=None, edge_color=None):
+        branch = _Branch(self._next_id, len(self._stack), text, fill, text_color, edge_color)
+        self._next_id += 1
+        self._stack.append(branch)
+        return branch
+
+    def close(self, pos):
+        """Fecha o tópico mais interno; gera o registro dele e as conexões para os filhos"""
+        branch = self._stack.pop()
+        if branch.children:
+            y = (branch.first_y + branch.last_y) / 2
+        else:
+            y = self._y
+            self._y += self.height + V_GAP
+        x = branch.depth * (self.width + H_GAP)
+        style = None
+        if branch.text_color is not None:
+            fill = branch.fill if branch.fill is not None else DEFAULT_STYLE.fill
+            fill_end = branch.fill if branch.fill is not None else DEFAULT_STYLE.fill_end
+            style = DEFAULT_STYLE._replace(fill=fill, fill_end=fill_end, text_color=branch.text_color)
+        yield "node", NodeRecord(branch.id, "rectangle", x, y, self.width, self.height, branch.text,
+                                 branch.fill, branch.fill, style), pos
+        for child, color in branch.children:
+            yield "connection", ConnectionRecord(branch.id, child, color, ""), pos
+        parent = self.current
+        if parent is not None:
+            parent.children.append((branch.id, branch.edge_color))
+            if parent.first_y is None:
+                parent.first_y = y
+            parent.last_y = y
+
+    def close_all(self, pos):
+        while self._stack:
+            yield from self.close(pos)
+
+
+def _argb(name):
+    if not name:
+        return None
+    color = QColor(name)
+    return color.rgba() if color.isValid() else None
+
+
+def _plain(elem):
+    """Texto de um trecho HTML (richcontent do FreeMind), com espaços normalizados"""
+    return " ".join("".join(elem.itertext()).split())
+
+
+def _release(parents):
+    """
+    O ramo que fechou já virou registros: solta os elementos dele e o que o
+    pai já leu (a memória fica limitada ao caminho aberto, não ao arquivo)
+    """
+    parents.pop().clear()
+    if parents:
+        del parents[-1][:]
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_freemind_records(file_path):
+    """
+    FreeMind/Freeplane: <node TEXT=... COLOR=... BACKGROUND_COLOR=...>, com
+    <edge COLOR=...>, <richcontent TYPE="NODE"> (texto em HTML) e
+    <arrowlink DESTINATION=...> (ligações extras, emitidas no fim).
+    """
+    builder = OutlineBuilder()
+    ids = {}     # ID do FreeMind -> id do registro (só para as arrowlinks)
+    links = []
+    parents = [] # elementos <node> abertos
+    with open(file_path, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "node":
+                    branch = builder.open(elem.get("TEXT", ""), _argb(elem.get("BACKGROUND_COLOR")),
+                                          _argb(elem.get("COLOR")))
+                    if elem.get("ID"):
+                        ids[elem.get("ID")] = branch.id
+                    parents.append(elem)
+                continue
+            branch = builder.current
+            if tag == "node":
+                yield from builder.close(f.tell())
+                _release(parents)
+            elif branch is None:
+                continue
+            elif tag == "edge":
+                branch.edge_color = _argb(elem.get("COLOR"))
+            elif tag == "richcontent":
+                if elem.get("TYPE", "NODE") == "NODE" and not branch.text:
+                    branch.text = _plain(elem)
+                elem.clear()
+            elif tag == "arrowlink" and elem.get("DESTINATION"):
+                links.append((branch.id, elem.get("DESTINATION"), _argb(elem.get("COLOR"))))
+    pos = os.path.getsize(file_path)
+    for source, destination, color in links:
+        if destination in ids:
+            yield "connection", ConnectionRecord(source, ids[destination], color, ""), pos
+
+
+def iter_opml_records(file_path):
+    """OPML: <outline text=...> aninhados dentro de <body>"""
+    builder = OutlineBuilder()
+    parents = []
+    with open(file_path, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if _local(elem.tag) != "outline":
+                if event == "end" and _local(elem.tag) == "head":
+                    elem.clear()
+                continue
+            if event == "start":
+                builder.open(elem.get("text") or elem.get("title") or "")
+                parents.append(elem)
+            else:
+                yield from builder.close(f.tell())
+                _release(parents)
+
+
+_HEADING = re.compile(r"(#{1,6})\s+(.*?)\s*#*\s*$")
+_ITEM = re.compile(r"(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(.*)$")
+
+
+def iter_markdown_records(file_path):
+    """
+    Tópicos em Markdown: títulos (# a ######) e itens de lista (-, *, +, 1.)
+    aninhados pela indentação. Títulos ficam acima das listas; linhas soltas
+    continuam o texto do tópico anterior. Blocos de código são ignorados.
+    """
+    builder = OutlineBuilder()
+    ranks = []   # posição na hierarquia de cada tópico aberto: (0, nível) ou (1, indentação)
+    fenced = False
+    pos = 0
+    with open(file_path, 'rb') as f:
+        for raw in f:
+            pos += len(raw)
+            line = raw.decode('utf-8', 'replace').rstrip("\r\n").expandtabs(4)
+            body = line.lstrip()
+            if body.startswith(("```", "~~~")):
+                fenced = not fenced
+                continue
+            if fenced or not body:
+                continue
+            indent = len(line) - len(body)
+            heading = _HEADING.match(body) if indent < 4 else None
+            item = _ITEM.match(body)
+            if heading:
+                rank, text = (0, len(heading.group(1))), heading.group(2)
+            elif item:
+                rank, text = (1, indent), item.group(1).strip()
+            elif builder.current is not None:
+                branch = builder.current
+                branch.text = f"{branch.text}\n{body}" if branch.text else body
+                continue
+            else:
+                rank, text = (1, indent), body
+            while ranks and ranks[-1] >= rank:
+                ranks.pop()
+                yield from builder.close(pos)
+            ranks.append(rank)
+            builder.open(text)
+    yield from builder.close_all(pos)
+
+
+_READERS = {".mm": iter_freemind_records, ".opml": iter_opml_records,
+            ".md": iter_markdown_records, ".markdown": iter_markdown_records}
+
+
+def is_importable(file_path):
+    return os.path.splitext(file_path)[1].lower() in _READERS
+
+
+def open_import_records(file_path):
+    """Registros de um arquivo importável e o total para o progresso (bytes)"""
+    reader = _READERS[os.path.splitext(file_path)[1].lower()]
+    return reader(file_path), max(os.path.getsize(file_path), 1)
+
+
+def convert_file(source, target):
+    """Importa um arquivo e grava o .amind (sem cena nem janela); devolve (nós, conexões)"""
+    from core.binary_format import write_map
+
+    records, _ = open_import_records(source)
+    nodes, connections = [], []
+    for kind, record, _ in records:
+        (nodes if kind == "node" else connections).append(record)
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    write_map(target, nodes, connections)
+    return len(nodes), len(connections)
+
+
+def _collect(paths, output):
+    """(origem, destino) para cada arquivo importável; pastas são percorridas por inteiro"""
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, files in os.walk(path):
+                for name in sorted(files):
+                    if is_importable(name):
+                        source = os.path.join(folder, name)
+                        relative = os.path.relpath(source, path)
+                        jobs.append((source, os.path.splitext(os.path.join(output or path, relative))[0] + ".amind"))
+        else:
+            base = os.path.splitext(os.path.basename(path))[0] + ".amind"
+            jobs.append((path, os.path.join(output or os.path.dirname(path), base)))
+    return jobs
+
+
+def main(argv=None):
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    parser = argparse.ArgumentParser(prog="python -m core.importers",
+                                     description="Converte mapas FreeMind (.mm), OPML e Markdown para .amind")
+    parser.add_argument("paths", nargs="+", help="arquivos ou pastas (percorridas com as subpastas)")
+    parser.add_argument("-o", "--output", help="pasta de saída (padrão: ao lado de cada arquivo)")
+    parser.add_argument("--workers", type=int, help="processos em paralelo (padrão: um por núcleo)")
+    args = parser.parse_args(argv)
+
+    jobs = _collect(args.paths, args.output)
+    status = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(convert_file, source, target): (source, target) for source, target in jobs}
+        for future in as_completed(futures):
+            source, target = futures[future]
+            try:
+                nodes, connections = future.result()
+                print(f"{source} -> {target} ({nodes} objetos, {connections} conexões)")
+            except Exception as e:
+                print(f"Erro ao importar {source}: {e}", file=sys.stderr)
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import json
+import os
+from core.records import NodeRecord, ConnectionRecord
+from core.loader import build_node, build_connection, apply_fill
+from core.style_manager import StyleManager, style_key_from_json
+
+
+class ChangeJournal:
+    """
+    Diário de alterações (JSON Lines) gravado ao lado do mapa: <mapa>.journal.
+    Os comandos registram o novo estado a cada execução/desfazer; o autosave
+    só acrescenta as linhas pendentes e, de tempos em tempos, a compactação
+    regrava o arquivo base e descarta o diário.
+    """
+    COMPACT_OPS = 5000
+    COMPACT_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, map_path):
+        self.map_path = map_path
+        self.path = map_path + ".journal"
+        # Diário congelado durante uma compactação (apagado quando a base é gravada)
+        self.compacting_path = map_path + ".journal.compacting"
+        self._buffer = []
+        self._ops_since_compaction = 0
+
+    def record(self, ops):
+        """Guarda as operações em memória; vão para o disco no próximo flush()"""
+        self._buffer.extend(ops)
+
+    def flush(self):
+        """Acrescenta as operações pendentes ao diário (append + fsync)"""
+        if not self._buffer:
+            return 0
+        lines = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in self._buffer)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        count = len(self._buffer)
+        self._ops_since_compaction += count
+        self._buffer = []
+        return count
+
+    def needs_compaction(self):
+        if self._ops_since_compaction >= self.COMPACT_OPS:
+            return True
+        return os.path.exists(self.path) and os.path.getsize(self.path) >= self.COMPACT_BYTES
+
+    def begin_compaction(self):
+        """
+        Chamado no momento do retrato da cena: o diário atual é congelado e as
+        próximas operações vão para um diário novo.
+        """
+        self._buffer = []
+        self._ops_since_compaction = 0
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.compacting_path):
+            # Compactação anterior falhou: junta os dois diários, na ordem
+            with open(self.compacting_path, 'a', encoding='utf-8') as dst, \
+                 open(self.path, 'r', encoding='utf-8') as src:
+                dst.write(src.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.compacting_path)
+
+    def end_compaction(self):
+        """A base foi regravada com sucesso: o diário congelado não é mais necessário"""
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    def has_recovery(self):
+        return os.path.exists(self.compacting_path) or os.path.exists(self.path)
+
+    def iter_ops(self):
+        for path in (self.compacting_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Última linha truncada por uma queda: o resto é descartado
+                        return
+
+    def replay(self, scene):
+        """Reaplica o diário sobre o mapa base recém-carregado; devolve quantas operações"""
+        # Os nós à mostra, por ID (o documento mantém o mapa em dia)
+        nodes = scene.document.by_id
+        count = 0
+        for op in self.iter_ops():
+            apply_op(scene, nodes, op)
+            count += 1
+        return count
+
+
+def _connect_hidden(doc, op):
+    """Conexão com uma ponta num ramo recolhido: entra só no documento"""
+    source, target = doc.row_of_id(op["source"]), doc.row_of_id(op["target"])
+    if source is not None and target is not None and (doc.hidden[source] or doc.hidden[target]):
+        doc.add_hidden_edges([source], [target], [op["color"] or 0], [op["label"]])
+
+
+def apply_op(scene, nodes, op):
+    """Aplica uma operação do diário diretamente na cena (sem passar pela pilha de desfazer)"""
+    kind = op["op"]
+    if kind == "add":
+        style = style_key_from_json(op["style"]) if op.get("style") else None
+        node = build_node(NodeRecord(op["id"], op["kind"], op["x"], op["y"], op["w"], op["h"],
+                                     op["text"], op["fill"], op["fill_end"], style))
+        scene.addItem(node)
+        nodes[node.node_id] = node
+        return
+    if kind in ("connect", "disconnect"):
+        if kind == "connect":
+            conn = build_connection(ConnectionRecord(op["source"], op["target"], op["color"], op["label"]), nodes)
+            if conn is not None:
+                scene.addItem(conn)
+            else:
+                _connect_hidden(scene.document, op)
+        else:
+            conn = scene.graph.connection_between(nodes.get(op["source"]), nodes.get(op["target"]))
+            if conn is not None:
+                scene.removeItem(conn)
+        return
+
+    if kind == "fold":
+        # Sem lotes: as próximas operações podem mexer nos nós que aparecem
+        if op["folded"]:
+            scene.folding.fold(op["ids"])
+        else:
+            scene.folding.unfold(op["ids"], batched=False)
+        return
+
+    node = nodes.get(op["id"])
+    if node is None:
+        return
+    if kind == "move":
+        node.set_scene_pos(op["x"], op["y"])
+    elif kind == "resize":
+        node.setRect(0, 0, op["w"], op["h"])
+        scene.graph.update_node(node)
+    elif kind == "text":
+        node.text_item.setPlainText(op["text"])
+    elif kind == "color":
+        apply_fill(node, op["fill"], op["fill_end"])
+    elif kind == "style":
+        node.set_style(StyleManager.registry.intern(style_key_from_json(op["style"])))
+    elif kind == "remove":
+        scene.remove_items([node])
+        nodes.pop(op["id"], None)
@@ -0,0 +1,497 @@
+"""
+Layout automático do mapa (árvore, radial e por forças).
+
+Os algoritmos trabalham só com arrays NumPy (tamanhos, posições e arestas
+tirados do MapDocument), então rodam numa thread de trabalho; a cena só é
+tocada no fim, num único comando de desfazer.
+"""
+import math
+import time
+import numpy as np
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QVariantAnimation, QEasingCurve, Signal
+
+MODES = ("tree", "radial", "force")
+
+H_GAP = 60.0   # entre níveis da árvore
+V_GAP = 20.0   # entre irmãos
+RING_GAP = 80.0
+
+
+# --- Grafo ---
+
+def _adjacency(n, src, dst):
+    """Vizinhança não direcionada em CSR: vizinhos de v em nbr[start[v]:start[v + 1]]"""
+    a = np.concatenate([src, dst])
+    b = np.concatenate([dst, src])
+    order = np.argsort(a, kind="stable")
+    return np.searchsorted(a[order], np.arange(n + 1)), b[order]
+
+
+def spanning_forest(n, src, dst, root):
+    """
+    Busca em largura por níveis (vetorizada) a partir da raiz; os nós que
+    sobram formam outras árvores. Devolve (pai, profundidade, ordem BFS, raízes),
+    com os irmãos sempre contíguos na ordem.
+    """
+    start, nbr = _adjacency(n, src, dst)
+    parent = np.full(n, -1, np.int64)
+    depth = np.full(n, -1, np.int64)
+    order, roots = [], []
+    # Nós isolados viram raízes de uma vez (sem uma busca por nó)
+    isolated = np.flatnonzero(np.diff(start) == 0)
+    if root is not None and np.diff(start)[root] == 0:
+        isolated = isolated[isolated != root]
+    depth[isolated] = 0
+    unvisited = 0
+    while True:
+        if root is None:
+            while unvisited < n and depth[unvisited] >= 0:
+                unvisited += 1
+            if unvisited == n:
+                break
+            root = unvisited
+        roots.append(root)
+        depth[root] = 0
+        frontier = np.array([root])
+        while len(frontier):
+            order.append(frontier)
+            counts = start[frontier + 1] - start[frontier]
+            total = counts.sum()
+            if total == 0:
+                break
+            first = np.repeat(start[frontier] - np.cumsum(counts) + counts, counts)
+            cand = nbr[first + np.arange(total)]
+            par = np.repeat(frontier, counts)
+            fresh = depth[cand] < 0
+            cand, par = cand[fresh], par[fresh]
+            # Cada nó entra uma vez, pelo primeiro pai que o alcançou
+            _, keep = np.unique(cand, return_index=True)
+            keep.sort()
+            cand, par = cand[keep], par[keep]
+            parent[cand] = par
+            depth[cand] = depth[par] + 1
+            frontier = cand
+        root = None
+    roots.extend(isolated.tolist())
+    order.append(isolated)
+    order = np.concatenate(order)
+    # Componentes foram percorridas uma a uma: reordena por nível (estável, irmãos contíguos)
+    order = order[np.argsort(depth[order], kind="stable")]
+    return parent, depth, order, roots
+
+
+def _levels(order, depth):
+    """Ordem BFS fatiada por profundidade"""
+    d = depth[order]
+    bounds = np.flatnonzero(np.diff(d)) + 1
+    return np.split(order, bounds)
+
+
+# --- Árvore (Reingold–Tilford) ---
+
+def tree_layout(w, h, src, dst, root):
+    """
+    Árvore horizontal (raiz à esquerda) no estilo Reingold–Tilford: cada
+    subárvore é empilhada sob a anterior pelo contorno, nível a nível, e o pai
+    fica centrado entre o primeiro e o último filho. Devolve (x, y) do topo-esquerdo.
+    """
+    n = len(w)
+    parent, depth, order, roots = spanning_forest(n, src, dst, root)
+    # Raiz virtual (tamanho zero) junta as componentes numa floresta empilhada
+    virtual = n
+    parent = np.append(parent, -1)
+    parent[roots] = virtual
+    heights = np.append(h, 0.0)
+
+    kids = {}
+    for v in order.tolist():
+        kids.setdefault(int(parent[v]), []).append(v)
+
+    rel = np.zeros(n + 1)  # topo do filho relativo ao topo do pai
+    contours = {}
+    for v in order.tolist()[::-1] + [virtual]:
+        children = kids.get(v)
+        if not children:
+            contours[v] = (np.array([0.0]), np.array([heights[v]]))
+            continue
+        top, bottom = contours.pop(children[0])
+        offsets = [0.0]
+        for c in children[1:]:
+            t, b = contours.pop(c)
+            m = min(len(bottom), len(t))
+            shift = float((bottom[:m] - t[:m]).max()) + V_GAP
+            offsets.append(shift)
+            if len(t) > len(top):
+                top = np.concatenate([top, t[len(top):] + shift])
+            bottom = np.concatenate([b + shift, bottom[len(b):]]) if len(bottom) > len(b) else b + shift
+        first, last = children[0], children[-1]
+        mid = (offsets[0] + heights[first] / 2 + offsets[-1] + heights[last] / 2) / 2
+        own_top = mid - heights[v] / 2
+        for c, off in zip(children, offsets):
+            rel[c] = off - own_top
+        contours[v] = (np.concatenate([[0.0], top - own_top]),
+                       np.concatenate([[heights[v]], bottom - own_top]))
+
+    y = np.zeros(n + 1)
+    for level in _levels(order, depth):
+        y[level] = y[parent[level]] + rel[level]
+    # Coluna de cada nível: largura máxima do nível anterior + espaço
+    widest = np.zeros(depth.max() + 1 if n else 1)
+    np.maximum.at(widest, depth, w)
+    columns = np.concatenate([[0.0], np.cumsum(widest + H_GAP)[:-1]])
+    x = columns[depth]
+    return x, y[:n]
+
+
+# --- Radial ---
+
+def radial_layout(w, h, src, dst, root):
+    """
+    Mapa radial: a raiz no centro e cada nível num anel; cada subárvore recebe
+    um setor proporcional ao número de folhas. Componentes extras ficam em fila abaixo.
+    """
+    n = len(w)
+    parent, depth, order, roots = spanning_forest(n, src, dst, root)
+    levels = _levels(order, depth)
+    children = np.bincount(parent[parent >= 0], minlength=n)
+    leaves = (children == 0).astype(float)
+    for level in levels[:0:-1]:
+        np.add.at(leaves, parent[level], leaves[level])
+
+    start = np.zeros(n)
+    span = np.zeros(n)
+    span[roots] = 2 * math.pi
+    diag = float(np.hypot(w, h).max()) if n else 0.0
+    radius = np.zeros(len(levels))
+    for d, level in enumerate(levels[1:], 1):
+        par = parent[level]
+        prev = np.cumsum(leaves[level]) - leaves[level]
+        # Irmãos são contíguos: deslocamento dentro do grupo do mesmo pai
+        change = np.r_[True, par[1:] != par[:-1]]
+        group_first = np.maximum.accumulate(np.where(change, np.arange(len(level)), 0))
+        within = prev - prev[group_first]
+        start[level] = start[par] + span[par] * within / leaves[par]
+        span[level] = span[par] * leaves[level] / leaves[par]
+        # Anel grande o bastante para o menor setor do nível comportar um nó
+        radius[d] = max(radius[d - 1] + diag + RING_GAP, (diag + V_GAP) / span[level].min())
+
+    angle = start + span / 2
+    r = radius[depth]
+    cx, cy = r * np.cos(angle), r * np.sin(angle)
+
+    # Cada componente em volta da (0, 0); empacota as extras em fila abaixo da principal
+    comp = np.zeros(n, np.int64)
+    for i, rt in enumerate(roots):
+        comp[rt] = i
+    for level in levels[1:]:
+        comp[level] = comp[parent[level]]
+    left = np.full(len(roots), np.inf)
+    right = np.full(len(roots), -np.inf)
+    top = np.full(len(roots), np.inf)
+    bottom = np.full(len(roots), -np.inf)
+    np.minimum.at(left, comp, cx - w / 2)
+    np.maximum.at(right, comp, cx + w / 2)
+    np.minimum.at(top, comp, cy - h / 2)
+    np.maximum.at(bottom, comp, cy + h / 2)
+    shift_x = np.zeros(len(roots))
+    shift_y = np.zeros(len(roots))
+    # Prateleiras da largura da componente principal (ou ~quadradas, se for maior)
+    extra = right[1:] - left[1:]
+    limit = max(right[0] - left[0], math.sqrt(float((extra + H_GAP).sum() * (bottom[1:] - top[1:] + V_GAP).mean()))
+                if len(extra) else 0.0)
+    cursor_x, cursor_y, shelf = left[0], bottom[0] + 4 * V_GAP, 0.0
+    for i in range(1, len(roots)):
+        if cursor_x > left[0] and cursor_x + extra[i - 1] > left[0] + limit:
+            cursor_x, cursor_y, shelf = left[0], cursor_y + shelf + V_GAP, 0.0
+        shift_x[i] = cursor_x - left[i]
+        shift_y[i] = cursor_y - top[i]
+        cursor_x += extra[i - 1] + H_GAP
+        shelf = max(shelf, bottom[i] - top[i])
+    return cx + shift_x[comp] - w / 2, cy + shift_y[comp] - h / 2
+
+
+# --- Forças (Barnes–Hut) ---
+
+def _far_offsets():
+    """
+    Lista de interação de uma quadtree em grade: células filhas dos vizinhos
+    do pai que não são vizinhas da própria célula (27 por paridade da célula).
+    """
+    table = {}
+    for px in (0, 1):
+        for py in (0, 1):
+            offsets = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for a in (0, 1):
+                        for b in (0, 1):
+                            ox, oy = 2 * dx + a - px, 2 * dy + b - py
+                            if abs(ox) > 1 or abs(oy) > 1:
+                                offsets.append((ox, oy))
+            table[px * 2 + py] = np.array(offsets)
+    return table
+
+
+_FAR = _far_offsets()
+_NEAR = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy])
+
+
+def _cell_forces(pos, idx, base, offsets, mass, comx, comy, k2, force):
+    # Grade com borda vazia de 2 células: nenhum deslocamento sai do array
+    flat = base[idx, None] + offsets
+    dx = pos[idx, 0, None] - comx[flat]
+    dy = pos[idx, 1, None] - comy[flat]
+    coef = mass[flat] * k2 / (dx * dx + dy * dy + 1e-9)
+    force[idx, 0] += (coef * dx).sum(axis=1)
+    force[idx, 1] += (coef * dy).sum(axis=1)
+
+
+def repulsion(pos, k):
+    """
+    Repulsão k²/d entre todos os pares em O(n log n): em cada nível da
+    quadtree, cada nó interage com o centro de massa das células bem
+    separadas; no nível mais fino, vizinhas pelo centro de massa e a própria
+    célula par a par.
+    """
+    n = len(pos)
+    force = np.zeros_like(pos)
+    lo = pos.min(axis=0)
+    size = float((pos.max(axis=0) - lo).max()) * (1 + 1e-9) + 1e-9
+    depth = max(2, int(math.ceil(math.log(max(n, 2), 4))) + 1)
+    k2 = k * k
+    for level in range(2, depth + 1):
+        g = 2 ** level
+        stride = g + 4
+        cells = np.minimum(((pos - lo) / (size / g)).astype(np.int64), g - 1)
+        base = (cells[:, 0] + 2) * stride + cells[:, 1] + 2
+        mass = np.bincount(base, minlength=stride * stride).astype(float)
+        occupied = mass > 0
+        comx = np.bincount(base, pos[:, 0], stride * stride)
+        comy = np.bincount(base, pos[:, 1], stride * stride)
+        comx[occupied] /= mass[occupied]
+        comy[occupied] /= mass[occupied]
+        parity = (cells[:, 0] & 1) * 2 + (cells[:, 1] & 1)
+        for p, offsets in _FAR.items():
+            idx = np.flatnonzero(parity == p)
+            if len(idx):
+                _cell_forces(pos, idx, base, offsets[:, 0] * stride + offsets[:, 1],
+                             mass, comx, comy, k2, force)
+        if level == depth:
+            _cell_forces(pos, np.arange(n), base, _NEAR[:, 0] * stride + _NEAR[:, 1],
+                         mass, comx, comy, k2, force)
+            # Mesma célula: pares exatos (nós ordenados por célula, deslocamentos 1, 2, ...)
+            order = np.argsort(base, kind="stable")
+            sorted_cells = base[order]
+            shift = 1
+            while shift < n:
+                same = sorted_cells[shift:] == sorted_cells[:-shift]
+                if not same.any():
+                    break
+                a, b = order[:-shift][same], order[shift:][same]
+                d = pos[a] - pos[b]
+                coef = (k2 / ((d * d).sum(axis=1) + 1e-9))[:, None]
+                np.add.at(force, a, coef * d)
+                np.add.at(force, b, -coef * d)
+                shift += 1
+    return force
+
+
+def force_layout(w, h, x, y, src, dst, iterations=60, progress=None, canceled=None):
+    """
+    Fruchterman–Reingold com repulsão Barnes–Hut; parte das posições atuais
+    (com um leve ruído para separar nós empilhados) e mantém o centroide.
+    """
+    n = len(w)
+    pos = np.column_stack([x + w / 2, y + h / 2]).astype(float)
+    if n < 2:
+        return x.copy(), y.copy()
+    centroid = pos.mean(axis=0)
+    k = 1.5 * float(np.hypot(w, h).mean())
+    pos += np.random.default_rng(0).normal(scale=k * 0.05, size=pos.shape)
+    # Nós amontoados (área bem menor que a esperada, ~k·√n de lado) partem do
+    # layout radial, que já separa as subárvores; o FR só refina
+    expected = k * math.sqrt(n)
+    extent = float((pos.max(axis=0) - pos.min(axis=0)).max())
+    if extent < expected:
+        rx, ry = radial_layout(w, h, src, dst, 0)
+        pos = np.column_stack([rx + w / 2, ry + h / 2])
+        pos += centroid - pos.mean(axis=0)
+    temperature = expected / 10
+    cooling = (k * 0.05 / temperature) ** (1.0 / iterations)
+    for it in range(iterations):
+        if canceled is not None and canceled():
+            return None
+        disp = repulsion(pos, k)
+        delta = pos[dst] - pos[src]
+        dist = np.hypot(delta[:, 0], delta[:, 1])[:, None]
+        pull = delta * dist / k
+        np.add.at(disp, src, pull)
+        np.add.at(disp, dst, -pull)
+        length = np.hypot(disp[:, 0], disp[:, 1])[:, None] + 1e-9
+        pos += disp / length * np.minimum(length, temperature)
+        temperature *= cooling
+        if progress is not None:
+            progress(it + 1, iterations)
+    pos += centroid - pos.mean(axis=0)
+    return pos[:, 0] - w / 2, pos[:, 1] - h / 2
+
+
+def compute_layout(mode, w, h, x, y, src, dst, root=None, progress=None, canceled=None):
+    """Novas posições (x, y) do topo-esquerdo de cada nó no modo pedido"""
+    if mode == "force":
+        return force_layout(w, h, x, y, src, dst, progress=progress, canceled=canceled)
+    if mode not in MODES:
+        raise ValueError(f"Modo de layout desconhecido: {mode}")
+    if len(w) == 0:
+        return x.copy(), y.copy()
+    root = 0 if root is None else root
+    nx, ny = (tree_layout if mode == "tree" else radial_layout)(w, h, src, dst, root)
+    # A raiz fica onde estava; o resto se organiza em volta dela
+    return nx + (x[root] - nx[root]), ny + (y[root] - ny[root])
+
+
+# --- Execução fora da thread da interface ---
+
+class LayoutSignals(QObject):
+    progress = Signal(int, int)
+    finished = Signal(object, object, float)  # (x, y, ms)
+    failed = Signal(str)
+
+
+class LayoutTask(QRunnable):
+    def __init__(self, mode, arrays, root, signals):
+        super().__init__()
+        self.mode = mode
+        self.arrays = arrays
+        self.root = root
+        self.signals = signals
+        self.canceled = False
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            result = compute_layout(self.mode, *self.arrays, root=self.root,
+                                    progress=self.signals.progress.emit, canceled=lambda: self.canceled)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        if result is not None:
+            self.signals.finished.emit(result[0], result[1], (time.perf_counter() - started) * 1000.0)
+
+
+class LayoutRunner(QObject):
+    """
+    Tira os arrays do documento, calcula o layout numa thread e aplica o
+    resultado como um só passo de desfazer (animado em mapas pequenos).
+    """
+    finished = Signal(int, float)  # (nós reposicionados, ms de cálculo)
+    failed = Signal(str)
+    progress = Signal(int, int)
+
+    ANIMATE_LIMIT = 2000
+    ANIMATION_MS = 350
+
+    _pool = None
+
+    def __init__(self, scene, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.signals = LayoutSignals()
+        self.signals.finished.connect(self._apply)
+        self.signals.failed.connect(self._failed)
+        self.signals.progress.connect(self.progress)
+        self._task = None
+        self._nodes = []
+        self._animation = None
+
+    def is_running(self):
+        return self._task is not None
+
+    def run(self, mode, root=None, animate=True):
+        if mode not in MODES:
+            raise ValueError(f"Modo de layout desconhecido: {mode}")
+        if self._task is not None:
+            return False
+        doc = self.scene.document
+        rows = doc.live_rows()
+        self._nodes = [doc.views[r] for r in rows.tolist()]
+        # Linha do documento -> índice local; só arestas com as duas pontas vivas
+        local = np.full(len(doc.alive), -1, np.int64)
+        local[rows] = np.arange(len(rows))
+        end = doc._edge_end
+        edges = np.flatnonzero(doc.edge_alive[:end])
+        src, dst = local[doc.edge_source[edges]], local[doc.edge_target[edges]]
+        keep = (src >= 0) & (dst >= 0)
+        arrays = (doc.w[rows].copy(), doc.h[rows].copy(), doc.x[rows].copy(), doc.y[rows].copy(),
+                  src[keep], dst[keep])
+        root_index = None
+        if root is not None and getattr(root, 'doc_row', None) is not None:
+            root_index = int(local[root.doc_row])
+        elif len(rows):
+            # Sem seleção: o nó mais conectado vira a raiz
+            root_index = int(np.bincount(np.concatenate([src[keep], dst[keep]]), minlength=len(rows)).argmax())
+
+        self._animate = animate and len(rows) <= self.ANIMATE_LIMIT
+        self._task = LayoutTask(mode, arrays, root_index, self.signals)
+        self._task.setAutoDelete(False)
+        if LayoutRunner._pool is None:
+            LayoutRunner._pool = QThreadPool()
+            LayoutRunner._pool.setMaxThreadCount(1)
+        LayoutRunner._pool.start(self._task)
+        return True
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.canceled = True
+            self._task = None
+
+    def wait(self, msecs=-1):
+        if LayoutRunner._pool is not None:
+            return LayoutRunner._pool.waitForDone(msecs)
+        return True
+
+    def _failed(self, message):
+        if self._task is None:
+            return  # cancelado enquanto calculava
+        # Libera o runner: sem isso is_running() ficaria preso em True
+        self._task = None
+        self._nodes = []
+        self.failed.emit(message)
+
+    def _apply(self, new_x, new_y, compute_ms):
+        if self._task is None:
+            return  # cancelado enquanto calculava
+        self._task = None
+        from core.commands import MoveNodesCommand
+
+        # Nós removidos durante o cálculo ficam de fora
+        alive = [i for i, node in enumerate(self._nodes) if node.scene() is self.scene]
+        nodes = [self._nodes[i] for i in alive]
+        old = [(n.scenePos().x(), n.scenePos().y()) for n in nodes]
+        new = list(zip(new_x[alive].tolist(), new_y[alive].tolist()))
+        command = MoveNodesCommand(self.scene, nodes, old, new, "Organizar Layout")
+        if not self._animate:
+            self.scene.undo_stack.push(command)
+            self.finished.emit(len(nodes), compute_ms)
+            return
+
+        start = np.array(old)
+        delta = np.array(new) - start
+        self._animation = QVariantAnimation(self)
+        self._animation.setStartValue(0.0)
+        self._animation.setEndValue(1.0)
+        self._animation.setDuration(self.ANIMATION_MS)
+        self._animation.setEasingCurve(QEasingCurve.OutCubic)
+
+        def step(t):
+            for node, (px, py) in zip(nodes, (start + delta * t).tolist()):
+                node.set_scene_pos(px, py)
+
+        def done():
+            # O push executa redo(): grava as posições finais e o diário
+            self.scene.undo_stack.push(command)
+            self.finished.emit(len(nodes), compute_ms)
+
+        self._animation.valueChanged.connect(step)
+        self._animation.finished.connect(done)
+        self._animation.start()
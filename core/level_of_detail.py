@@ -0,0 +1,71 @@
+import time
+from PySide6.QtWidgets import QStyleOptionGraphicsItem
+from PySide6.QtGui import QColor
+
+
+class LevelOfDetail:
+    """Limiares de zoom do modo simplificado para mapas vistos de longe"""
+
+    # Escala da view abaixo da qual cada detalhe deixa de ser desenhado
+    thresholds = {
+        "shadow": 0.6,     # sombras são omitidas
+        "text": 0.45,      # texto vira uma barra de placeholder
+        "hairline": 0.35,  # conexões viram linhas finas (caneta cosmética)
+        "gradient": 0.3,   # degradês viram cor sólida
+        "text_bar": 0.12,  # abaixo disso nem a barra de placeholder aparece
+    }
+
+    # Tempo de frame acumulado por faixa de detalhe: {faixa: [frames, ms]}
+    frame_stats = {}
+
+    @classmethod
+    def configure(cls, **values):
+        """Ajusta os limiares, ex.: LevelOfDetail.configure(text=0.6)"""
+        for name, value in values.items():
+            if name not in cls.thresholds:
+                raise ValueError(f"Limiar de detalhe desconhecido: {name}")
+            if value < 0:
+                raise ValueError(f"Limiar de detalhe negativo: {name}={value}")
+            cls.thresholds[name] = float(value)
+
+    @staticmethod
+    def from_painter(painter):
+        """Fator de escala efetivo com que o item está sendo desenhado"""
+        return QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+    @classmethod
+    def draws(cls, feature, lod):
+        return lod >= cls.thresholds[feature]
+
+    @classmethod
+    def tier(cls, lod):
+        """Nome da faixa de detalhe para o zoom informado"""
+        dropped = sum(1 for limit in cls.thresholds.values() if lod < limit)
+        if dropped == 0:
+            return "completo"
+        if dropped == len(cls.thresholds):
+            return "mínimo"
+        return "reduzido"
+
+    @staticmethod
+    def flat_color(top, bottom):
+        """Cor sólida equivalente a um degradê (média das pontas, em ARGB)"""
+        first, last = QColor.fromRgba(top), QColor.fromRgba(bottom)
+        return QColor((first.red() + last.red()) // 2,
+                      (first.green() + last.green()) // 2,
+                      (first.blue() + last.blue()) // 2,
+                      (first.alpha() + last.alpha()) // 2)
+
+    @classmethod
+    def record_frame(cls, lod, started):
+        """Acumula o tempo de um frame (started = time.perf_counter() no início)"""
+        elapsed = (time.perf_counter() - started) * 1000.0
+        entry = cls.frame_stats.setdefault(cls.tier(lod), [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        return elapsed
+
+    @classmethod
+    def average_frame_ms(cls):
+        """Tempo médio de frame (ms) por faixa de detalhe"""
+        return {tier: total / frames for tier, (frames, total) in cls.frame_stats.items() if frames}
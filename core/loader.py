@@ -0,0 +1,329 @@
+import json
+import queue
+import threading
+import time
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtGui import QBrush, QColor
+from core.records import NodeRecord, ConnectionRecord, DEFAULT_NODE_SIZE
+from core.binary_format import BinaryMapReader, is_binary_map, iter_binary_records, FLAG_FILL, FLAG_FOLDED
+
+MAX_NODE_ID = 0xFFFFFFFF
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+def _skip(text, pos, chars=_WHITESPACE):
+    while pos < len(text) and text[pos] in chars:
+        pos += 1
+    return pos
+
+
+def iter_json_records(text):
+    """
+    Percorre o JSON elemento a elemento, sem montar a estrutura inteira.
+    Gera (chave, elemento, posição): chave é None para uma lista no topo
+    (.amarelo) ou o nome da lista dentro do objeto do topo (.amind).
+    """
+    pos = _skip(text, 0)
+    if pos >= len(text):
+        return
+    if text[pos] == '[':
+        yield from _iter_array(text, pos, None, [0])
+        return
+    if text[pos] != '{':
+        raise ValueError("Arquivo de mapa inválido")
+
+    pos = _skip(text, pos + 1)
+    while pos < len(text) and text[pos] != '}':
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _skip(text, pos)
+        if text[pos] != ':':
+            raise ValueError("Arquivo de mapa inválido")
+        pos = _skip(text, pos + 1)
+        if text[pos] == '[':
+            end = [pos]
+            yield from _iter_array(text, pos, key, end)
+            pos = end[0]
+        else:
+            _, pos = _decoder.raw_decode(text, pos)
+        pos = _skip(text, pos, _WHITESPACE + ",")
+
+
+def _iter_array(text, pos, key, end):
+    """Gera os elementos da lista que começa em pos; end[0] recebe a posição após o ']'"""
+    pos = _skip(text, pos + 1)
+    while pos < len(text) and text[pos] != ']':
+        value, pos = _decoder.raw_decode(text, pos)
+        pos = _skip(text, pos, _WHITESPACE + ",")
+        yield key, value, pos
+    end[0] = pos + 1
+
+
+def _argb(name):
+    return QColor(name).rgba() if name else None
+
+
+def iter_map_records(text):
+    """
+    Normaliza os dois formatos JSON em registros ("node" | "connection", registro, posição).
+    A posição é o deslocamento no texto, usado como progresso.
+    """
+    width, height = DEFAULT_NODE_SIZE
+    for key, value, pos in iter_json_records(text):
+        if key is None:
+            # Formato .amarelo: lista plana de nós, sem conexões
+            yield "node", NodeRecord(pos, "rectangle", value["pos"][0], value["pos"][1], width, height,
+                                     value.get("text", ""), _argb(value.get("color")), None), pos
+        elif key == "nodes":
+            yield "node", NodeRecord(value["id"], value.get("type", "rectangle"), value["x"], value["y"],
+                                     value.get("w", width), value.get("h", height), value.get("text", ""),
+                                     _argb(value.get("color")), None), pos
+        elif key == "connections":
+            yield "connection", ConnectionRecord(value["source_id"], value["target_id"],
+                                                 _argb(value.get("color")), value.get("label", "")), pos
+
+
+def open_map_records(file_path):
+    """Abre um mapa em qualquer formato: devolve (registros, total para o progresso)"""
+    if is_binary_map(file_path):
+        with BinaryMapReader(file_path) as reader:
+            total = reader.node_count + reader.connection_count
+        return iter_binary_records(file_path), max(total, 1)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return iter_map_records(text), max(len(text), 1)
+
+
+def build_node(record):
+    """Cria o item gráfico de um registro de nó (só na thread da interface)"""
+    from items.shapes import StyledNode, EllipseNode
+
+    from core.style_manager import StyleManager
+
+    node_cls = EllipseNode if record.kind == "ellipse" else StyledNode
+    # IDs de arquivos JSON antigos (id() da sessão) não cabem em 32 bits: são renumerados
+    node_id = record.id if 0 < record.id <= MAX_NODE_ID else None
+    style = StyleManager.registry.intern(record.style) if record.style is not None else None
+    node = node_cls(record.x, record.y, text=record.text, node_id=node_id, style=style)
+    node.setRect(0, 0, record.w, record.h)
+    if style is None:
+        apply_fill(node, record.fill, record.fill_end)
+    return node
+
+
+def apply_fill(node, fill, fill_end):
+    """Aplica cores ARGB gravadas (sólida ou degradê); None mantém o padrão"""
+    from core.style_manager import StyleManager
+
+    if fill is None:
+        return
+    if fill_end is None or fill_end == fill:
+        node.setBrush(QBrush(QColor.fromRgba(fill)))
+    else:
+        StyleManager.set_gradient_style(node, QColor.fromRgba(fill), QColor.fromRgba(fill_end))
+
+
+def build_connection(record, node_map):
+    """Cria a conexão entre dois nós já carregados (ou None se faltar um deles)"""
+    from core.connection import SmartConnection
+
+    src = node_map.get(record.source_id)
+    tgt = node_map.get(record.target_id)
+    if src is None or tgt is None:
+        return None
+    conn = SmartConnection(src, tgt)
+    if record.color is not None:
+        conn.change_color(QColor.fromRgba(record.color))
+    if record.label:
+        conn.set_label_text(record.label)
+    return conn
+
+
+class MapLoader(QObject):
+    """
+    Carregador de mapas que não trava a janela: o arquivo é lido e decodificado
+    numa thread e os itens são criados na cena em fatias de poucos milissegundos.
+    Nós dentro de ramos recolhidos entram só no documento, sem item.
+    """
+    progress = Signal(int, int)  # (bytes processados, total)
+    finished = Signal(int, int)  # (nós, conexões)
+    canceled = Signal()
+    failed = Signal(str)
+
+    def __init__(self, scene, file_path, records=None, total=1, batch_size=256, budget_ms=12, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000.0
+        self.node_map = {}
+        self.connection_count = 0
+        # Nós de ramos recolhidos (entram só no documento)
+        self._hidden_count = 0
+
+        # records: gerador alternativo de (tipo, registro, posição), ex. importadores;
+        # total: onde a posição termina (para o progresso)
+        self._records = records
+        self._total = total
+        self._done = 0
+        self._queue = queue.Queue(maxsize=64)
+        self._cancel = threading.Event()
+        self._worker = None
+        self._pending = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._consume)
+
+    # --- Thread de leitura ---
+
+    def _open_records(self):
+        if self._records is not None:
+            return self._records
+        records, self._total = open_map_records(self.file_path)
+        return records
+
+    def _read(self):
+        try:
+            records = self._open_records()
+            batch = []
+            for record in records:
+                if self._cancel.is_set():
+                    return
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._put(batch)
+                    batch = []
+            self._put(batch)
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # Fila limitada: a leitura não corre muito à frente da montagem
+        while not self._cancel.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    # --- Montagem na thread da interface ---
+
+    def start(self):
+        self._worker = threading.Thread(target=self._read, name="MapLoader", daemon=True)
+        self._worker.start()
+        self._timer.start()
+
+    def cancel(self):
+        """Interrompe a leitura e descarta o que já tinha sido montado"""
+        if self._cancel.is_set():
+            return
+        self._cancel.set()
+        self._timer.stop()
+        self.scene.clear()
+        self.node_map.clear()
+        self.canceled.emit()
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def _consume(self):
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            if not self._pending:
+                try:
+                    batch = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    self._finish()
+                    return
+                if isinstance(batch, Exception):
+                    self._timer.stop()
+                    self._cancel.set()
+                    self.failed.emit(str(batch))
+                    return
+                self._pending = iter(batch)
+            # O orçamento é conferido a cada registro, não a cada lote
+            for record in self._pending:
+                self._build_record(*record)
+                if time.perf_counter() >= deadline:
+                    break
+            else:
+                self._pending = None
+        self.progress.emit(self._done, self._total)
+
+    def _build_record(self, kind, record, pos):
+        if kind == "node":
+            node = build_node(record)
+            self.scene.addItem(node)
+            self.node_map[record.id] = node
+            if record.folded:
+                self.scene.document.folded[node.doc_row] = True
+        elif kind == "connection":
+            conn = build_connection(record, self.node_map)
+            if conn is not None:
+                self.scene.addItem(conn)
+                self.connection_count += 1
+        elif kind == "hidden_nodes":
+            self._add_hidden_nodes(record)
+        elif kind == "hidden_connections":
+            self._add_hidden_connections(record)
+        self._done = pos
+
+    def _add_hidden_nodes(self, block):
+        """Ramos recolhidos: uma tabela inteira vira linhas do documento, sem itens"""
+        import numpy as np
+        from items.shapes import StyledNode
+        from core.style_manager import StyleManager
+
+        registry = StyleManager.registry
+        table = block.table
+        style_ids = np.full(len(table), registry.default.id, np.uint32)
+        style = table["style"].astype(np.int64)
+        styled = (style > 0) & (style <= len(block.styles))
+        if styled.any():
+            interned = np.array([registry.intern(k).id for k in block.styles], np.uint32)
+            style_ids[styled] = interned[style[styled] - 1]
+        # Sem estilo, mas com cores: o padrão com essas cores (como apply_fill)
+        colored = ~styled & (table["flags"] & FLAG_FILL != 0)
+        if colored.any():
+            pairs, inverse = np.unique(np.stack([table["fill"][colored], table["fill_end"][colored]], axis=1),
+                                       axis=0, return_inverse=True)
+            derived = [registry.derive(registry.default, fill=int(a), fill_end=int(b)).id for a, b in pairs]
+            style_ids[colored] = np.array(derived, np.uint32)[inverse.ravel()]
+        self.scene.document.add_hidden_nodes(table["id"], table["kind"], table["x"], table["y"], table["w"],
+                                             table["h"], style_ids, block.texts, table["flags"] & FLAG_FOLDED != 0)
+        if len(table):
+            # Os IDs ficam reservados, como os de nós criados
+            StyledNode._next_id = max(StyledNode._next_id, int(table["id"].max()) + 1)
+        self._hidden_count += len(table)
+
+    def _add_hidden_connections(self, block):
+        doc = self.scene.document
+        source, target = doc.rows_of_ids(block.table["source"]), doc.rows_of_ids(block.table["target"])
+        keep = (source >= 0) & (target >= 0)
+        doc.add_hidden_edges(source[keep], target[keep], block.table["color"][keep],
+                             [label for label, ok in zip(block.labels, keep.tolist()) if ok])
+        self.connection_count += int(keep.sum())
+
+    def _finish(self):
+        self._timer.stop()
+        self._done = self._total
+        folding = getattr(self.scene, 'folding', None)
+        if folding is not None:
+            folding.refresh()
+        # Limites e BSP de uma vez (na carga síncrona o timer da cena não roda)
+        update_bounds = getattr(self.scene, 'update_bounds', None)
+        if update_bounds is not None:
+            update_bounds()
+        self.progress.emit(self._total, self._total)
+        self.finished.emit(len(self.node_map) + self._hidden_count, self.connection_count)
+
+    def run_to_completion(self):
+        """Carrega tudo de forma síncrona (linha de comando, benchmarks)"""
+        for record in self._open_records():
+            self._build_record(*record)
+        self._finish()
+        return len(self.node_map) + self._hidden_count, self.connection_count
@@ -0,0 +1,245 @@
+import numpy as np
+from PySide6.QtWidgets import QDockWidget, QWidget
+from PySide6.QtCore import Qt, QObject, QTimer, QRectF, QPointF, QLineF, QSize
+from PySide6.QtGui import QPainter, QImage, QColor, QPen, QRegion
+from core.level_of_detail import LevelOfDetail
+
+
+class Minimap(QWidget):
+    """
+    Visão geral do mapa com o retângulo da área visível; clicar ou arrastar
+    leva a view até o ponto. O mapa inteiro é desenhado uma vez, em escala
+    reduzida, num QImage guardado (direto das colunas do documento, como no
+    modo simplificado de longe); depois só as regiões avisadas por
+    scene.changed são redesenhadas pela cena, acumuladas e aplicadas no
+    máximo algumas vezes por segundo, para não pesar na view principal.
+    """
+    THROTTLE_MS = 250
+    MAX_REGIONS = 64
+    MARGIN = 200.0
+    BACKGROUND = QColor("#ece6e6")
+
+    def __init__(self, scene, view, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.view = view
+        self.setMinimumSize(160, 120)
+        self.setCursor(Qt.PointingHandCursor)
+        self._image = None
+        self._map_rect = QRectF()   # área da cena coberta pela imagem
+        self._scale = 1.0           # pixels da imagem por unidade da cena
+        self._offset = QPointF()    # canto da área dentro do widget
+        self._pending = []          # regiões da cena a redesenhar
+        self._grown = False
+        self._rebuild = True
+        self._visible = QRectF()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._refresh)
+        self._connection = None
+        if hasattr(view, 'viewport_changed'):
+            view.viewport_changed.connect(self._viewport_changed)
+
+    def sizeHint(self):
+        return QSize(260, 200)
+
+    # --- Atualização do cache ---
+
+    def _schedule(self):
+        if self.isVisible() and not self._timer.isActive():
+            self._timer.start(self.THROTTLE_MS)
+
+    def _scene_changed(self, regions):
+        if self._rebuild:
+            return self._schedule()
+        for rect in regions:
+            if not self._map_rect.contains(rect):
+                # O mapa cresceu para fora da imagem: redesenha tudo numa área maior
+                self.invalidate()
+                self._grown = True
+                return
+            self._pending.append(rect)
+        if len(self._pending) > self.MAX_REGIONS:
+            # Muita coisa mudou (lote da abertura, layout): pintar de novo a partir
+            # dos arrays sai mais barato que um render da cena sobre tudo isso
+            self._rebuild = True
+            self._pending = []
+        self._schedule()
+
+    def invalidate(self):
+        """Descarta a imagem (cena limpa, janela redimensionada, mapa fora da área)"""
+        self._rebuild = True
+        self._grown = False
+        self._pending = []
+        self._schedule()
+
+    def _map_bounds(self):
+        doc = getattr(self.scene, 'document', None)
+        bounds = doc.bounds() if doc is not None else None
+        if bounds is None:
+            rect = self.scene.itemsBoundingRect()
+        else:
+            rect = QRectF(QPointF(bounds[0], bounds[1]), QPointF(bounds[2], bounds[3]))
+        if rect.isEmpty():
+            return QRectF()
+        # Folga para o mapa crescer sem redesenhar tudo; se já cresceu (ex.: durante
+        # a abertura), a folga é maior para não repetir a pintura completa a cada lote
+        pad = 0.5 if self._grown else 0.1
+        pad_x = max(self.MARGIN, rect.width() * pad)
+        pad_y = max(self.MARGIN, rect.height() * pad)
+        return rect.adjusted(-pad_x, -pad_y, pad_x, pad_y)
+
+    def _rebuild_image(self):
+        self._rebuild = False
+        self._map_rect = self._map_bounds()
+        self._grown = False
+        self._pending = []
+        self._image = QImage(self.size() * self.devicePixelRatioF(), QImage.Format_ARGB32_Premultiplied)
+        self._image.setDevicePixelRatio(self.devicePixelRatioF())
+        self._image.fill(self.BACKGROUND)
+        if self._map_rect.isEmpty():
+            return
+        w, h = self.width(), self.height()
+        self._scale = min(w / self._map_rect.width(), h / self._map_rect.height())
+        self._offset = QPointF((w - self._map_rect.width() * self._scale) / 2,
+                               (h - self._map_rect.height() * self._scale) / 2)
+        painter = QPainter(self._image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        doc = getattr(self.scene, 'document', None)
+        if doc is not None:
+            self._paint_document(painter, doc)
+        else:
+            self.scene.render(painter, self.to_widget(self._map_rect), self._map_rect, Qt.IgnoreAspectRatio)
+        painter.end()
+
+    def _paint_document(self, painter, doc):
+        """
+        Pintura completa a partir dos arrays: linhas entre os centros e
+        retângulos de cor chapada, agrupados por cor. É o que o modo
+        simplificado desenharia nessa escala, sem um paint() por item.
+        """
+        painter.translate(self._offset)
+        painter.scale(self._scale, self._scale)
+        painter.translate(-self._map_rect.topLeft())
+        rows = doc.live_rows()
+        cx, cy = doc.x + doc.w / 2, doc.y + doc.h / 2
+
+        edges = doc.live_edges()
+        src, tgt, colors = doc.edge_source[edges], doc.edge_target[edges], doc.edge_color[edges]
+        for color in np.unique(colors).tolist():
+            chosen = colors == color
+            s, t = src[chosen], tgt[chosen]
+            painter.setPen(QPen(QColor.fromRgba(color), 0))
+            painter.drawLines([QLineF(*line) for line in
+                               zip(cx[s].tolist(), cy[s].tolist(), cx[t].tolist(), cy[t].tolist())])
+
+        painter.setPen(Qt.NoPen)
+        keys = (doc.fill[rows].astype(np.uint64) << np.uint64(32)) | doc.fill_end[rows]
+        for key in np.unique(keys).tolist():
+            chosen = rows[keys == key]
+            painter.setBrush(LevelOfDetail.flat_color(key >> 32, key & 0xFFFFFFFF))
+            painter.drawRects([QRectF(*rect) for rect in
+                               zip(doc.x[chosen].tolist(), doc.y[chosen].tolist(),
+                                   doc.w[chosen].tolist(), doc.h[chosen].tolist())])
+
+    def _refresh(self):
+        if not self.isVisible():
+            return
+        if self._rebuild or self._image is None:
+            self._rebuild_image()
+        elif self._pending:
+            # Cada render da cena tem um custo fixo: todas as regiões sujas vão
+            # num só, recortado na união delas
+            clip, source = QRegion(), QRectF()
+            for rect in self._pending:
+                rect = rect.intersected(self._map_rect)
+                if not rect.isEmpty():
+                    clip += self.to_widget(rect).toAlignedRect()
+                    source = source.united(rect)
+            self._pending = []
+            if not source.isEmpty():
+                target = self.to_widget(source)
+                painter = QPainter(self._image)
+                painter.setRenderHint(QPainter.Antialiasing)
+                painter.setClipRegion(clip)
+                painter.fillRect(target, self.BACKGROUND)
+                self.scene.render(painter, target, source, Qt.IgnoreAspectRatio)
+                painter.end()
+        self.update()
+
+    # --- Coordenadas ---
+
+    def to_widget(self, rect):
+        s = self._scale
+        return QRectF(self._offset.x() + (rect.x() - self._map_rect.x()) * s,
+                      self._offset.y() + (rect.y() - self._map_rect.y()) * s,
+                      rect.width() * s, rect.height() * s)
+
+    def to_scene(self, point):
+        s = self._scale or 1.0
+        return QPointF(self._map_rect.x() + (point.x() - self._offset.x()) / s,
+                       self._map_rect.y() + (point.y() - self._offset.y()) / s)
+
+    # --- Eventos ---
+
+    def _viewport_changed(self, rect):
+        self._visible = rect
+        self.update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Só escuta scene.changed enquanto aparece (ligado, o Qt passa a juntar
+        # os retângulos sujos de cada frame); ao voltar, redesenha
+        if self._connection is None:
+            self._connection = self.scene.changed.connect(self._scene_changed)
+        self.invalidate()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if self._connection is not None:
+            QObject.disconnect(self._connection)
+            self._connection = None
+        self._timer.stop()
+        self._image = None
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.invalidate()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.fillRect(self.rect(), self.BACKGROUND)
+            return
+        painter.drawImage(0, 0, self._image)
+        if not self._visible.isEmpty() and not self._map_rect.isEmpty():
+            frame = self.to_widget(self._visible)
+            painter.setPen(QPen(QColor("#e0218a"), 2))
+            painter.setBrush(QColor(224, 33, 138, 30))
+            painter.drawRect(frame)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._navigate(event.position())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._navigate(event.position())
+
+    def _navigate(self, point):
+        if self._map_rect.isEmpty():
+            return
+        self.view.centerOn(self.to_scene(point))
+
+
+class MinimapPanel(QDockWidget):
+    """Painel encaixável com o minimapa"""
+
+    def __init__(self, scene, view, parent=None):
+        super().__init__("Minimapa", parent)
+        self.minimap = Minimap(scene, view, self)
+        self.setWidget(self.minimap)
+
+    def reset(self):
+        self.minimap.invalidate()
@@ -0,0 +1,243 @@
+import functools
+import json
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from PySide6.QtWidgets import QWidget
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QPainter, QColor, QFont, QFontMetrics
+from core.atomic_file import atomic_write
+
+
+class PerfMonitor:
+    """
+    Contadores de desempenho do canvas. Desligado, cada ponto instrumentado
+    custa só um if; ligado, acumula por frame as chamadas de update_path, os
+    itemChange e o tempo de paint por classe. Com o trace ativo, os frames
+    viram eventos no formato do Chrome (chrome://tracing, Perfetto).
+    """
+    enabled = False
+    tracing = False
+    MAX_EVENTS = 200000
+
+    # Acumulado do frame em andamento
+    update_path_calls = 0
+    item_changes = Counter()
+    paint_ms = Counter()
+
+    # Frames recentes: (fim, ms do frame, update_path, itemChange, {classe: ms de paint})
+    frames = deque(maxlen=600)
+    events = deque(maxlen=MAX_EVENTS)
+    _epoch = time.perf_counter()
+
+    @classmethod
+    def set_enabled(cls, enabled):
+        cls.enabled = bool(enabled)
+        cls.reset()
+
+    @classmethod
+    def set_tracing(cls, tracing):
+        """Trace liga também os contadores; desligar não apaga os eventos já gravados"""
+        cls.tracing = bool(tracing)
+        if tracing and not cls.enabled:
+            cls.set_enabled(True)
+
+    @classmethod
+    def reset(cls):
+        cls.update_path_calls = 0
+        cls.item_changes.clear()
+        cls.paint_ms.clear()
+        cls.frames.clear()
+
+    # --- Pontos instrumentados ---
+
+    @classmethod
+    def count_update_path(cls):
+        cls.update_path_calls += 1
+
+    @classmethod
+    def add_paint(cls, name, started):
+        cls.paint_ms[name] += (time.perf_counter() - started) * 1000.0
+
+    @classmethod
+    @contextmanager
+    def span(cls, name, **args):
+        """Intervalo nomeado no trace (ex.: recálculo das conexões)"""
+        if not cls.tracing:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls._event(name, "X", started, dur=(time.perf_counter() - started) * 1e6, args=args)
+
+    @classmethod
+    def end_frame(cls, started, frame_ms):
+        """Fecha o frame pintado pela view: guarda os contadores e zera o acumulado"""
+        changes = sum(cls.item_changes.values())
+        paints = dict(cls.paint_ms)
+        cls.frames.append((time.perf_counter(), frame_ms, cls.update_path_calls, changes, paints))
+        if cls.tracing:
+            cls._event("frame", "X", started, dur=frame_ms * 1000.0,
+                       args={"update_path": cls.update_path_calls, "itemChange": changes})
+            cls._event("callbacks", "C", started,
+                       args={"update_path": cls.update_path_calls, "itemChange": changes})
+            if paints:
+                cls._event("paint_ms", "C", started, args={k: round(v, 3) for k, v in paints.items()})
+            cls._event("fps", "C", started, args={"fps": cls.fps()})
+        cls.update_path_calls = 0
+        cls.item_changes.clear()
+        cls.paint_ms.clear()
+
+    # --- Leituras ---
+
+    @classmethod
+    def fps(cls, window=1.0):
+        """Frames pintados no último segundo"""
+        now = time.perf_counter()
+        return sum(1 for f in reversed(cls.frames) if now - f[0] <= window) / window
+
+    @classmethod
+    def summary(cls, window=1.0):
+        """Médias por frame na janela recente (para o HUD)"""
+        now = time.perf_counter()
+        recent = [f for f in cls.frames if now - f[0] <= window] or list(cls.frames)[-1:]
+        if not recent:
+            return {"fps": 0.0, "frame_ms": 0.0, "update_path": 0, "itemChange": 0, "paint_ms": {}}
+        n = len(recent)
+        paint = Counter()
+        for f in recent:
+            paint.update(f[4])
+        return {
+            "fps": cls.fps(window),
+            "frame_ms": sum(f[1] for f in recent) / n,
+            "update_path": sum(f[2] for f in recent) / n,
+            "itemChange": sum(f[3] for f in recent) / n,
+            "paint_ms": {k: v / n for k, v in paint.most_common()},
+        }
+
+    # --- Trace (formato Trace Event do Chrome) ---
+
+    @classmethod
+    def _event(cls, name, phase, started, dur=None, args=None):
+        event = {"name": name, "cat": "canvas", "ph": phase, "pid": os.getpid(), "tid": 1,
+                 "ts": (started - cls._epoch) * 1e6}
+        if dur is not None:
+            event["dur"] = dur
+        if args:
+            event["args"] = args
+        cls.events.append(event)
+
+    @classmethod
+    def export_trace(cls, file_path):
+        """Grava os eventos em JSON para abrir no chrome://tracing ou no Perfetto"""
+        pid = os.getpid()
+        metadata = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "Amarelo Mind"}},
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": 1, "args": {"name": "Interface"}},
+        ]
+        with atomic_write(file_path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + list(cls.events), "displayTimeUnit": "ms"}, f)
+        return len(cls.events)
+
+
+def profiled_paint(paint):
+    """Decorador de paint(): mede o tempo por classe quando o monitor está ligado"""
+    @functools.wraps(paint)
+    def wrapper(self, painter, option, widget=None):
+        if not PerfMonitor.enabled:
+            return paint(self, painter, option, widget)
+        started = time.perf_counter()
+        try:
+            return paint(self, painter, option, widget)
+        finally:
+            PerfMonitor.add_paint(type(self).__name__, started)
+    return wrapper
+
+
+def counted_item_change(item_change):
+    """Decorador de itemChange(): conta as chamadas por classe quando o monitor está ligado"""
+    @functools.wraps(item_change)
+    def wrapper(self, change, value):
+        if PerfMonitor.enabled:
+            PerfMonitor.item_changes[type(self).__name__] += 1
+        return item_change(self, change, value)
+    return wrapper
+
+
+class PerfHud(QWidget):
+    """
+    Painel sobre o canvas com FPS, tempo de frame, itens visíveis/totais,
+    update_path e itemChange por frame e paint por classe. É opaco e se
+    redesenha num timer próprio, então não força repinturas da cena.
+    """
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(self.backgroundRole(), QColor(24, 24, 24))
+        self.setPalette(palette)
+        self.setFont(QFont("Monospace", 9))
+        self.lines = []
+        self._counts = {}
+        self._ticks = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(250)
+        self._timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_active(self, active):
+        PerfMonitor.set_enabled(active or PerfMonitor.tracing)
+        self.setVisible(active)
+        if active:
+            self._ticks = 0
+            self.refresh()
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def _item_counts(self):
+        scene = self.view.scene()
+        doc = getattr(scene, 'document', None)
+        if doc is None:
+            return {}
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        return doc.visible_counts(rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def refresh(self):
+        # Contagem de itens (O(n) em arrays) a cada 2 ticks; o resto a cada tick
+        if self._ticks % 2 == 0:
+            self._counts = self._item_counts()
+        self._ticks += 1
+        stats = PerfMonitor.summary()
+        lines = [
+            f"FPS {stats['fps']:5.1f}   frame {stats['frame_ms']:6.2f} ms",
+            f"update_path/frame {stats['update_path']:7.1f}",
+            f"itemChange/frame  {stats['itemChange']:7.1f}",
+        ]
+        for name, (visible, total) in self._counts.items():
+            lines.append(f"{name:<11} {visible:>7} / {total:<7}")
+        for name, ms in list(stats["paint_ms"].items())[:6]:
+            lines.append(f"paint {name:<16} {ms:6.2f} ms")
+        if PerfMonitor.tracing:
+            lines.append(f"● trace: {len(PerfMonitor.events)} eventos")
+        if lines != self.lines:
+            self.lines = lines
+            metrics = QFontMetrics(self.font())
+            self.resize(max(metrics.horizontalAdvance(l) for l in lines) + 16,
+                        metrics.lineSpacing() * len(lines) + 12)
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setPen(QColor("#f2f71d"))
+        metrics = painter.fontMetrics()
+        y = 6 + metrics.ascent()
+        for line in self.lines:
+            painter.drawText(8, y, line)
+            y += metrics.lineSpacing()
@@ -1,81 +1,121 @@
 import json
-from PySide6.QtCore import QPointF, QRectF
-from items.shapes import StyledNode, EllipseNode
-from core.connection import SmartConnection
+import time
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QColor
+from core.loader import MapLoader
+from core.importers import is_importable, open_import_records
+from core.atomic_file import atomic_write
+from core import binary_format
+
+
+def write_amarelo(file_path, snapshot):
+    """Formato .amarelo: lista plana de nós (posição, texto e cor), sem conexões"""
+    data = [{"pos": [x, y], "text": text, "color": QColor.fromRgba(fill).name()}
+            for x, y, text, fill in zip(snapshot.x.tolist(), snapshot.y.tolist(), snapshot.texts, snapshot.fill.tolist())]
+    with atomic_write(file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def write_snapshot(file_path, snapshot):
+    """Grava um retrato do documento no formato indicado pela extensão"""
+    if file_path.endswith(".amarelo"):
+        write_amarelo(file_path, snapshot)
+    else:
+        binary_format.write_document(file_path, snapshot)
+
+
+class SaveSignals(QObject):
+    finished = Signal(str, float, float)  # (arquivo, ms do retrato, ms da gravação)
+    failed = Signal(str, str)              # (arquivo, mensagem)
+
+
+class SaveTask(QRunnable):
+    """Serializa e grava o retrato fora da thread da interface"""
+
+    def __init__(self, file_path, snapshot, snapshot_ms, signals):
+        super().__init__()
+        self.file_path = file_path
+        self.snapshot = snapshot
+        self.snapshot_ms = snapshot_ms
+        self.signals = signals
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            write_snapshot(self.file_path, self.snapshot)
+        except Exception as e:
+            self.signals.failed.emit(self.file_path, str(e))
+            return
+        self.signals.finished.emit(self.file_path, self.snapshot_ms, (time.perf_counter() - started) * 1000.0)
+
 
 class PersistenceManager:
+    # Uma gravação por vez, na ordem em que foram pedidas
+    _pool = None
+
     def __init__(self, scene):
         self.scene = scene
         self.extension = ".amind"
+        self.signals = SaveSignals()
 
-    def save_to_file(self, file_path):
-        """Varre a cena e salva todos os dados em formato JSON"""
-        if not file_path.endswith(self.extension):
+    def snapshot(self):
+        """Retrato barato do documento (cópia dos arrays) para gravar em outra thread"""
+        # Um texto ainda em edição só chega ao documento ao perder o foco
+        focus = self.scene.focusItem()
+        node = focus.parentItem() if focus is not None else None
+        if hasattr(node, 'sync_text'):
+            node.sync_text()
+        # Ramos ocultos acompanham os nós recolhidos que se moveram
+        folding = getattr(self.scene, 'folding', None)
+        if folding is not None:
+            folding.settle()
+        return self.scene.document.snapshot()
+
+    def _normalize(self, file_path):
+        if not file_path.endswith((self.extension, ".amarelo")):
             file_path += self.extension
+        return file_path
+
+    def save_to_file(self, file_path):
+        """Salva de forma síncrona (.amind binário ou .amarelo)"""
+        file_path = self._normalize(file_path)
+        write_snapshot(file_path, self.snapshot())
+        return file_path
+
+    def save_async(self, file_path):
+        """
+        Tira o retrato na thread da interface e grava num pool de threads.
+        O resultado chega pelos sinais self.signals.finished / failed.
+        """
+        file_path = self._normalize(file_path)
+        started = time.perf_counter()
+        snapshot = self.snapshot()
+        snapshot_ms = (time.perf_counter() - started) * 1000.0
+
+        if PersistenceManager._pool is None:
+            PersistenceManager._pool = QThreadPool()
+            PersistenceManager._pool.setMaxThreadCount(1)
+        PersistenceManager._pool.start(SaveTask(file_path, snapshot, snapshot_ms, self.signals))
+        return file_path
 
-        data = {
-            "nodes": [],
-            "connections": []
-        }
-
-        # Separar itens para salvar na ordem correta
-        for item in self.scene.items():
-            if isinstance(item, StyledNode):
-                node_data = {
-                    "type": "rectangle" if not isinstance(item, EllipseNode) else "ellipse",
-                    "x": item.pos().x(),
-                    "y": item.pos().y(),
-                    "w": item.rect().width(),
-                    "h": item.rect().height(),
-                    "text": item.text_item.toPlainText(),
-                    "id": id(item) # ID temporário para mapear conexões
-                }
-                data["nodes"].append(node_data)
-            
-            elif isinstance(item, SmartConnection):
-                conn_data = {
-                    "source_id": id(item.source),
-                    "target_id": id(item.target),
-                    "color": item.line_color.name(),
-                    "label": item.label.toPlainText() if item.label else ""
-                }
-                data["connections"].append(conn_data)
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-
-    def load_from_file(self, file_path):
-        """Limpa a cena e reconstrói o mapa a partir do arquivo"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    @staticmethod
+    def wait_for_saves(msecs=-1):
+        """Aguarda as gravações pendentes (ex.: antes de fechar a janela)"""
+        if PersistenceManager._pool is not None:
+            return PersistenceManager._pool.waitForDone(msecs)
+        return True
 
+    def load_from_file(self, file_path, parent=None):
+        """
+        Limpa a cena e reconstrói o mapa em segundo plano.
+        Devolve o MapLoader já iniciado (progresso, cancelamento e fim por sinais).
+        """
         self.scene.clear()
-        node_map = {} # De-serialização de IDs
-
-        # 1. Recriar os Nós
-        for n in data["nodes"]:
-            if n["type"] == "rectangle":
-                node = StyledNode(n["x"], n["y"])
-            else:
-                node = EllipseNode(n["x"], n["y"])
-            
-            node.setRect(0, 0, n["w"], n["h"])
-            node.text_item.setPlainText(n["text"])
-            node.update_handle_positions()
-            
-            self.scene.addItem(node)
-            node_map[n["id"]] = node
-
-        # 2. Recriar as Conexões
-        # Nota: Como as IDs mudam ao fechar o app, o carregamento de 
-        # conexões entre sessões exige uma lógica de mapeamento espacial 
-        # ou ID persistente. Para esta versão, reconstruímos a estrutura.
-        for c in data["connections"]:
-            src = node_map.get(c["source_id"])
-            tgt = node_map.get(c["target_id"])
-            if src and tgt:
-                conn = SmartConnection(src, tgt)
-                conn.change_color(c["color"])
-                if c["label"]:
-                    conn.set_label_text(c["label"])
-                self.scene.addItem(conn)
\ No newline at end of file
+        if is_importable(file_path):
+            # FreeMind, OPML, Markdown: mesmos lotes, registros vindos do importador
+            records, total = open_import_records(file_path)
+            loader = MapLoader(self.scene, file_path, records=records, total=total, parent=parent)
+        else:
+            loader = MapLoader(self.scene, file_path, parent=parent)
+        loader.start()
+        return loader
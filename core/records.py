@@ -0,0 +1,10 @@
+from collections import namedtuple
+
+# Registros leves trocados entre leitores de arquivo, carregador e gravadores.
+# Cores são inteiros ARGB (QColor.rgba()) ou None para o estilo padrão.
+# style: StyleKey completo ou None (arquivos antigos, só com as cores)
+# folded: o ramo que sai do nó está recolhido
+NodeRecord = namedtuple("NodeRecord", "id kind x y w h text fill fill_end style folded", defaults=(None, False))
+ConnectionRecord = namedtuple("ConnectionRecord", "source_id target_id color label")
+
+DEFAULT_NODE_SIZE = (160.0, 60.0)
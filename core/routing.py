@@ -0,0 +1,231 @@
+import math
+import numpy as np
+from PySide6.QtCore import QPointF
+from PySide6.QtGui import QPainterPath
+from core.snapping import SpatialGrid
+
+MODES = ("straight", "curved", "orthogonal")
+
+
+def _segment_hits(points, rects):
+    """
+    Quantos retângulos (k x 4: x0, y0, x1, y1) cada polilinha (... x n x 2)
+    cruza, contando por trecho: caixas que se tocam e cantos dos dois lados da
+    reta do trecho. Trechos de comprimento zero não contam.
+    """
+    if len(rects) == 0:
+        return np.zeros(points.shape[:-2], dtype=int)
+    p, q = points[..., :-1, None, :], points[..., 1:, None, :]
+    lo, hi = np.minimum(p, q), np.maximum(p, q)
+    overlap = ((lo[..., 0] <= rects[:, 2]) & (hi[..., 0] >= rects[:, 0]) &
+               (lo[..., 1] <= rects[:, 3]) & (hi[..., 1] >= rects[:, 1]))
+    d = q - p
+    side = [(rects[:, cx] - p[..., 0]) * d[..., 1] - (rects[:, cy] - p[..., 1]) * d[..., 0]
+            for cx, cy in ((0, 1), (2, 1), (0, 3), (2, 3))]
+    above = (side[0] > 0) & (side[1] > 0) & (side[2] > 0) & (side[3] > 0)
+    below = (side[0] < 0) & (side[1] < 0) & (side[2] < 0) & (side[3] < 0)
+    moving = (d[..., 0] != 0) | (d[..., 1] != 0)
+    return np.count_nonzero(overlap & moving & ~above & ~below, axis=(-2, -1))
+
+
+class ConnectionRouter:
+    """
+    Roteamento das conexões. "straight" é a reta centro a centro de sempre;
+    "curved" e "orthogonal" desviam dos nós do caminho, consultando o índice
+    espacial do magnetismo (só os nós perto do trecho). Cada rota roteada
+    guarda o seu corredor num índice próprio: quando um nó muda de lugar, só
+    são refeitas (pelo mesmo lote por frame das demais) as rotas que ele passa
+    a cruzar e as que tinham desviado dele. Os rótulos procuram, ao longo da
+    rota, um lugar livre de nós e de outros rótulos.
+    """
+    CLEARANCE = 12.0     # folga mínima entre a rota e um nó
+    MAX_DETOURS = 6      # desvios laterais tentados por eixo
+    CURVE_SAMPLES = 16
+    LABEL_STOPS = (0.5, 0.4, 0.6, 0.3, 0.7, 0.2, 0.8)
+
+    def __init__(self, nodes):
+        # Índice dos nós (o do magnetismo): obstáculos
+        self.nodes = nodes
+        self.mode = "straight"
+        # Corredores são longos: células maiores que as dos nós
+        self.corridors = SpatialGrid(cell=1024.0)
+        self.labels = SpatialGrid()
+        # conexão -> (pontos da rota, n x 2; pontos do traçado preferido, se
+        # ela desviou dele)
+        self._routes = {}
+
+    def clear(self):
+        self.corridors.clear()
+        self.labels.clear()
+        self._routes.clear()
+
+    def forget(self, conn):
+        """A conexão saiu da cena"""
+        self.corridors.remove(conn)
+        self.labels.remove(conn)
+        self._routes.pop(conn, None)
+
+    # --- Rerroteamento incremental ---
+
+    def region_changed(self, old, new):
+        """Um nó saiu de old e foi para new (retângulos (x0, y0, x1, y1) ou None)"""
+        if self.mode == "straight":
+            return
+        m = self.CLEARANCE
+        if new is not None:
+            box = np.array((new,)) + (-m, -m, m, m)
+            for conn in self.corridors.query(*new):
+                if _segment_hits(self._routes[conn][0], box):
+                    conn.invalidate()
+        if old is not None:
+            # Um nó que sai do traçado preferido pode liberá-lo
+            box = np.array((old,)) + (-m, -m, m, m)
+            for conn in self.corridors.query(*old):
+                preferred = self._routes[conn][1]
+                if preferred is not None and _segment_hits(preferred, box):
+                    conn.invalidate()
+
+    # --- Rotas ---
+
+    def route(self, conn, source_rect, target_rect):
+        """
+        Caminho (QPainterPath, em coordenadas da cena) para a conexão, ou None
+        para a reta simples. Os retângulos são QRectF da cena.
+        """
+        if self.mode == "straight" or source_rect.intersects(target_rect):
+            self._forget_route(conn)
+            return None
+        a, b = source_rect.center(), target_rect.center()
+        ignore = (conn.source, conn.target)
+        if self.mode == "orthogonal":
+            points, preferred = self._orthogonal(a, b, ignore)
+            path = QPainterPath(QPointF(*points[0]))
+            for x, y in points[1:]:
+                path.lineTo(x, y)
+        else:
+            points, c1, c2, preferred = self._curved(a, b, ignore)
+            path = QPainterPath(a)
+            path.cubicTo(c1, c2, b)
+        # Corredor: a rota e, se ela desviou, o traçado preferido, com folga
+        both = points if preferred is None else np.vstack((points, preferred))
+        (x0, y0), (x1, y1) = both.min(axis=0), both.max(axis=0)
+        m = self.CLEARANCE
+        self.corridors.update(conn, (x0 - m, y0 - m, x1 + m, y1 + m))
+        self._routes[conn] = (points, preferred)
+        return path
+
+    def _forget_route(self, conn):
+        self.corridors.remove(conn)
+        self._routes.pop(conn, None)
+
+    def _obstacles(self, points, ignore):
+        """Retângulos (com folga) dos nós na caixa dos pontos, num array k x 4"""
+        m = self.CLEARANCE
+        (x0, y0), (x1, y1) = points.min(axis=0) - m, points.max(axis=0) + m
+        found = [r for n, r in self.nodes.query(x0, y0, x1, y1).items() if n not in ignore]
+        return np.array(found, dtype=float).reshape(-1, 4) + (-m, -m, m, m)
+
+    def _collisions(self, points, ignore):
+        return int(_segment_hits(points, self._obstacles(points, ignore)))
+
+    def _orthogonal(self, a, b, ignore):
+        """
+        Candidatas em L e em Z (meio em x ou em y); as posições do trecho do
+        meio vêm do ponto médio e das bordas dos obstáculos entre as pontas.
+        Vence a de menos colisões, depois a mais curta com menos curvas; todas
+        são testadas de uma vez contra os obstáculos.
+        """
+        ax, ay, bx, by = a.x(), a.y(), b.x(), b.y()
+        mid_x, mid_y = (ax + bx) / 2, (ay + by) / 2
+        xs, ys = [mid_x], [mid_y]
+        # Uma consulta só: as candidatas ficam na caixa das pontas (mais a folga)
+        between = self._obstacles(np.array(((ax, ay), (bx, by))), ignore)
+        # Bordas mais próximas do meio primeiro, logo do lado de fora (a borda
+        # em si ainda conta como colisão)
+        centers = np.abs((between[:, 0] + between[:, 2]) / 2 - mid_x) + np.abs((between[:, 1] + between[:, 3]) / 2 - mid_y)
+        for r in between[np.argsort(centers)[:self.MAX_DETOURS]]:
+            xs += [r[0] - 1, r[2] + 1]
+            ys += [r[1] - 1, r[3] + 1]
+        # Quatro pontos por candidata: as em L repetem a quina
+        candidates = [((ax, ay), (bx, ay), (bx, ay), (bx, by)), ((ax, ay), (ax, by), (ax, by), (bx, by))]
+        candidates += [((ax, ay), (x, ay), (x, by), (bx, by)) for x in xs]
+        candidates += [((ax, ay), (ax, y), (bx, y), (bx, by)) for y in ys]
+        pts = np.array(candidates)
+        hits = _segment_hits(pts, between)
+        steps = np.hypot(*np.moveaxis(np.diff(pts, axis=1), -1, 0))
+        cost = steps.sum(axis=1) + 20 * np.count_nonzero(steps, axis=1)
+        best, ideal = np.lexsort((cost, hits))[0], np.argmin(cost)
+        points = pts[best]
+        points = points[np.r_[True, np.any(np.diff(points, axis=0) != 0, axis=1)]]
+        return points, (pts[ideal] if best != ideal or hits[best] else None)
+
+    def _curved(self, a, b, ignore):
+        """
+        Curva em S (tangentes no eixo dominante, como num mapa mental); se
+        ela cruza nós, os pontos de controle são empurrados para um lado e
+        para o outro, cada vez mais: vence o primeiro desvio livre (ou o que
+        cruza menos). Os obstáculos de todos os desvios vêm de uma consulta só.
+        """
+        a, b = np.array(a.toTuple()), np.array(b.toTuple())
+        d = b - a
+        if abs(d[0]) >= abs(d[1]):
+            c1, c2 = a + (d[0] / 2, 0), b - (d[0] / 2, 0)
+        else:
+            c1, c2 = a + (0, d[1] / 2), b - (0, d[1] / 2)
+        length = math.hypot(*d) or 1.0
+        normal = np.array((-d[1], d[0])) / length
+        step = max(40.0, min(length * 0.25, 400.0))
+        k = np.arange(2 * self.MAX_DETOURS + 1)
+        bends = ((k + 1) // 2 * np.where(k % 2, 1, -1) * step)[:, None] * normal
+        # Pontos das cúbicas (uma por desvio): n x (CURVE_SAMPLES + 1) x 2
+        t = np.linspace(0.0, 1.0, self.CURVE_SAMPLES + 1)[None, :, None]
+        u = 1 - t
+        p1, p2 = (c1 + bends)[:, None, :], (c2 + bends)[:, None, :]
+        curves = u ** 3 * a + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t ** 3 * b
+        # A curva sem desvio costuma estar livre: consulta só a caixa dela antes
+        if self._collisions(curves[0], ignore) == 0:
+            return curves[0], QPointF(*c1), QPointF(*c2), None
+        obstacles = self._obstacles(curves.reshape(-1, 2), ignore)
+        best = None
+        for i in range(1, len(curves)):
+            (x0, y0), (x1, y1) = curves[i].min(axis=0), curves[i].max(axis=0)
+            near = obstacles[(obstacles[:, 0] <= x1) & (obstacles[:, 2] >= x0) &
+                             (obstacles[:, 1] <= y1) & (obstacles[:, 3] >= y0)]
+            hits = int(_segment_hits(curves[i], near))
+            if best is None or hits < best[0]:
+                best = (hits, i)
+            if hits == 0:
+                break
+        i = best[1]
+        return curves[i], QPointF(*p1[i, 0]), QPointF(*p2[i, 0]), curves[0]
+
+    # --- Rótulos ---
+
+    def place_label(self, conn, size):
+        """
+        Canto superior esquerdo do rótulo: o primeiro ponto da rota (do meio
+        para as pontas, e um pouco acima ou abaixo dela) onde ele não cobre
+        nós nem outros rótulos. Sem lugar livre, fica no meio.
+        """
+        w, h = size.width(), size.height()
+        path = getattr(conn, 'route', None)
+        line = conn.line()
+        first = None
+        for t in self.LABEL_STOPS:
+            point = path.pointAtPercent(t) if path is not None else line.pointAt(t)
+            for shift in (0.0, -h, h):
+                x0, y0 = point.x() - w / 2, point.y() - h / 2 + shift
+                rect = (x0, y0, x0 + w, y0 + h)
+                if first is None:
+                    first = rect
+                if self._label_free(conn, rect):
+                    self.labels.update(conn, rect)
+                    return QPointF(x0, y0)
+        self.labels.update(conn, first)
+        return QPointF(first[0], first[1])
+
+    def _label_free(self, conn, rect):
+        for other in self.labels.query(*rect):
+            if other is not conn:
+                return False
+        return not self.nodes.query(*rect)
@@ -0,0 +1,257 @@
+import math
+from contextlib import contextmanager
+from PySide6.QtWidgets import QGraphicsScene
+from PySide6.QtCore import QTimer, Qt, QRectF
+from PySide6.QtGui import QPen, QColor
+from core.graph_index import GraphIndex
+from core.document import MapDocument
+from core.snapping import SnapEngine
+from core.perf_monitor import PerfMonitor
+from core.search_index import SearchIndex
+from core.routing import ConnectionRouter
+from core.folding import BranchFolding
+from items.selection_overlay import SelectionOverlay
+
+
+class MindMapScene(QGraphicsScene):
+    """Cena do mapa mental: guarda o índice de conexões junto com os itens"""
+    # Limites: o conteúdo com folga, em passos largos (mudar o sceneRect
+    # refaz a BSP inteira, então ele não acompanha cada movimento)
+    BOUNDS_MARGIN = 1000.0
+    BOUNDS_STEP = 4096.0
+    # BSP com ~ITEMS_PER_LEAF itens por folha
+    ITEMS_PER_LEAF = 8
+    MIN_INDEX_DEPTH = 5
+    MAX_INDEX_DEPTH = 18
+    # Lotes de movimento a partir deste tamanho desligam o índice até o fim
+    BULK_INDEX_MIN = 1000
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.graph = GraphIndex()
+        # Modelo em arrays; os nós e conexões da cena são vistas dele
+        self.document = MapDocument()
+        # Magnetismo (índice espacial dos nós + guias de alinhamento)
+        self.snapping = SnapEngine()
+        self._guide_pen = QPen(QColor("#e0218a"), 0, Qt.DashLine)
+        # Rotas das conexões: os obstáculos vêm do mesmo índice espacial
+        self.router = ConnectionRouter(self.snapping.index)
+        self.snapping.on_change = self._region_changed
+        # Ramos recolhidos: ficam só no documento, sem itens
+        self.folding = BranchFolding(self)
+        # Busca: textos alterados são reindexados em fatias quando a interface está ociosa
+        self.search = SearchIndex()
+        self.search.on_dirty = self._schedule_indexing
+        self._index_timer = QTimer(self)
+        self._index_timer.setInterval(0)
+        self._index_timer.timeout.connect(self._index_slice)
+        # Definidos pela janela principal: pilha de desfazer e diário de alterações
+        self.undo_stack = None
+        self.journal = None
+
+        # Conexões com geometria pendente, recalculadas uma vez por frame
+        self._dirty_connections = {}
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(0)
+        self._flush_timer.timeout.connect(self.flush_connections)
+
+        # Limites da cena e profundidade da BSP, revistos uma vez por frame
+        self._content = None     # (x0, y0, x1, y1) dos nós, ou None
+        self._recount = False    # um nó saiu da borda: recalcula pelo documento
+        self._bounds = None
+        self._index_depth = 0
+        self._index_suspended = False
+        self._bounds_timer = QTimer(self)
+        self._bounds_timer.setSingleShot(True)
+        self._bounds_timer.setInterval(0)
+        self._bounds_timer.timeout.connect(self.update_bounds)
+        self.update_bounds()
+
+        # Alças de redimensionamento: um item só para toda a seleção
+        self.selection_overlay = None
+        self._add_overlay()
+        self.selectionChanged.connect(self._selection_changed)
+
+    def _add_overlay(self):
+        self.selection_overlay = SelectionOverlay()
+        self.addItem(self.selection_overlay)
+
+    def _selection_changed(self):
+        if self.selection_overlay is not None:
+            self.selection_overlay.selection_changed()
+
+    def schedule_connection_update(self, conn):
+        """Agenda o recálculo da linha; vários movimentos no mesmo frame viram um só"""
+        self._dirty_connections[conn] = None
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def has_pending_connections(self):
+        return bool(self._dirty_connections)
+
+    def flush_connections(self):
+        """Recalcula de uma vez todas as conexões marcadas como sujas"""
+        self._flush_timer.stop()
+        pending, self._dirty_connections = self._dirty_connections, {}
+        with PerfMonitor.span("flush_connections", count=len(pending)):
+            for conn in pending:
+                conn.update_path()
+
+    # --- Limites e índice espacial ---
+
+    def _region_changed(self, old, new):
+        """Um nó mudou de lugar, entrou ou saiu (retângulos do magnetismo)"""
+        self.router.region_changed(old, new)
+        c = self._content
+        if old is not None and c is not None and (old[0] <= c[0] or old[1] <= c[1]
+                                                  or old[2] >= c[2] or old[3] >= c[3]):
+            self._recount = True
+        elif new is not None and not self._recount:
+            self._content = new if c is None else (min(c[0], new[0]), min(c[1], new[1]),
+                                                   max(c[2], new[2]), max(c[3], new[3]))
+        if not self._bounds_timer.isActive():
+            self._bounds_timer.start()
+
+    @staticmethod
+    def _edge(current, wanted, step, low):
+        # Cresce na hora; só encolhe depois de sobrar mais de um passo
+        if current is not None and (wanted - step <= current <= wanted if low
+                                    else wanted <= current <= wanted + step):
+            return current
+        return wanted
+
+    def update_bounds(self):
+        """Ajusta o sceneRect ao conteúdo e a profundidade da BSP à quantidade de itens"""
+        self._bounds_timer.stop()
+        if self._recount:
+            self._recount = False
+            self._content = self.document.bounds()
+        x0, y0, x1, y1 = self._content or (0.0, 0.0, 0.0, 0.0)
+        m, step = self.BOUNDS_MARGIN, self.BOUNDS_STEP
+        wanted = (math.floor((x0 - m) / step) * step, math.floor((y0 - m) / step) * step,
+                  math.ceil((x1 + m) / step) * step, math.ceil((y1 + m) / step) * step)
+        current = self._bounds or (None,) * 4
+        bounds = tuple(self._edge(c, w, step, i < 2) for i, (c, w) in enumerate(zip(current, wanted)))
+        if bounds != self._bounds:
+            self._bounds = bounds
+            self.setSceneRect(QRectF(bounds[0], bounds[1], bounds[2] - bounds[0], bounds[3] - bounds[1]))
+        self.tune_index()
+
+    def tune_index(self):
+        """
+        Profundidade da BSP pelo número de itens. O Qt, sozinho, refaz a
+        árvore a cada vez que o total dobra; aqui ela só muda quando a
+        profundidade ideal se afasta dois níveis da atual.
+        """
+        if self._index_suspended:
+            return
+        doc = self.document
+        count = len(doc.live_rows()) + len(doc.live_edges())
+        depth = math.ceil(math.log2(max(count / self.ITEMS_PER_LEAF, 1)))
+        depth = min(max(depth, self.MIN_INDEX_DEPTH), self.MAX_INDEX_DEPTH)
+        if self._index_depth == 0 or abs(depth - self._index_depth) >= 2:
+            self._index_depth = depth
+            self.setBspTreeDepth(depth)
+
+    @contextmanager
+    def bulk_index(self, count):
+        """
+        Movimento em lote, sem pintura no meio: com muitos itens (e boa parte
+        da cena), a BSP é desligada e montada uma vez no fim, em vez de
+        reinserir item a item. Lotes pequenos não compensam: sem o índice,
+        qualquer consulta percorre todos os itens e a árvore inteira é refeita.
+        """
+        suspend = (not self._index_suspended and count >= self.BULK_INDEX_MIN
+                   and count * 4 >= len(self.document.live_rows()))
+        if suspend:
+            self._index_suspended = True
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        try:
+            yield
+        finally:
+            if suspend:
+                self._index_suspended = False
+                self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+                # Índice novo: volta à profundidade automática do Qt
+                self._index_depth = 0
+                self.tune_index()
+
+    def set_routing(self, mode):
+        """Troca o modo de roteamento (reta, curva, ortogonal) e refaz todas as conexões"""
+        if mode == self.router.mode:
+            return
+        self.router.mode = mode
+        self.router.clear()
+        doc = self.document
+        for row in doc.live_edges().tolist():
+            doc.edge_views[row].invalidate()
+
+    def _schedule_indexing(self):
+        if not self._index_timer.isActive():
+            self._index_timer.start()
+
+    def _index_slice(self):
+        if self.search.flush(budget_ms=8):
+            self._index_timer.stop()
+
+    def clear(self):
+        # QGraphicsScene.clear() não dispara itemChange, então zeramos o índice aqui
+        self.graph.clear()
+        self.document.clear()
+        self.snapping.clear()
+        self.router.clear()
+        self.folding.clear()
+        self.search.clear()
+        self._index_timer.stop()
+        self._dirty_connections.clear()
+        self._content, self._recount = None, False
+        # clear() apaga também o overlay; um novo entra depois
+        self.selection_overlay = None
+        super().clear()
+        self._add_overlay()
+        self.update_bounds()
+
+    # --- Magnetismo ---
+
+    def begin_drag(self, items):
+        self.snapping.begin_drag(items)
+
+    def end_drag(self):
+        self.update(SnapEngine.bounds_of(self.snapping.end_drag()))
+
+    def snap_position(self, item, pos):
+        """Chamado pelo itemChange do nó: encaixa e redesenha só a área das guias"""
+        engine = self.snapping
+        if not engine.enabled or not engine.is_dragging(item):
+            return pos
+        old = engine.guides
+        pos = engine.snap(item, pos)
+        if engine.guides != old:
+            self.update(SnapEngine.bounds_of(old))
+            self.update(SnapEngine.bounds_of(engine.guides))
+        return pos
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if self.snapping.guides:
+            painter.setPen(self._guide_pen)
+            painter.drawLines(self.snapping.guides)
+
+    def remove_items(self, items):
+        """
+        Remove os itens e, em cascata, as conexões ligadas aos nós removidos.
+        Devolve a lista do que saiu de fato da cena (para desfazer).
+        """
+        doomed = {}
+        for item in items:
+            for conn in self.graph.connections_of(item):
+                doomed[conn] = None
+            doomed[item] = None
+
+        removed = []
+        for item in doomed:
+            if item.scene() is self:
+                self.removeItem(item)
+                removed.append(item)
+        return removed
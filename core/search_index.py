@@ -0,0 +1,136 @@
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Minúsculas e sem acentos: "Ação" e "acao" viram o mesmo termo"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return _WORD.findall(normalize(text))
+
+
+class SearchIndex:
+    """
+    Índice invertido (termo normalizado -> itens) sobre o texto dos nós e dos
+    rótulos das conexões. As alterações de texto só marcam o item como sujo;
+    a reindexação é feita item a item (em fatias ociosas ou antes da busca),
+    nunca reconstruindo o índice inteiro. Os termos ficam numa lista ordenada
+    para a busca por prefixo.
+    """
+
+    def __init__(self):
+        self._postings = {}  # termo -> {item: None}
+        self._terms = {}     # item -> frozenset de termos
+        self._sorted = []    # termos em ordem, para bisect
+        self._dirty = {}
+        # Chamado quando há itens a reindexar (a cena agenda o processamento)
+        self.on_dirty = None
+
+    def __len__(self):
+        return len(self._terms)
+
+    def term_count(self):
+        return len(self._sorted)
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._sorted.clear()
+        self._dirty.clear()
+
+    # --- Atualização incremental ---
+
+    def mark_dirty(self, item):
+        if item is None:
+            return
+        first = not self._dirty
+        self._dirty[item] = None
+        if first and self.on_dirty is not None:
+            self.on_dirty()
+
+    def remove(self, item):
+        self._dirty.pop(item, None)
+        self._set_terms(item, frozenset())
+        self._terms.pop(item, None)
+
+    def has_pending(self):
+        return bool(self._dirty)
+
+    def flush(self, budget_ms=None):
+        """Reindexa os itens sujos; com budget_ms, para ao estourar o tempo. Devolve se acabou"""
+        deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000.0
+        while self._dirty:
+            item = next(iter(self._dirty))
+            del self._dirty[item]
+            text = item.search_text() if item.scene() is not None else ""
+            terms = frozenset(tokenize(text))
+            self._set_terms(item, terms)
+            if terms:
+                self._terms[item] = terms
+            else:
+                self._terms.pop(item, None)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return not self._dirty
+
+    def _set_terms(self, item, terms):
+        old = self._terms.get(item, frozenset())
+        for term in old - terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(item, None)
+            if not posting:
+                del self._postings[term]
+                i = bisect_left(self._sorted, term)
+                if i < len(self._sorted) and self._sorted[i] == term:
+                    del self._sorted[i]
+        for term in terms - old:
+            posting = self._postings.get(term)
+            if posting is None:
+                self._postings[term] = posting = {}
+                insort(self._sorted, term)
+            posting[item] = None
+
+    # --- Consulta ---
+
+    def _prefixed(self, prefix):
+        """Termos que começam com o prefixo (faixa contígua da lista ordenada)"""
+        terms = self._sorted
+        i = bisect_left(terms, prefix)
+        while i < len(terms) and terms[i].startswith(prefix):
+            yield terms[i]
+            i += 1
+
+    def search(self, query, limit=None):
+        """
+        Itens cujo texto contém todas as palavras da consulta, cada uma como
+        prefixo de algum termo. Os que têm as palavras inteiras vêm primeiro.
+        """
+        self.flush()
+        words = tokenize(query)
+        if not words:
+            return []
+        matched, exact = None, None
+        # Palavras mais longas (mais seletivas) primeiro: a interseção encolhe cedo
+        for word in sorted(set(words), key=len, reverse=True):
+            found = {}
+            for term in self._prefixed(word):
+                found.update(self._postings[term])
+            whole = self._postings.get(word, {})
+            if matched is None:
+                matched, exact = found, set(whole)
+            else:
+                matched = {item: None for item in matched if item in found}
+                exact &= whole.keys()
+            if not matched:
+                return []
+        results = [i for i in matched if i in exact] + [i for i in matched if i not in exact]
+        return results[:limit] if limit is not None else results
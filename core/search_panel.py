@@ -0,0 +1,133 @@
+import time
+from PySide6.QtWidgets import QDockWidget, QWidget, QVBoxLayout, QLineEdit, QLabel, QListWidget
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QTransform
+
+
+class SearchPanel(QDockWidget):
+    """
+    Painel de busca (Ctrl+F): os resultados saem do índice da cena enquanto
+    se digita, todos ficam destacados no mapa e Enter (ou um clique na lista)
+    centraliza e aproxima o próximo resultado.
+    """
+    MAX_LISTED = 500
+
+    def __init__(self, scene, view, parent=None):
+        super().__init__("Buscar", parent)
+        self.scene = scene
+        self.view = view
+        self.results = []
+        self._highlighted = {}
+        self._current = -1
+
+        body = QWidget(self)
+        layout = QVBoxLayout(body)
+        self.field = QLineEdit(body)
+        self.field.setPlaceholderText("Buscar nos objetos e rótulos...")
+        self.field.setClearButtonEnabled(True)
+        self.status = QLabel(body)
+        self.list = QListWidget(body)
+        layout.addWidget(self.field)
+        layout.addWidget(self.status)
+        layout.addWidget(self.list)
+        self.setWidget(body)
+
+        # Uma consulta por pausa na digitação (o destaque de milhares de itens não é de graça)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(120)
+        self._debounce.timeout.connect(self.run_query)
+        self.field.textChanged.connect(self._debounce.start)
+        self.field.returnPressed.connect(self.next_result)
+        self.list.itemActivated.connect(lambda entry: self.jump_to(self.list.row(entry)))
+        self.list.itemClicked.connect(lambda entry: self.jump_to(self.list.row(entry)))
+        self.visibilityChanged.connect(self._visibility_changed)
+
+    def open(self):
+        self.show()
+        self.raise_()
+        self.field.setFocus()
+        self.field.selectAll()
+
+    def reset(self):
+        """Esquece os resultados (a cena vai ser limpa: os itens deixam de existir)"""
+        self._debounce.stop()
+        self.results = []
+        self._highlighted = {}
+        self._current = -1
+        self.list.clear()
+        self.status.clear()
+
+    def _visibility_changed(self, visible):
+        if visible:
+            if self.field.text():
+                self.run_query()
+        else:
+            self._set_highlights([])
+
+    def run_query(self):
+        self._debounce.stop()
+        text = self.field.text()
+        started = time.perf_counter()
+        self.results = self.scene.search.search(text) if text.strip() else []
+        elapsed = (time.perf_counter() - started) * 1000.0
+        self._current = -1
+        self._set_highlights(self.results)
+
+        self.list.clear()
+        self.list.addItems([self._describe(item) for item in self.results[:self.MAX_LISTED]])
+        if text.strip():
+            shown = "" if len(self.results) <= self.MAX_LISTED else f" (listando {self.MAX_LISTED})"
+            self.status.setText(f"{len(self.results)} resultado(s) em {elapsed:.1f} ms{shown}")
+        else:
+            self.status.clear()
+
+    @staticmethod
+    def _describe(item):
+        text = " ".join(item.search_text().split())
+        if len(text) > 60:
+            text = text[:57] + "..."
+        return f"↔ {text}" if hasattr(item, 'source') else text
+
+    def _set_highlights(self, items):
+        """Liga o destaque só no que entrou e desliga só no que saiu"""
+        wanted = dict.fromkeys(items)
+        for item in self._highlighted:
+            if item not in wanted:
+                item.set_highlighted(False)
+        for item in wanted:
+            if item not in self._highlighted:
+                item.set_highlighted(True)
+        self._highlighted = wanted
+
+    def next_result(self):
+        if self._debounce.isActive():
+            self.run_query()
+        if self.results:
+            self.jump_to((self._current + 1) % len(self.results))
+
+    def jump_to(self, index):
+        if not 0 <= index < len(self.results):
+            return
+        item = self.results[index]
+        if item.scene() is not self.scene:
+            return
+        self._current = index
+        if index < self.list.count():
+            self.list.setCurrentRow(index)
+        target = item.label if getattr(item, 'label', None) is not None else item
+        rect = target.sceneBoundingRect()
+
+        # Aproxima até o item ocupar ~1/4 da tela, sem passar de 150% nem ficar ilegível
+        viewport = self.view.viewport().rect()
+        scale = min(viewport.width() / max(rect.width() * 4, 1.0),
+                    viewport.height() / max(rect.height() * 4, 1.0))
+        scale = max(0.6, min(scale, 1.5))
+        self.view.setTransform(QTransform.fromScale(scale, scale))
+        self.view.centerOn(rect.center())
+        if hasattr(self.view, 'apply_level_of_detail'):
+            self.view.apply_level_of_detail()
+
+        self.scene.clearSelection()
+        if item.flags() & item.GraphicsItemFlag.ItemIsSelectable:
+            item.setSelected(True)
@@ -0,0 +1,130 @@
+import math
+from collections import OrderedDict
+from PySide6.QtWidgets import QGraphicsScene, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsBlurEffect
+from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtGui import QColor, QImage, QPainter, QPixmap, QBrush
+
+
+class ShadowSpec:
+    """Parâmetros de uma sombra projetada (desfoque, deslocamento e cor)"""
+    __slots__ = ("blur", "offset", "color")
+
+    def __init__(self, blur=15, offset=5, color="#000000"):
+        self.blur = float(blur)
+        # offset: número (x = y, como no QGraphicsDropShadowEffect) ou par (x, y)
+        if isinstance(offset, (int, float)):
+            offset = (offset, offset)
+        self.offset = QPointF(*offset) if not isinstance(offset, QPointF) else QPointF(offset)
+        # Mesmo padrão do efeito do Qt: preto com 180 de alfa
+        color = QColor(color)
+        if color.alpha() == 255:
+            color.setAlpha(180)
+        self.color = color
+
+    def key(self):
+        return (self.blur, self.offset.x(), self.offset.y(), self.color.rgba())
+
+    def margin(self):
+        """Quanto a sombra avança além do retângulo do nó, em cada lado"""
+        pad = ShadowRenderer.padding(self.blur)
+        return (pad - min(self.offset.x(), 0), pad - min(self.offset.y(), 0),
+                pad + max(self.offset.x(), 0), pad + max(self.offset.y(), 0))
+
+
+class ShadowRenderer:
+    """
+    Sombras pré-renderizadas e compartilhadas por todos os nós: o desfoque é
+    feito uma única vez por (desfoque, deslocamento, cor) e cada nó só copia
+    o pixmap em nove fatias no próprio paint(). Substitui um
+    QGraphicsDropShadowEffect por item, que desfocava tudo a cada repintura.
+    """
+
+    # Fatias retangulares: {chave: (pixmap, canto)}
+    _nine_slices = {}
+    # Elipses não fatiam bem: pixmap inteiro por chave + tamanho (LRU)
+    _whole = OrderedDict()
+    MAX_WHOLE = 64
+
+    @staticmethod
+    def padding(blur):
+        return int(math.ceil(blur)) + 1
+
+    @staticmethod
+    def _blurred(spec, width, height, ellipse):
+        """Desfoca a forma com o mesmo algoritmo do Qt (QGraphicsBlurEffect)"""
+        pad = ShadowRenderer.padding(spec.blur)
+        scene = QGraphicsScene()
+        item = (QGraphicsEllipseItem if ellipse else QGraphicsRectItem)(0, 0, width, height)
+        item.setPen(Qt.NoPen)
+        item.setBrush(QBrush(spec.color))
+        effect = QGraphicsBlurEffect()
+        effect.setBlurRadius(spec.blur)
+        effect.setBlurHints(QGraphicsBlurEffect.QualityHint)
+        item.setGraphicsEffect(effect)
+        scene.addItem(item)
+
+        size = (int(width) + 2 * pad, int(height) + 2 * pad)
+        image = QImage(size[0], size[1], QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        scene.render(painter, QRectF(0, 0, *size), QRectF(-pad, -pad, *size))
+        painter.end()
+        return QPixmap.fromImage(image)
+
+    @classmethod
+    def _slices(cls, spec):
+        key = spec.key()
+        entry = cls._nine_slices.get(key)
+        if entry is None:
+            # Quadrado com miolo uniforme: o desfoque não alcança o pixel central
+            inner = cls.padding(spec.blur)
+            side = 2 * inner + 1
+            entry = (cls._blurred(spec, side, side, False), cls.padding(spec.blur) + inner)
+            cls._nine_slices[key] = entry
+        return entry
+
+    @classmethod
+    def _whole_pixmap(cls, spec, width, height):
+        key = spec.key() + (round(width), round(height))
+        pixmap = cls._whole.get(key)
+        if pixmap is None:
+            pixmap = cls._blurred(spec, round(width), round(height), True)
+            cls._whole[key] = pixmap
+            if len(cls._whole) > cls.MAX_WHOLE:
+                cls._whole.popitem(last=False)
+        else:
+            cls._whole.move_to_end(key)
+        return pixmap
+
+    @classmethod
+    def clear_cache(cls):
+        cls._nine_slices.clear()
+        cls._whole.clear()
+
+    @classmethod
+    def cache_size(cls):
+        return len(cls._nine_slices) + len(cls._whole)
+
+    @classmethod
+    def paint(cls, painter, rect, spec, ellipse=False):
+        """Desenha a sombra de um retângulo (ou elipse) em coordenadas do item"""
+        pad = cls.padding(spec.blur)
+        target = QRectF(rect).translated(spec.offset).adjusted(-pad, -pad, pad, pad)
+        if ellipse:
+            painter.drawPixmap(target, cls._whole_pixmap(spec, rect.width(), rect.height()),
+                               QRectF(0, 0, round(rect.width()) + 2 * pad, round(rect.height()) + 2 * pad))
+            return
+
+        pixmap, corner = cls._slices(spec)
+        side = pixmap.width()
+        # Nós menores que dois cantos: os cantos encolhem juntos
+        c = min(corner, target.width() / 2, target.height() / 2)
+        src = (0.0, float(corner), float(side - corner), float(side))
+        dst_x = (target.left(), target.left() + c, target.right() - c, target.right())
+        dst_y = (target.top(), target.top() + c, target.bottom() - c, target.bottom())
+        for row in range(3):
+            for col in range(3):
+                painter.drawPixmap(
+                    QRectF(dst_x[col], dst_y[row], dst_x[col + 1] - dst_x[col], dst_y[row + 1] - dst_y[row]),
+                    pixmap,
+                    QRectF(src[col], src[row], src[col + 1] - src[col], src[row + 1] - src[row]))
@@ -0,0 +1,286 @@
+from PySide6.QtCore import QPointF, QRectF, QLineF
+
+
+class SpatialGrid:
+    """Índice espacial em baldes: cada nó fica nas células que seu retângulo toca"""
+
+    def __init__(self, cell=256.0):
+        self.cell = cell
+        self._cells = {}
+        # nó -> ((x0, y0, x1, y1), células ocupadas)
+        self._rects = {}
+
+    def _span(self, x0, y0, x1, y1):
+        c = self.cell
+        return [(cx, cy)
+                for cx in range(int(x0 // c), int(x1 // c) + 1)
+                for cy in range(int(y0 // c), int(y1 // c) + 1)]
+
+    def update(self, node, rect):
+        """Insere ou move o nó; rect = (x0, y0, x1, y1) em coordenadas da cena"""
+        old = self._rects.get(node)
+        cells = self._span(*rect)
+        if old is not None:
+            if old[1] == cells:
+                self._rects[node] = (rect, cells)
+                return
+            self._discard(node, old[1])
+        for key in cells:
+            self._cells.setdefault(key, {})[node] = None
+        self._rects[node] = (rect, cells)
+
+    def remove(self, node):
+        old = self._rects.pop(node, None)
+        if old is not None:
+            self._discard(node, old[1])
+
+    def _discard(self, node, cells):
+        for key in cells:
+            bucket = self._cells.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(node, None)
+            if not bucket:
+                del self._cells[key]
+
+    def clear(self):
+        self._cells.clear()
+        self._rects.clear()
+
+    def rect_of(self, node):
+        entry = self._rects.get(node)
+        return entry[0] if entry else None
+
+    def query(self, x0, y0, x1, y1):
+        """Nós cujo retângulo intersecta a área, com seus retângulos"""
+        found = {}
+        for key in self._span(x0, y0, x1, y1):
+            for node in self._cells.get(key, ()):
+                if node in found:
+                    continue
+                r = self._rects[node][0]
+                if r[0] <= x1 and r[2] >= x0 and r[1] <= y1 and r[3] >= y0:
+                    found[node] = r
+        return found
+
+    def __contains__(self, node):
+        return node in self._rects
+
+    def __len__(self):
+        return len(self._rects)
+
+
+class SnapEngine:
+    """
+    Magnetismo: durante o arraste, encaixa a seleção nas bordas e centros dos
+    nós vizinhos e em espaçamentos iguais; sem vizinho perto, cai na grade.
+    As candidatas vêm do índice espacial, então o custo não depende do mapa todo.
+    """
+
+    def __init__(self, grid=20, threshold=8.0, reach=600.0):
+        self.index = SpatialGrid()
+        self.grid = grid
+        self.threshold = threshold  # em pixels de tela
+        self.reach = reach          # distância máxima (cena) para procurar vizinhos
+        self.scale = 1.0            # zoom da view, atualizado pelo canvas
+        # Cache da checkbox: o itemChange não consulta mais a janela ativa
+        self.enabled = False
+        self.guides = []
+        self._origins = {}
+        self._box = None
+        self._last = None
+        # Avisado com (retângulo antigo, novo) quando um nó muda de lugar (roteamento)
+        self.on_change = None
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    # --- Índice (mantido pelos nós) ---
+
+    @staticmethod
+    def rect_for(node, pos=None):
+        pos = node.scenePos() if pos is None else pos
+        r = node.rect()
+        x0, y0 = pos.x() + r.x(), pos.y() + r.y()
+        return (x0, y0, x0 + r.width(), y0 + r.height())
+
+    def track(self, node):
+        rect = self.rect_for(node)
+        if self.on_change is not None:
+            old = self.index.rect_of(node)
+            if old != rect:
+                self.on_change(old, rect)
+        self.index.update(node, rect)
+
+    def untrack(self, node):
+        if self.on_change is not None:
+            old = self.index.rect_of(node)
+            if old is not None:
+                self.on_change(old, None)
+        self.index.remove(node)
+
+    def clear(self):
+        self.index.clear()
+        self.end_drag()
+
+    # --- Arraste ---
+
+    def begin_drag(self, items):
+        """Guarda a origem dos itens arrastados; só eles são encaixados"""
+        self._origins = {i: i.pos() for i in items if i in self.index}
+        self._last = None
+        if not self._origins:
+            self._box = None
+            return
+        rects = [self.index.rect_of(i) for i in self._origins]
+        self._box = (min(r[0] for r in rects), min(r[1] for r in rects),
+                     max(r[2] for r in rects), max(r[3] for r in rects))
+
+    def end_drag(self):
+        """Encerra o arraste; devolve as guias que estavam na tela (para apagar)"""
+        old, self.guides = self.guides, []
+        self._origins = {}
+        self._box = None
+        self._last = None
+        return old
+
+    def is_dragging(self, item):
+        return item in self._origins
+
+    def snap(self, item, proposed):
+        """Posição encaixada para o item arrastado (todos recebem o mesmo deslocamento)"""
+        origin = self._origins[item]
+        delta = (proposed.x() - origin.x(), proposed.y() - origin.y())
+        # Qt move cada item selecionado com o mesmo delta: calcula-se uma vez por passo
+        if self._last is None or self._last[0] != delta:
+            self._last = (delta, self._snap_box(*delta))
+        dx, dy = self._last[1]
+        return QPointF(origin.x() + dx, origin.y() + dy)
+
+    def _snap_box(self, dx, dy):
+        x0, y0, x1, y1 = self._box
+        box = (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+        tol = self.threshold / max(self.scale, 1e-6)
+        reach = self.reach
+        neighbours = {n: r for n, r in self.index.query(box[0] - reach, box[1] - reach,
+                                                       box[2] + reach, box[3] + reach).items()
+                      if n not in self._origins}
+
+        guides = []
+        sx, gx = self._snap_axis(box, neighbours, tol, 0)
+        sy, gy = self._snap_axis(box, neighbours, tol, 1)
+        # Sem vizinho alinhável, o eixo cai na grade (comportamento original)
+        if sx is None:
+            sx = round(box[0] / self.grid) * self.grid - box[0]
+        else:
+            guides += gx
+        if sy is None:
+            sy = round(box[1] / self.grid) * self.grid - box[1]
+        else:
+            guides += gy
+        # As guias são recalculadas com a caixa já encaixada nos dois eixos
+        self.guides = self._merge([self._to_lines(g, sx, sy) for g in guides])
+        return dx + sx, dy + sy
+
+    def _snap_axis(self, box, neighbours, tol, axis):
+        """Menor ajuste no eixo (0 = x, 1 = y) e as guias que ele produz"""
+        lo, hi = box[axis], box[axis + 2]
+        mine = (lo, (lo + hi) / 2, hi)
+        best, guides = None, []
+
+        def offer(shift, guide):
+            nonlocal best, guides
+            if abs(shift) > tol:
+                return
+            if best is None or abs(shift) < abs(best) - 1e-9:
+                best, guides = shift, [guide]
+            elif abs(shift - best) <= 1e-9:
+                guides.append(guide)
+
+        # Bordas e centros dos vizinhos
+        for r in neighbours.values():
+            theirs = (r[axis], (r[axis] + r[axis + 2]) / 2, r[axis + 2])
+            for m in mine:
+                for t in theirs:
+                    # Filtro barato antes de offer(): a grande maioria fica longe
+                    if -tol <= t - m <= tol:
+                        offer(t - m, ("line", axis, t, r))
+
+        # Espaçamento igual: vizinhos na mesma faixa do outro eixo
+        other = 1 - axis
+        row = sorted((r for r in neighbours.values()
+                      if r[other] <= box[other + 2] and r[other + 2] >= box[other]),
+                     key=lambda r: r[axis])
+        before = [r for r in row if r[axis + 2] <= lo + tol]
+        after = [r for r in row if r[axis] >= hi - tol]
+        if before:
+            near = max(before, key=lambda r: r[axis + 2])
+            prev = [r for r in before if r[axis + 2] <= near[axis]]
+            if prev:
+                far = max(prev, key=lambda r: r[axis + 2])
+                gap = near[axis] - far[axis + 2]
+                offer(near[axis + 2] + gap - lo, ("gap", axis, gap, (far, near)))
+        if after:
+            near = min(after, key=lambda r: r[axis])
+            nxt = [r for r in after if r[axis] >= near[axis + 2]]
+            if nxt:
+                far = min(nxt, key=lambda r: r[axis])
+                gap = far[axis] - near[axis + 2]
+                offer(near[axis] - gap - hi, ("gap", axis, gap, (near, far)))
+        if before and after:
+            left = max(before, key=lambda r: r[axis + 2])
+            right = min(after, key=lambda r: r[axis])
+            gap = (right[axis] - left[axis + 2] - (hi - lo)) / 2
+            if gap >= 0:
+                offer(left[axis + 2] + gap - lo, ("gap", axis, gap, (left, right)))
+        return best, [(g, box) for g in guides]
+
+    @staticmethod
+    def _merge(groups):
+        """Une as guias colineares (vários vizinhos na mesma reta viram uma linha só)"""
+        merged, spacing = {}, []
+        for kind, lines in groups:
+            if kind != "line":
+                spacing.extend(lines)
+                continue
+            line = lines[0]
+            vertical = line.x1() == line.x2()
+            key = (vertical, line.x1() if vertical else line.y1())
+            prev = merged.get(key)
+            if prev is not None:
+                if vertical:
+                    line = QLineF(line.x1(), min(line.y1(), prev.y1()), line.x2(), max(line.y2(), prev.y2()))
+                else:
+                    line = QLineF(min(line.x1(), prev.x1()), line.y1(), max(line.x2(), prev.x2()), line.y2())
+            merged[key] = line
+        return list(merged.values()) + spacing
+
+    def _to_lines(self, entry, sx, sy):
+        """Converte a guia abstrata em (tipo, [QLineF]) na posição final da caixa"""
+        (kind, axis, value, ref), box = entry
+        x0, y0, x1, y1 = box[0] + sx, box[1] + sy, box[2] + sx, box[3] + sy
+        if kind == "line":
+            if axis == 0:
+                return kind, [QLineF(value, min(y0, ref[1]), value, max(y1, ref[3]))]
+            return kind, [QLineF(min(x0, ref[0]), value, max(x1, ref[2]), value)]
+        # Espaçamento: um traço no meio de cada vão (entre as duas referências e a caixa)
+        first, second = ref
+        spans = sorted([first, second, (x0, y0, x1, y1)], key=lambda r: r[axis])
+        lines = []
+        for a, b in zip(spans, spans[1:]):
+            if axis == 0:
+                mid = (max(a[1], b[1]) + min(a[3], b[3])) / 2
+                lines.append(QLineF(a[2], mid, b[0], mid))
+            else:
+                mid = (max(a[0], b[0]) + min(a[2], b[2])) / 2
+                lines.append(QLineF(mid, a[3], mid, b[1]))
+        return kind, lines
+
+    @staticmethod
+    def bounds_of(lines, margin=2.0):
+        if not lines:
+            return QRectF()
+        xs = [p for l in lines for p in (l.x1(), l.x2())]
+        ys = [p for l in lines for p in (l.y1(), l.y2())]
+        return QRectF(min(xs) - margin, min(ys) - margin,
+                      max(xs) - min(xs) + 2 * margin, max(ys) - min(ys) + 2 * margin)
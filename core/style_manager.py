@@ -1,9 +1,110 @@
+from collections import namedtuple
 from PySide6.QtWidgets import QColorDialog, QGraphicsDropShadowEffect
-from PySide6.QtGui import QColor
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor, QBrush, QLinearGradient, QGradient, QPen, QFont
+
+# Chave de um estilo. Cores em ARGB; font = QFont.toString() ("" = fonte padrão);
+# shadow = (desfoque, dx, dy, cor ARGB) ou None
+StyleKey = namedtuple("StyleKey", "fill fill_end border border_width font text_color shadow")
+
+DEFAULT_STYLE = StyleKey(QColor("#fdfc47").rgba(), QColor("#ffd700").rgba(),
+                         QColor("#333").rgba(), 2.0, "", QColor(Qt.black).rgba(), None)
+
+
+def style_key_from_json(values):
+    """Reconstrói a chave gravada no diário (listas JSON voltam a ser tuplas)"""
+    key = StyleKey(*values)
+    return key._replace(shadow=tuple(key.shadow) if key.shadow is not None else None)
+
+
+class Style:
+    """
+    Estilo internado: os objetos Qt (brush, caneta, fonte, sombra) são criados
+    uma vez e compartilhados por todos os nós que usam o mesmo estilo.
+    """
+    __slots__ = ("id", "key", "_brush", "_pen", "_font", "_shadow", "_flat")
+
+    def __init__(self, style_id, key):
+        self.id = style_id
+        self.key = key
+        self._brush = self._pen = self._font = self._shadow = self._flat = None
+
+    def brush(self):
+        if self._brush is None:
+            key = self.key
+            if key.fill == key.fill_end:
+                self._brush = QBrush(QColor.fromRgba(key.fill))
+            else:
+                # Degradê relativo ao retângulo: o mesmo brush serve para qualquer tamanho
+                grad = QLinearGradient(0, 0, 0, 1)
+                grad.setCoordinateMode(QGradient.ObjectBoundingMode)
+                grad.setColorAt(0, QColor.fromRgba(key.fill))
+                grad.setColorAt(1, QColor.fromRgba(key.fill_end))
+                self._brush = QBrush(grad)
+        return self._brush
+
+    def pen(self):
+        if self._pen is None:
+            self._pen = QPen(QColor.fromRgba(self.key.border), self.key.border_width)
+        return self._pen
+
+    def font(self):
+        if self._font is None:
+            self._font = QFont()
+            if self.key.font:
+                self._font.fromString(self.key.font)
+        return self._font
+
+    def text_color(self):
+        return QColor.fromRgba(self.key.text_color)
+
+    def shadow_spec(self):
+        if self._shadow is None and self.key.shadow is not None:
+            from core.shadow_renderer import ShadowSpec
+            blur, dx, dy, color = self.key.shadow
+            self._shadow = ShadowSpec(blur, (dx, dy), QColor.fromRgba(color))
+        return self._shadow
+
+    def flat_color(self):
+        if self._flat is None:
+            from core.level_of_detail import LevelOfDetail
+            self._flat = LevelOfDetail.flat_color(self.key.fill, self.key.fill_end)
+        return self._flat
+
+
+class StyleRegistry:
+    """Tabela de estilos internados: chaves iguais devolvem o mesmo objeto Style"""
+
+    def __init__(self):
+        self._styles = []
+        self._by_key = {}
+        self.default = self.intern(DEFAULT_STYLE)
+
+    def intern(self, key):
+        style = self._by_key.get(key)
+        if style is None:
+            style = Style(len(self._styles), key)
+            self._styles.append(style)
+            self._by_key[key] = style
+        return style
+
+    def get(self, style_id):
+        return self._styles[style_id]
+
+    def derive(self, style, **changes):
+        """Estilo igual a style com alguns campos trocados, ex.: derive(s, fill=...)"""
+        return self.intern(style.key._replace(**changes))
+
+    def __len__(self):
+        return len(self._styles)
+
 
 class StyleManager:
     """Gerencia cores, sombras e efeitos visuais dos nós (Requisito 15)"""
 
+    # Registro único do processo; os arquivos gravam só a tabela dos estilos usados
+    registry = StyleRegistry()
+
     @staticmethod
     def change_background_color(parent, item):
         """Abre seletor de cores e aplica ao fundo do nó"""
@@ -14,6 +115,11 @@ class StyleManager:
     @staticmethod
     def apply_shadow(item, blur=15, offset=5, color="#000000"):
         """Aplica ou ajusta a sombra do objeto para dar profundidade"""
+        if hasattr(item, 'set_shadow'):
+            # Nós desenham a sombra em cache no próprio paint (sem efeito por item)
+            from core.shadow_renderer import ShadowSpec
+            item.set_shadow(ShadowSpec(blur, offset, color))
+            return
         shadow = QGraphicsDropShadowEffect()
         shadow.setBlurRadius(blur)
         shadow.setOffset(offset)
@@ -22,6 +128,21 @@ class StyleManager:
 
     @staticmethod
     def set_gradient_style(item, color_start, color_end):
-        """Prepara a estrutura para gradientes (base para animações futuras)"""
-        # Aqui definiremos a lógica de gradiente linear/radial
-        pass
\ No newline at end of file
+        """Aplica um degradê vertical (topo -> base) do tamanho do objeto"""
+        if hasattr(item, 'set_style'):
+            item.set_style(StyleManager.registry.derive(
+                item.style, fill=QColor(color_start).rgba(), fill_end=QColor(color_end).rgba()))
+            return
+        grad = QLinearGradient(0, 0, 0, item.rect().height())
+        grad.setColorAt(0, QColor(color_start))
+        grad.setColorAt(1, QColor(color_end))
+        item.setBrush(QBrush(grad))
+
+    @staticmethod
+    def brush_colors(brush):
+        """Cores (topo, base) em ARGB de um brush sólido ou em degradê"""
+        if brush.style() in (Qt.LinearGradientPattern, Qt.RadialGradientPattern, Qt.ConicalGradientPattern):
+            stops = brush.gradient().stops()
+            if stops:
+                return stops[0][1].rgba(), stops[-1][1].rgba()
+        return brush.color().rgba(), brush.color().rgba()
\ No newline at end of file
@@ -9,9 +9,25 @@ class ConnectionLabel(QGraphicsTextItem):
         self.setFont(QFont("Segoe UI", 9, QFont.Weight.Bold))
         self.parent_conn = parent_connection
         self.setZValue(10)
+        self.document().contentsChanged.connect(self._text_changed)
+
+    def _text_changed(self):
+        search = getattr(self.scene(), 'search', None)
+        if search is not None and self.parent_conn is not None:
+            search.mark_dirty(self.parent_conn)
+
+    def paint(self, painter, option, widget=None):
+        # Rótulo encontrado pela busca: fundo em destaque
+        if getattr(self.parent_conn, 'highlighted', False):
+            painter.fillRect(self.boundingRect(), QColor(255, 140, 0, 110))
+        super().paint(painter, option, widget)
 
     def update_position(self):
-        """Calcula o ponto médio da linha para posicionar o texto"""
+        """Ponto médio da linha; com rotas, o ponto da rota que não cubra nós nem outros rótulos"""
+        router = getattr(self.scene(), 'router', None)
+        if router is not None and router.mode != "straight":
+            self.setPos(router.place_label(self.parent_conn, self.boundingRect().size()))
+            return
         line = self.parent_conn.line()
         mid_point = line.pointAt(0.5)
         self.setPos(mid_point.x() - self.boundingRect().width()/2, 
@@ -1,51 +1,251 @@
 from PySide6.QtWidgets import QGraphicsRectItem, QGraphicsItem
-from PySide6.QtGui import QPen, QColor, QBrush, QPainter
-from PySide6.QtCore import Qt, QRectF
+from PySide6.QtGui import QPen, QColor, QPainter, QPainterPath
+from PySide6.QtCore import Qt, QRectF, QPointF
 
 class GroupNode(QGraphicsRectItem):
-    """Objeto que envolve outros nós (Requisito 10)"""
-    def __init__(self, items_to_group):
+    """
+    Grupo hierárquico (Requisito 10). Os membros — nós ou outros grupos — são
+    filhos do item: mover o grupo é uma só transformação, sem itemChange nem
+    moveBy por membro. O retângulo fica em cache e só é refeito quando um
+    membro avisa que mudou (member_changed). Recolhido, os membros ficam
+    ocultos: saem da pintura e do teste de clique.
+    """
+    MARGIN = 15
+    COLLAPSED_SIZE = (150, 36)
+
+    def __init__(self, members=(), rect=None):
         super().__init__()
-        self.child_items = items_to_group
-        
-        # Estética: Retângulo Arredondado, sem preenchimento, borda tracejada
+        self.members = []
+        self.collapsed = False
+        # Caixa mínima (GroupBox: moldura desenhada sem membros), em coordenadas locais
+        self._fixed = QRectF(rect) if rect is not None else None
+        self._rect = QRectF()
+        self._bounds_dirty = True
+        self._last_pos = QPointF()
+
+        # Estética: Retângulo Arredondado, borda tracejada, fundo amarelo bem transparente
         self.setPen(QPen(QColor("#f2f71d"), 2, Qt.DashLine))
-        self.setBrush(QColor(242, 247, 29, 20)) # Amarelo bem transparente
-        
+        self.setBrush(QColor(242, 247, 29, 20))
+        # Atrás dos nós soltos (os membros, filhos, são desenhados por cima do grupo)
+        self.setZValue(-10)
         self.setFlags(
-            QGraphicsItem.ItemIsMovable | 
+            QGraphicsItem.ItemIsMovable |
             QGraphicsItem.ItemIsSelectable |
             QGraphicsItem.ItemSendsGeometryChanges
         )
-        
         # Define que este grupo deve ser tratado como unidade (Observação 3)
-        self.is_unit = True 
-        
-        self.calculate_bounds()
-
-    def calculate_bounds(self):
-        """Calcula o retângulo que engloba todos os itens selecionados"""
-        if not self.child_items: return
-        
-        rect = self.child_items[0].sceneBoundingRect()
-        for item in self.child_items[1:]:
-            rect = rect.united(item.sceneBoundingRect())
-        
-        # Adiciona uma margem extra para o retângulo de grupo
-        self.setRect(rect.adjusted(-15, -15, 15, 15))
-
-    def paint(self, painter, option, widget):
+        self.is_unit = True
+
+        members = list(members)
+        if members:
+            # A origem do grupo fica no canto dos membros: coordenadas locais pequenas
+            area = QRectF()
+            for item in members:
+                area = area.united(item.mapRectToScene(self.extent_of(item)))
+            self.setPos(area.topLeft() - QPointF(self.MARGIN, self.MARGIN))
+            self._last_pos = self.pos()
+            for item in members:
+                self.add_member(item)
+
+    # --- Membros ---
+
+    @staticmethod
+    def extent_of(item):
+        """Retângulo local que conta para o grupo (sem sombra nem alças)"""
+        return item.group_rect() if isinstance(item, GroupNode) else item.rect()
+
+    def add_member(self, item):
+        """Torna o item filho do grupo, sem mudar sua posição na cena"""
+        if item is self or item in self.members or (isinstance(item, GroupNode) and item.isAncestorOf(self)):
+            return
+        # Filho de um item fora da cena sairia da cena: o grupo entra nela antes
+        if self.scene() is None and item.scene() is not None:
+            item.scene().addItem(self)
+        scene_pos = item.scenePos()
+        self.members.append(item)
+        item.setParentItem(self)
+        item.setPos(self.mapFromScene(scene_pos))
+        if self.collapsed:
+            item.setVisible(False)
+            self._sync_connections()
+        self.member_changed()
+
+    def remove_member(self, item):
+        """Devolve o item ao pai do grupo (ou à cena), no mesmo lugar"""
+        if item not in self.members:
+            return
+        parent = self.parentItem()
+        item.setVisible(True)
+        if isinstance(parent, GroupNode):
+            # Grupo aninhado: o membro passa a ser do grupo de fora (que move,
+            # salva e recolhe o nó junto com os demais)
+            parent.add_member(item)
+        else:
+            scene_pos = item.scenePos()
+            item.setParentItem(parent)
+            item.setPos(parent.mapFromScene(scene_pos) if parent is not None else scene_pos)
+        if self.collapsed:
+            self._sync_connections([item])
+
+    def dissolve(self):
+        """Desfaz o grupo: os membros voltam ao pai e a moldura sai da cena"""
+        members = list(self.members)
+        for item in members:
+            self.remove_member(item)
+        scene = self.scene()
+        if scene is not None:
+            scene.removeItem(self)
+        return members
+
+    def member_nodes(self):
+        """Nós do grupo, incluindo os dos subgrupos"""
+        for item in self.members:
+            if isinstance(item, GroupNode):
+                yield from item.member_nodes()
+            else:
+                yield item
+
+    def member_changed(self):
+        """Um membro moveu, mudou de tamanho ou saiu: o retângulo em cache é refeito sob demanda"""
+        if not self._bounds_dirty:
+            self.prepareGeometryChange()
+            self._bounds_dirty = True
+        parent = self.parentItem()
+        if parent is not None:
+            parent.member_changed()
+
+    # --- Retângulo em cache ---
+
+    def group_rect(self):
+        if self._bounds_dirty:
+            self._bounds_dirty = False
+            rect = QRectF(self._fixed) if self._fixed is not None else QRectF()
+            for item in self.members:
+                area = item.mapRectToParent(self.extent_of(item))
+                rect = rect.united(area.adjusted(-self.MARGIN, -self.MARGIN, self.MARGIN, self.MARGIN))
+            if self.collapsed:
+                # Recolhido: só uma etiqueta no canto onde o grupo começava
+                rect = QRectF(rect.topLeft(), QPointF(rect.left() + self.COLLAPSED_SIZE[0],
+                                                      rect.top() + self.COLLAPSED_SIZE[1]))
+            self._rect = rect
+        return self._rect
+
+    def rect(self):
+        return self.group_rect()
+
+    def boundingRect(self):
+        width = self.pen().widthF() / 2
+        return self.group_rect().adjusted(-width, -width, width, width)
+
+    def shape(self):
+        path = QPainterPath()
+        path.addRoundedRect(self.group_rect(), 15, 15)
+        return path
+
+    def paint(self, painter, option, widget=None):
         painter.setRenderHint(QPainter.Antialiasing)
-        r = self.rect()
-        painter.setPen(self.pen())
-        painter.setBrush(self.brush())
+        r = self.group_rect()
+        pen = QPen(self.pen())
+        if self.isSelected():
+            pen.setStyle(Qt.SolidLine)
+        painter.setPen(pen)
+        painter.setBrush(QColor(242, 247, 29, 160) if self.collapsed else self.brush())
         # Requisito 10: Arredondado nas pontas
         painter.drawRoundedRect(r, 15, 15)
+        if self.collapsed:
+            painter.setPen(QColor("#1a1a1a"))
+            count = sum(1 for _ in self.member_nodes())
+            painter.drawText(r, Qt.AlignCenter, f"▸ Grupo ({count})")
+
+    # --- Recolher ---
+
+    def set_collapsed(self, collapsed):
+        if collapsed == self.collapsed:
+            return
+        self.collapsed = collapsed
+        self.member_changed()
+        for item in self.members:
+            item.setVisible(not collapsed)
+        self._sync_connections()
+        self.update()
+
+    def _sync_connections(self, items=None):
+        """Conexões com um membro oculto somem junto; voltam quando as duas pontas aparecem"""
+        graph = getattr(self.scene(), 'graph', None)
+        if graph is None:
+            return
+        if items is None:
+            items = self.members
+        nodes = [n for i in items for n in (i.member_nodes() if isinstance(i, GroupNode) else (i,))]
+        for node in nodes:
+            for conn in graph.connections_of(node):
+                conn.setVisible(conn.source.isVisible() and conn.target.isVisible())
+
+    def mouseDoubleClickEvent(self, event):
+        self.set_collapsed(not self.collapsed)
+        event.accept()
+
+    # --- Movimento ---
+
+    def _members_moved(self, dx, dy):
+        """
+        O Qt já deslocou os membros com a transformação do grupo; aqui só se
+        atualiza o que guarda posições de cena: colunas do documento (em lote),
+        índice do magnetismo, alças da seleção e conexões (recalculadas uma vez
+        por frame).
+        """
+        scene = self.scene()
+        if scene is None:
+            return
+        nodes = list(self.member_nodes())
+        doc = getattr(scene, 'document', None)
+        if doc is not None:
+            rows = doc.rows_of(nodes)
+            doc.x[rows] += dx
+            doc.y[rows] += dy
+        graph = getattr(scene, 'graph', None)
+        snapping = getattr(scene, 'snapping', None)
+        overlay = getattr(scene, 'selection_overlay', None)
+        if overlay is not None:
+            overlay.geometry_changed()
+        for node in nodes:
+            if graph is not None:
+                graph.update_node(node)
+            if snapping is not None:
+                snapping.track(node)
 
     def itemChange(self, change, value):
-        # Quando o grupo move, todos os filhos movem juntos
         if change == QGraphicsItem.ItemPositionHasChanged:
-            delta = value - self.pos()
-            for item in self.child_items:
-                item.moveBy(delta.x(), delta.y())
-        return super().itemChange(change, value)
\ No newline at end of file
+            # Delta contra a posição anterior guardada (self.pos() já é a nova)
+            delta = value - self._last_pos
+            self._last_pos = QPointF(value)
+            self._members_moved(delta.x(), delta.y())
+            parent = self.parentItem()
+            if parent is not None:
+                parent.member_changed()
+        elif change == QGraphicsItem.ItemChildRemovedChange:
+            # Membro removido da cena ou devolvido ao pai: sai da lista
+            if value in self.members:
+                self.members.remove(value)
+                self.member_changed()
+        elif change == QGraphicsItem.ItemParentChange:
+            self._scene_before = self.scenePos()
+        elif change == QGraphicsItem.ItemParentHasChanged:
+            # Mesmo ponto da cena no sistema do novo pai: o setPos que mantém o
+            # grupo no lugar não vira um deslocamento dos membros
+            before = getattr(self, '_scene_before', self.scenePos())
+            self._last_pos = value.mapFromScene(before) if value is not None else QPointF(before)
+        elif change == QGraphicsItem.ItemSceneHasChanged and value is not None:
+            self._last_pos = self.pos()
+        return super().itemChange(change, value)
+
+
+def detach(item):
+    """Tira o item (nó ou grupo) de qualquer grupo, no mesmo lugar da cena"""
+    parent = item.parentItem()
+    if parent is None:
+        return None
+    scene_pos = item.scenePos()
+    item.setParentItem(None)
+    item.setPos(scene_pos)
+    return parent
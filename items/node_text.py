@@ -0,0 +1,276 @@
+import html
+from collections import OrderedDict
+from PySide6.QtWidgets import QGraphicsTextItem
+from PySide6.QtCore import Qt, QRectF, QPointF, QTimer
+from PySide6.QtGui import QColor, QFont, QFontMetricsF, QStaticText, QTextCursor
+from core.level_of_detail import LevelOfDetail
+from core.perf_monitor import profiled_paint
+
+
+class NodeTextItem(QGraphicsTextItem):
+    """
+    Editor de texto do nó: só existe enquanto o texto está sendo editado
+    (criado por NodeText.begin_edit, solto ao perder o foco).
+    """
+
+    def __init__(self, text="", parent=None):
+        super().__init__(text, parent)
+        # Cada alteração só marca o nó como sujo no índice de busca da cena
+        self.document().contentsChanged.connect(self._text_changed)
+
+    def _text_changed(self):
+        search = getattr(self.scene(), 'search', None)
+        if search is not None:
+            search.mark_dirty(self.parentItem())
+
+    def focusInEvent(self, event):
+        self._text_before = self.toPlainText()
+        super().focusInEvent(event)
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        # Edição concluída: vira um comando (desfazer + diário de alterações)
+        before = getattr(self, '_text_before', None)
+        node = self.parentItem()
+        if hasattr(node, 'sync_text'):
+            node.sync_text()
+        stack = getattr(self.scene(), 'undo_stack', None)
+        if stack is not None and before is not None and before != self.toPlainText() and hasattr(node, 'node_id'):
+            from core.commands import TextCommand
+            stack.push(TextCommand(node, before, self.toPlainText()))
+        self._text_before = None
+        # Janela ou menu de contexto tomaram o foco: a edição continua na volta
+        if event.reason() not in (Qt.ActiveWindowFocusReason, Qt.PopupFocusReason):
+            text = getattr(node, 'text_item', None)
+            if isinstance(text, NodeText):
+                text.end_edit()
+
+    @profiled_paint
+    def paint(self, painter, option, widget=None):
+        super().paint(painter, option, widget)
+
+
+class NodeText:
+    """
+    Texto do nó fora da edição: não é um item da cena nem tem QTextDocument.
+    É desenhado pelo paint() do nó a partir de um QStaticText em cache,
+    compartilhado por texto, fonte e largura. Mantém a parte da API do
+    QGraphicsTextItem que o resto do código usa; o editor de verdade
+    (NodeTextItem) só é criado ao editar (begin_edit) e solto no fim.
+    """
+    MARGIN = 4.0       # margem do documento do QGraphicsTextItem, para manter o layout
+    CACHE_SIZE = 4096
+    _cache = OrderedDict()
+    _char_widths = {}
+
+    def __init__(self, text="", node=None):
+        self.node = node
+        self.editor = None
+        self._text = text
+        self._font = QFont()
+        self._color = QColor(Qt.black)
+        self._pos = QPointF()
+        self._width = -1.0
+        self._flags = Qt.NoTextInteraction
+        self._static = None
+
+    # --- Cache de QStaticText ---
+
+    @classmethod
+    def static_text(cls, text, font, width):
+        key = (text, font.key(), width)
+        static = cls._cache.get(key)
+        if static is not None:
+            cls._cache.move_to_end(key)
+            return static
+        if "\n" in text or "  " in text:
+            # Texto simples do QStaticText ignora quebras de linha
+            static = QStaticText("<br>".join(html.escape(line).replace("  ", " &nbsp;")
+                                             for line in text.split("\n")))
+            static.setTextFormat(Qt.RichText)
+        else:
+            static = QStaticText(text)
+            static.setTextFormat(Qt.PlainText)
+        if width > 0:
+            static.setTextWidth(max(1.0, width - 2 * cls.MARGIN))
+        static.prepare(font=font)
+        cls._cache[key] = static
+        if len(cls._cache) > cls.CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return static
+
+    def _layout(self):
+        if self._static is None:
+            self._static = self.static_text(self._text, self._font, self._width)
+        return self._static
+
+    def _changed(self, layout=True):
+        if layout:
+            self._static = None
+        if self.node is not None:
+            self.node.update()
+
+    # --- API de texto (a do QGraphicsTextItem que o código usa) ---
+
+    def toPlainText(self):
+        return self.editor.toPlainText() if self.editor is not None else self._text
+
+    def setPlainText(self, text):
+        self._text = text
+        if self.editor is not None:
+            self.editor.setPlainText(text)
+        self._changed()
+        search = getattr(self.node.scene(), 'search', None)
+        if search is not None:
+            search.mark_dirty(self.node)
+        sync = getattr(self.node, 'sync_text', None)
+        if sync is not None:
+            sync()
+
+    def font(self):
+        return QFont(self._font)
+
+    def setFont(self, font):
+        self._font = QFont(font)
+        if self.editor is not None:
+            self.editor.setFont(font)
+        self._changed()
+
+    def defaultTextColor(self):
+        return QColor(self._color)
+
+    def setDefaultTextColor(self, color):
+        self._color = QColor(color)
+        if self.editor is not None:
+            self.editor.setDefaultTextColor(color)
+        self._changed(layout=False)
+
+    def pos(self):
+        return QPointF(self._pos)
+
+    def setPos(self, *args):
+        self._pos = QPointF(*args)
+        if self.editor is not None:
+            self.editor.setPos(self._pos)
+        self._changed(layout=False)
+
+    def setTextWidth(self, width):
+        if width != self._width:
+            self._width = width
+            if self.editor is not None:
+                self.editor.setTextWidth(width)
+            self._changed()
+
+    def boundingRect(self):
+        if self.editor is not None:
+            return self.editor.boundingRect()
+        size = self._layout().size()
+        width = self._width if self._width > 0 else size.width() + 2 * self.MARGIN
+        return QRectF(0, 0, width, size.height() + 2 * self.MARGIN)
+
+    def setTextInteractionFlags(self, flags):
+        self._flags = flags
+        if self.editor is not None:
+            self.editor.setTextInteractionFlags(flags)
+
+    def textInteractionFlags(self):
+        return self._flags
+
+    def hasFocus(self):
+        return self.editor is not None and self.editor.hasFocus()
+
+    def setFocus(self):
+        self.begin_edit().setFocus()
+
+    def textCursor(self):
+        return self.begin_edit().textCursor()
+
+    def setTextCursor(self, cursor):
+        self.begin_edit().setTextCursor(cursor)
+
+    # --- Edição ---
+
+    def begin_edit(self, scene_pos=None):
+        """Cria (uma vez) o QGraphicsTextItem editável no lugar do texto em cache"""
+        if self.editor is None:
+            editor = NodeTextItem(self._text, self.node)
+            editor.setFont(self._font)
+            editor.setDefaultTextColor(self._color)
+            editor.setTextWidth(self._width)
+            editor.setPos(self._pos)
+            editor.setTextInteractionFlags(self._flags if self._flags & Qt.TextEditorInteraction
+                                           else Qt.TextEditorInteraction)
+            self.editor = editor
+            self.node.update()
+        if scene_pos is not None:
+            layout = self.editor.document().documentLayout()
+            cursor = QTextCursor(self.editor.document())
+            cursor.setPosition(max(0, layout.hitTest(self.editor.mapFromScene(scene_pos), Qt.FuzzyHit)))
+            self.editor.setTextCursor(cursor)
+        return self.editor
+
+    def end_edit(self):
+        """Guarda o texto editado e solta o editor (o QTextDocument vai junto)"""
+        editor, self.editor = self.editor, None
+        if editor is None:
+            return
+        self._text = editor.toPlainText()
+        self._changed()
+        editor.setVisible(False)
+        # Fora do focusOutEvent do próprio editor
+        QTimer.singleShot(0, lambda: editor.scene() and editor.scene().removeItem(editor))
+
+    # --- Pintura ---
+
+    def approx_width(self):
+        """Largura do texto sem montar o layout (barra do modo afastado)"""
+        if self._static is not None:
+            return self._static.size().width()
+        key = self._font.key()
+        char = self._char_widths.get(key)
+        if char is None:
+            char = self._char_widths[key] = QFontMetricsF(self._font).averageCharWidth()
+        longest = max((len(line) for line in self._text.split("\n")), default=0)
+        width = longest * char
+        return min(width, self._width - 2 * self.MARGIN) if self._width > 0 else width
+
+    def paint(self, painter, lod, clip=None):
+        """
+        Desenha o texto em cache (chamado pelo paint() do nó); recorta só o que
+        não cabe. Um degradê em ObjectBoundingMode pintado antes, no mesmo
+        estado do painter, desloca o drawStaticText do raster: o nó pinta o
+        preenchimento entre save() e restore().
+        """
+        if self.editor is not None or not self._text or not LevelOfDetail.draws("text", lod):
+            return
+        static = self._layout()
+        origin = self._pos + QPointF(self.MARGIN, self.MARGIN)
+        painter.setPen(self._color)
+        painter.setFont(self._font)
+        if clip is not None and not clip.contains(QRectF(origin, static.size())):
+            painter.save()
+            painter.setClipRect(clip, Qt.IntersectClip)
+            painter.drawStaticText(origin, static)
+            painter.restore()
+        else:
+            painter.drawStaticText(origin, static)
+
+
+def paint_text_placeholder(painter, node, lod):
+    """Desenha uma barra cinza no lugar do texto quando ele está oculto pelo zoom"""
+    text_item = node.text_item
+    if LevelOfDetail.draws("text", lod) or not LevelOfDetail.draws("text_bar", lod):
+        return
+    if text_item.hasFocus() or not text_item.toPlainText():
+        return
+    r = node.rect()
+    width = min(text_item.approx_width(), r.width() - 20)
+    if width <= 0:
+        return
+    x = text_item.pos().x() + NodeText.MARGIN
+    y = r.center().y() - r.height() * 0.1
+    painter.save()
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(0, 0, 0, 70))
+    painter.drawRect(QRectF(x, y, width, r.height() * 0.2))
+    painter.restore()
@@ -0,0 +1,221 @@
+from PySide6.QtWidgets import QGraphicsItem
+from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtGui import QPen, QColor
+from core.commands import ResizeNodesCommand
+
+# Alças de redimensionamento: posição relativa no retângulo (0 = esquerda/topo, 1 = direita/base)
+HANDLES = {
+    'h1': (0.0, 0.0), 'h2': (0.5, 0.0), 'h3': (1.0, 0.0),
+    'h4': (0.0, 0.5),                   'h5': (1.0, 0.5),
+    'h6': (0.0, 1.0), 'h7': (0.5, 1.0), 'h8': (1.0, 1.0),
+}
+CURSORS = {
+    'h1': Qt.SizeFDiagCursor, 'h3': Qt.SizeBDiagCursor,
+    'h6': Qt.SizeBDiagCursor, 'h8': Qt.SizeFDiagCursor,
+    'h2': Qt.SizeVerCursor,   'h7': Qt.SizeVerCursor,
+    'h4': Qt.SizeHorCursor,   'h5': Qt.SizeHorCursor,
+}
+MIN_SIZE = 5.0
+
+
+def resize_rect(rect, pos_name, point, min_size=MIN_SIZE):
+    """
+    Novo retângulo (cena) ao puxar a alça até o ponto: só as bordas da alça
+    andam, a oposta fica fixa; abaixo do mínimo, a borda puxada para nele.
+    """
+    fx, fy = HANDLES[pos_name]
+    left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+    if fx == 0.0:
+        left = min(point.x(), right - min_size)
+    elif fx == 1.0:
+        right = max(point.x(), left + min_size)
+    if fy == 0.0:
+        top = min(point.y(), bottom - min_size)
+    elif fy == 1.0:
+        bottom = max(point.y(), top + min_size)
+    return QRectF(QPointF(left, top), QPointF(right, bottom))
+
+
+class SelectionOverlay(QGraphicsItem):
+    """
+    Um item só, por cima de tudo, que desenha as alças dos nós selecionados,
+    faz o próprio teste de clique nelas e conduz o redimensionamento (de
+    todos os selecionados de uma vez). Os nós não têm mais alças filhas:
+    fora da seleção, não custam nenhum item extra.
+    """
+    HANDLE = 8.0
+
+    def __init__(self):
+        super().__init__()
+        self.setZValue(1000)
+        self.setAcceptHoverEvents(True)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self._nodes = []
+        self._selected = set()
+        self._untracked = []
+        self._stale = False
+        self._bounds = QRectF()
+        self._dirty = False
+        self._pen = QPen(QColor("#1a1a1a"), 1)
+        self._brush = QColor("#f2f71d")
+        # Arraste em curso: alça, nó puxado, geometrias iniciais (x, y, w, h)
+        self._grab = None
+
+    # --- Seleção ---
+
+    @staticmethod
+    def resizable(item):
+        return hasattr(item, 'set_scene_geometry') and item.isVisible()
+
+    def selection_changed(self):
+        """
+        Chamado a cada mudança de seleção da cena: só marca a lista como velha.
+        Selecionar mil nós um a um não vira mil varreduras da seleção; a
+        lista é refeita uma vez, quando o índice ou a pintura pedem os limites.
+        """
+        self._stale = True
+        self.geometry_changed()
+        self.update()
+
+    def _sync(self):
+        self._stale = False
+        scene = self.scene()
+        self._nodes = [i for i in scene.selectedItems() if self.resizable(i)] if scene is not None else []
+        self._selected = set(self._nodes)
+        index = getattr(getattr(scene, 'snapping', None), 'index', None)
+        # Nós fora do índice espacial (sem magnetismo) são testados pela lista
+        self._untracked = [n for n in self._nodes if index is None or n not in index]
+
+    @property
+    def nodes(self):
+        if self._stale:
+            self._sync()
+        return self._nodes
+
+    def geometry_changed(self):
+        """Um nó selecionado moveu ou mudou de tamanho: os limites são refeitos sob demanda"""
+        if not self._dirty:
+            self.prepareGeometryChange()
+            self._dirty = True
+
+    @staticmethod
+    def scene_rect(node):
+        return node.mapRectToScene(node.rect())
+
+    def boundingRect(self):
+        if self._dirty:
+            self._dirty = False
+            bounds = QRectF()
+            for node in self.nodes:
+                bounds = bounds.united(self.scene_rect(node))
+            half = self.HANDLE / 2 + 1
+            self._bounds = bounds.adjusted(-half, -half, half, half) if not bounds.isNull() else QRectF()
+        return self._bounds
+
+    def _nodes_in(self, rect):
+        """Selecionados que tocam a área, pelo índice espacial quando a seleção é grande"""
+        nodes = self.nodes
+        index = getattr(getattr(self.scene(), 'snapping', None), 'index', None)
+        if index is None or len(nodes) < 64:
+            return [n for n in nodes if self.scene_rect(n).intersects(rect)]
+        found = index.query(rect.left(), rect.top(), rect.right(), rect.bottom())
+        return ([n for n in found if n in self._selected] +
+                [n for n in self._untracked if self.scene_rect(n).intersects(rect)])
+
+    def _handle_rect(self, rect, pos_name):
+        fx, fy = HANDLES[pos_name]
+        s = self.HANDLE
+        return QRectF(rect.left() + rect.width() * fx - s / 2, rect.top() + rect.height() * fy - s / 2, s, s)
+
+    def handle_at(self, point):
+        """(nó, alça) sob o ponto da cena, ou None"""
+        s = self.HANDLE
+        for node in self._nodes_in(QRectF(point.x() - s, point.y() - s, 2 * s, 2 * s)):
+            rect = self.scene_rect(node)
+            for pos_name in HANDLES:
+                if self._handle_rect(rect, pos_name).contains(point):
+                    return node, pos_name
+        return None
+
+    # --- Desenho e teste de clique ---
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(self._pen)
+        painter.setBrush(self._brush)
+        rects = []
+        for node in self._nodes_in(option.exposedRect):
+            rect = self.scene_rect(node)
+            rects += [self._handle_rect(rect, pos_name) for pos_name in HANDLES]
+        if rects:
+            painter.drawRects(rects)
+
+    def collidesWithPath(self, path, mode=Qt.IntersectsItemShape):
+        # Só as alças contam: clique no resto da área passa para os nós abaixo
+        # (sem montar um shape() com oito retângulos por nó selecionado)
+        return self.handle_at(path.boundingRect().center()) is not None
+
+    def contains(self, point):
+        return self.handle_at(point) is not None
+
+    def hoverMoveEvent(self, event):
+        hit = self.handle_at(event.scenePos())
+        if hit is not None:
+            self.setCursor(CURSORS[hit[1]])
+        else:
+            self.unsetCursor()
+
+    def hoverLeaveEvent(self, event):
+        self.unsetCursor()
+
+    # --- Redimensionamento ---
+
+    @staticmethod
+    def geometry_of(node):
+        pos, rect = node.scenePos(), node.rect()
+        return (pos.x(), pos.y(), rect.width(), rect.height())
+
+    def mousePressEvent(self, event):
+        hit = self.handle_at(event.scenePos()) if event.button() == Qt.LeftButton else None
+        if hit is None:
+            event.ignore()
+            return
+        node, pos_name = hit
+        self._grab = (pos_name, node, {n: self.geometry_of(n) for n in self.nodes})
+        event.accept()
+
+    def mouseMoveEvent(self, event):
+        if self._grab is None:
+            return
+        pos_name, anchor, start = self._grab
+        x, y, w, h = start[anchor]
+        before = QRectF(x, y, w, h)
+        after = resize_rect(before, pos_name, event.scenePos())
+        # Os outros selecionados recebem o mesmo deslocamento de cada borda
+        dl, dt = after.left() - before.left(), after.top() - before.top()
+        dr, db = after.right() - before.right(), after.bottom() - before.bottom()
+        for node, (x, y, w, h) in start.items():
+            if node.scene() is not self.scene():
+                continue
+            rect = QRectF(x, y, w, h)
+            fx, fy = HANDLES[pos_name]
+            corner = QPointF(rect.left() + dl if fx == 0.0 else rect.right() + dr,
+                             rect.top() + dt if fy == 0.0 else rect.bottom() + db)
+            if fx == 0.5:
+                corner.setX(rect.center().x())
+            if fy == 0.5:
+                corner.setY(rect.center().y())
+            r = resize_rect(rect, pos_name, corner)
+            node.set_scene_geometry(r.x(), r.y(), r.width(), r.height())
+        self.geometry_changed()
+
+    def mouseReleaseEvent(self, event):
+        grab, self._grab = self._grab, None
+        if grab is None:
+            return
+        start = {n: g for n, g in grab[2].items() if n.scene() is self.scene()}
+        changed = [n for n, g in start.items() if self.geometry_of(n) != g]
+        stack = getattr(self.scene(), 'undo_stack', None)
+        if not changed or stack is None or not all(hasattr(n, 'node_id') for n in changed):
+            return
+        stack.push(ResizeNodesCommand(self.scene(), changed, [start[n] for n in changed],
+                                      [self.geometry_of(n) for n in changed]))
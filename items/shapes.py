@@ -1,41 +1,326 @@
-from PySide6.QtWidgets import QGraphicsRectItem, QGraphicsTextItem, QApplication
-from PySide6.QtCore import Qt, QPointF
-from PySide6.QtGui import QColor, QPen, QBrush, QLinearGradient
+from PySide6.QtWidgets import QGraphicsRectItem, QStyle
+from PySide6.QtCore import Qt, QPointF, QRectF
+from PySide6.QtGui import QPen, QBrush, QColor, QPainterPath, QFont, QFontMetricsF
+from core.level_of_detail import LevelOfDetail
+from core.style_manager import StyleManager
+from core.shadow_renderer import ShadowRenderer
+from core.perf_monitor import profiled_paint, counted_item_change
+from items.node_text import NodeText, paint_text_placeholder
 
 class StyledNode(QGraphicsRectItem):
+    # Próximo ID persistente livre (IDs vindos de arquivo avançam o contador)
+    _next_id = 1
+    kind = "rectangle"
+    # Sombra (ShadowSpec) desenhada no próprio paint, a partir do cache compartilhado
+    shadow = None
+    _shadow_margin = (0, 0, 0, 0)
+    # Resultado da busca em destaque (contorno laranja)
+    highlighted = False
+    _highlight_pen = QPen(QColor("#ff8c00"), 4)
+    # Ramo recolhido: quantos nós estão ocultos (selo "+N" à direita do nó)
+    fold_count = 0
+    _badge_font = None
+
     # Alteramos para aceitar um brush opcional (para o recurso de clonar cor)
-    def __init__(self, x, y, text="", brush=None):
+    def __init__(self, x, y, text="", brush=None, node_id=None, style=None):
         super().__init__(0, 0, 160, 60)
+        # Linha deste nó no documento da cena (None enquanto fora da cena)
+        self.doc_row = None
+        self.style = None
         self.setPos(x, y)
+        if node_id is None:
+            node_id = StyledNode._next_id
+        StyledNode._next_id = max(StyledNode._next_id, node_id + 1)
+        self.node_id = node_id
         self.setFlags(QGraphicsRectItem.ItemIsMovable | 
                       QGraphicsRectItem.ItemIsSelectable | 
                       QGraphicsRectItem.ItemSendsGeometryChanges)
-        
-        # Lógica de Cor: Se não houver brush, aplica o degradê amarelo padrão
-        if brush:
-            self.setBrush(brush)
-        else:
-            grad = QLinearGradient(0, 0, 0, 60)
-            grad.setColorAt(0, QColor("#fdfc47")) # Amarelo claro topo
-            grad.setColorAt(1, QColor("#ffd700")) # Amarelo ouro base
-            self.setBrush(QBrush(grad))
-            
-        self.setPen(QPen(QColor("#333"), 2))
-        
-        # Configuração do Texto (vazio por padrão para novos objetos)
-        self.text_item = QGraphicsTextItem(text, self)
+
+        # Configuração do Texto (vazio por padrão para novos objetos): desenhado
+        # de um cache; o editor só é criado no duplo clique (ou pelo foco da main.py)
+        self.text_item = NodeText(text, self)
         self.text_item.setPos(10, 15)
-        # Permite edição mas o foco será controlado pela main.py
         self.text_item.setTextInteractionFlags(Qt.TextEditorInteraction)
+        self._wrap_text()
+
+        # Estilo compartilhado: sem estilo nem brush, o degradê amarelo padrão
+        if style is None:
+            style = StyleManager.registry.default
+        if brush:
+            style = StyleManager.registry.derive(style, **self._fill_of(brush))
+        self.set_style(style)
+
+    def document(self):
+        """Documento (modelo em arrays) onde este nó está registrado, se houver"""
+        if self.doc_row is None:
+            return None
+        return getattr(self.scene(), 'document', None)
+
+    @staticmethod
+    def _fill_of(brush):
+        fill, fill_end = StyleManager.brush_colors(QBrush(brush))
+        return {"fill": fill, "fill_end": fill_end}
+
+    def set_style(self, style):
+        """Aplica um estilo internado; só o que mudou em relação ao anterior é reaplicado"""
+        old, self.style = self.style, style
+        key, old_key = style.key, old.key if old is not None else None
+
+        def changed(*fields):
+            return old_key is None or any(getattr(key, f) != getattr(old_key, f) for f in fields)
+
+        if changed("fill", "fill_end"):
+            super().setBrush(style.brush())
+            # Cores (topo, base) em cache: usadas ao salvar sem consultar o brush
+            self.fill_colors = (key.fill, key.fill_end)
+            # Cor sólida usada no lugar do degradê quando o mapa está afastado
+            self._flat_color = style.flat_color()
+        if changed("border", "border_width"):
+            self.setPen(style.pen())
+        # Fonte e sombra padrão já estão no item novo: nada a reaplicar
+        if changed("font") and (old_key is not None or key.font):
+            self.text_item.setFont(style.font())
+        if changed("text_color"):
+            self.text_item.setDefaultTextColor(style.text_color())
+        if changed("shadow") and (old_key is not None or key.shadow):
+            spec = style.shadow_spec()
+            self.prepareGeometryChange()
+            self.shadow = spec
+            self._shadow_margin = spec.margin() if spec is not None else (0, 0, 0, 0)
+            self.update()
+        doc = self.document()
+        if doc is not None:
+            doc.set_style(self.doc_row, style)
+
+    def setBrush(self, brush):
+        self.set_style(StyleManager.registry.derive(self.style, **self._fill_of(brush)))
+
+    def _wrap_text(self):
+        # Texto quebrado na largura do nó: o cache não desenha fora do boundingRect
+        self.text_item.setTextWidth(self.rect().width() - 2 * self.text_item.pos().x())
+
+    def setRect(self, *args):
+        super().setRect(*args)
+        self._wrap_text()
+        doc = self.document()
+        if doc is not None:
+            r = self.rect()
+            doc.w[self.doc_row], doc.h[self.doc_row] = r.width(), r.height()
+            self.scene().snapping.track(self)
+        self._notify_group()
+        self._notify_overlay()
+
+    def set_scene_pos(self, x, y):
+        """Posiciona pela coordenada da cena (membros de grupo guardam pos() relativa ao grupo)"""
+        parent = self.parentItem()
+        self.setPos(parent.mapFromScene(x, y) if parent is not None else QPointF(x, y))
+
+    def set_scene_geometry(self, x, y, w, h):
+        """Posição (cena) e tamanho de uma vez: redimensionamento pelas alças e desfazer"""
+        self.set_scene_pos(x, y)
+        self.setRect(0, 0, w, h)
+        graph = getattr(self.scene(), 'graph', None)
+        if graph is not None:
+            graph.update_node(self)
+
+    def _notify_overlay(self):
+        # As alças da seleção são desenhadas por um item só da cena
+        if self.isSelected():
+            overlay = getattr(self.scene(), 'selection_overlay', None)
+            if overlay is not None:
+                overlay.geometry_changed()
+
+    def _notify_group(self):
+        parent = self.parentItem()
+        if parent is not None:
+            parent.member_changed()
+
+    def set_shadow(self, spec):
+        """Liga (ShadowSpec) ou desliga (None) a sombra; ela entra no boundingRect"""
+        self.set_style(StyleManager.registry.derive(self.style, shadow=spec.key() if spec is not None else None))
 
+    def boundingRect(self):
+        left, top, right, bottom = self._shadow_margin
+        rect = super().boundingRect().adjusted(-left, -top, right, bottom)
+        return rect.united(self.badge_rect()) if self.fold_count else rect
+
+    def shape(self):
+        path = super().shape()
+        if self.fold_count:
+            path.addRect(self.badge_rect())
+        return path
+
+    def set_fold_count(self, count):
+        """Mostra (count > 0) ou tira o selo de ramo recolhido"""
+        if count != self.fold_count:
+            self.prepareGeometryChange()
+            self.fold_count = count
+            self.update()
+
+    @classmethod
+    def _badge_text_font(cls):
+        # Criada na primeira vez (precisa da QApplication)
+        if cls._badge_font is None:
+            font = QFont()
+            font.setPointSizeF(8)
+            font.setBold(True)
+            StyledNode._badge_font = (font, QFontMetricsF(font))
+        return cls._badge_font
+
+    def badge_rect(self):
+        r = self.rect()
+        width = self._badge_text_font()[1].horizontalAdvance(f"+{self.fold_count}") + 10
+        return QRectF(r.right() + 4, r.center().y() - 9, max(width, 18), 18)
+
+    def paint_fold_badge(self, painter, lod):
+        if not self.fold_count:
+            return
+        rect = self.badge_rect()
+        painter.save()
+        painter.setPen(QPen(self.pen().color(), 0))
+        painter.setBrush(self._flat_color)
+        painter.drawRoundedRect(rect, 9, 9)
+        if LevelOfDetail.draws("text", lod):
+            painter.setPen(self.text_item.defaultTextColor())
+            painter.setFont(self._badge_text_font()[0])
+            painter.drawText(rect, Qt.AlignCenter, f"+{self.fold_count}")
+        painter.restore()
+
+    def mousePressEvent(self, event):
+        # Clique no selo expande o ramo
+        if self.fold_count and event.button() == Qt.LeftButton and self.badge_rect().contains(event.pos()):
+            folding = getattr(self.scene(), 'folding', None)
+            if folding is not None:
+                folding.set_folded([self], False)
+                event.accept()
+                return
+        super().mousePressEvent(event)
+
+    def paint_shadow(self, painter, lod):
+        if self.shadow is not None and LevelOfDetail.draws("shadow", lod):
+            ShadowRenderer.paint(painter, self.rect(), self.shadow, ellipse=self.kind == "ellipse")
+
+    def search_text(self):
+        return self.text_item.toPlainText()
+
+    def set_highlighted(self, on):
+        if on != self.highlighted:
+            self.highlighted = on
+            self.update()
+
+    def paint_highlight(self, painter):
+        if self.highlighted:
+            painter.setPen(self._highlight_pen)
+            painter.setBrush(Qt.NoBrush)
+            inner = self.rect().adjusted(2, 2, -2, -2)
+            if self.kind == "ellipse":
+                painter.drawEllipse(inner)
+            else:
+                painter.drawRect(inner)
+
+    def sync_text(self):
+        """Copia o texto do item para o documento (fim de edição ou setPlainText)"""
+        doc = self.document()
+        if doc is not None:
+            doc.texts[self.doc_row] = self.text_item.toPlainText()
+
+    @profiled_paint
+    def paint(self, painter, option, widget=None):
+        lod = LevelOfDetail.from_painter(painter)
+        self.paint_shadow(painter, lod)
+        if LevelOfDetail.draws("gradient", lod):
+            # Estado isolado: o degradê não pode vazar para o texto (ver NodeText.paint)
+            painter.save()
+            super().paint(painter, option, widget)
+            painter.restore()
+        else:
+            # Modo simplificado: cor chapada e borda fina, sem degradê
+            painter.setPen(QPen(self.pen().color(), 0) if option.state & QStyle.State_Selected else Qt.NoPen)
+            painter.setBrush(self._flat_color)
+            painter.drawRect(self.rect())
+        self.text_item.paint(painter, lod, clip=self.rect())
+        paint_text_placeholder(painter, self, lod)
+        self.paint_highlight(painter)
+        self.paint_fold_badge(painter, lod)
+
+    def mouseDoubleClickEvent(self, event):
+        # Edição: o QGraphicsTextItem nasce aqui, com o cursor no ponto clicado
+        self.text_item.begin_edit(event.scenePos()).setFocus()
+        event.accept()
+
+    @counted_item_change
     def itemChange(self, change, value):
         if change == QGraphicsRectItem.ItemPositionChange:
-            # Magnetismo vinculado à checkbox da Main
-            main_win = QApplication.activeWindow()
-            if hasattr(main_win, 'cb_magnetismo') and main_win.cb_magnetismo.isChecked():
-                grid = 20
-                new_pos = value
-                x = round(new_pos.x() / grid) * grid
-                y = round(new_pos.y() / grid) * grid
-                return QPointF(x, y)
-        return super().itemChange(change, value)
\ No newline at end of file
+            # Magnetismo (estado em cache na cena, ligado à checkbox da Main)
+            snap = getattr(self.scene(), 'snap_position', None)
+            if snap is not None:
+                return snap(self, value)
+        elif change == QGraphicsRectItem.ItemPositionHasChanged:
+            scene = self.scene()
+            graph = getattr(scene, 'graph', None)
+            if graph is not None:
+                graph.update_node(self)
+            snapping = getattr(scene, 'snapping', None)
+            if snapping is not None:
+                snapping.track(self)
+            doc = self.document()
+            if doc is not None:
+                # O documento guarda coordenadas da cena, também para membros de grupo
+                pos = value if self.parentItem() is None else self.scenePos()
+                doc.x[self.doc_row], doc.y[self.doc_row] = pos.x(), pos.y()
+            self._notify_group()
+            self._notify_overlay()
+        elif change == QGraphicsRectItem.ItemSceneChange:
+            doc = self.document()
+            if doc is not None:
+                doc.remove_node(self)
+            snapping = getattr(self.scene(), 'snapping', None)
+            if snapping is not None:
+                snapping.untrack(self)
+            search = getattr(self.scene(), 'search', None)
+            if search is not None:
+                search.remove(self)
+        elif change == QGraphicsRectItem.ItemSceneHasChanged:
+            doc = getattr(value, 'document', None)
+            if doc is not None:
+                doc.add_node(self)
+            snapping = getattr(value, 'snapping', None)
+            if snapping is not None:
+                snapping.track(self)
+            search = getattr(value, 'search', None)
+            if search is not None:
+                search.mark_dirty(self)
+        return super().itemChange(change, value)
+
+class EllipseNode(StyledNode):
+    """Variante elíptica do nó (tipo "ellipse" nos arquivos .amind)"""
+    kind = "ellipse"
+
+    def shape(self):
+        path = QPainterPath()
+        path.addEllipse(self.rect())
+        if self.fold_count:
+            path.addRect(self.badge_rect())
+        return path
+
+    @profiled_paint
+    def paint(self, painter, option, widget=None):
+        lod = LevelOfDetail.from_painter(painter)
+        self.paint_shadow(painter, lod)
+        painter.save()
+        if LevelOfDetail.draws("gradient", lod):
+            painter.setPen(self.pen())
+            painter.setBrush(self.brush())
+        else:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self._flat_color)
+        painter.drawEllipse(self.rect())
+        painter.restore()
+        if option.state & QStyle.State_Selected:
+            painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.rect())
+        self.text_item.paint(painter, lod, clip=self.rect())
+        paint_text_placeholder(painter, self, lod)
+        self.paint_highlight(painter)
+        self.paint_fold_badge(painter, lod)
@@ -1,41 +1,54 @@
 import sys
 import os
-import json
+import time
 from PySide6.QtWidgets import (QMainWindow, QApplication, QGraphicsView, 
-                             QGraphicsScene, QFileDialog, QToolBar,
+                             QGraphicsTextItem, QFileDialog, QToolBar,
                              QStatusBar, QWidget, QFrame, QStyle, 
-                             QFontDialog, QColorDialog, QGraphicsDropShadowEffect,
-                             QCheckBox)
-from PySide6.QtCore import Qt, QRectF, QSize, QPointF, QPoint
+                             QFontDialog, QColorDialog,
+                             QCheckBox, QProgressDialog, QMenu, QToolButton, QInputDialog)
+from PySide6.QtCore import Qt, QRectF, QSize, QPointF, QPoint, QTimer, Signal
 from PySide6.QtGui import (QPainter, QColor, QImage, QIcon, QAction, QLinearGradient,
-                          QWheelEvent, QKeyEvent, QUndoStack, QPen, QFont, QPixmap, QBrush)
+                          QWheelEvent, QKeyEvent, QUndoStack, QPen, QFont, QPixmap, QActionGroup)
+from core.scene import MindMapScene
+from core.level_of_detail import LevelOfDetail
+from core.style_manager import StyleManager
+from core.perf_monitor import PerfMonitor, PerfHud
+from core.search_panel import SearchPanel
+from core.export import MapExporter, ExportCanceled, export_rect
+from core.minimap import MinimapPanel
+from core.importers import is_importable
 
 # --- CLASSES DO SISTEMA ---
 try:
     from items.shapes import StyledNode as MindMapNode 
     from core.connection import SmartConnection
+    from core.persistence import PersistenceManager
+    from core.journal import ChangeJournal
+    from core.commands import (MoveCommand, MoveNodesCommand, AddNodeCommand, StyleNodesCommand,
+                               ConnectCommand, DeleteCommand, GroupCommand, UngroupCommand, UndoHistory)
+    from items.group_item import GroupNode
+    from core.layout import LayoutRunner
 except ImportError:
     # Placeholder funcional para garantir execução
-    from PySide6.QtWidgets import QGraphicsRectItem, QGraphicsTextItem
+    from PySide6.QtWidgets import QGraphicsRectItem
+    UndoHistory = QUndoStack
     class MindMapNode(QGraphicsRectItem):
-        def __init__(self, x, y, brush=None):
+        def __init__(self, x, y, brush=None, style=None):
             super().__init__(0, 0, 160, 60)
             self.setPos(x, y)
             self.setFlags(QGraphicsRectItem.ItemIsMovable | QGraphicsRectItem.ItemIsSelectable | QGraphicsRectItem.ItemSendsGeometryChanges)
-            # Aplicar Degradê Amarelo Padrão
-            if not brush:
-                grad = QLinearGradient(0, 0, 0, 60)
-                grad.setColorAt(0, QColor("#fdfc47"))
-                grad.setColorAt(1, QColor("#24fe41")) # Exemplo de degradê, ajuste para amarelo
-                self.setBrush(QBrush(QColor("#f2f71d")))
-            else:
-                self.setBrush(brush)
+            # Degradê Amarelo Padrão (brush compartilhado do registro de estilos)
+            self.style = style or StyleManager.registry.default
+            self.setBrush(brush or self.style.brush())
             
             self.text_item = QGraphicsTextItem("", self)
             self.text_item.setPos(10, 15)
             self.text_item.setTextInteractionFlags(Qt.TextEditorInteraction)
 
 class InfiniteCanvas(QGraphicsView):
+    # Área visível (em coordenadas da cena) mudou: zoom, pan ou redimensionamento
+    viewport_changed = Signal(QRectF)
+
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
         self.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform)
@@ -43,13 +56,77 @@ class InfiniteCanvas(QGraphicsView):
         self.setFrameStyle(QFrame.NoFrame)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        # As conexões não se recalculam mais no paint(): basta repintar o que mudou
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self._is_panning = False
+        self._drag_origin = {}
+        self.last_frame_ms = 0.0
+        self._visible_rect = QRectF()
+        # HUD de desempenho (F3), desligado por padrão
+        self.hud = PerfHud(self)
+        self.hud.move(8, 8)
+        # A área de rolagem acompanha a cena (que cresce e encolhe com o mapa)
+        scene.sceneRectChanged.connect(lambda _: self.extend_scroll_area(force=True))
+        self.extend_scroll_area(force=True)
+
+    def zoom(self):
+        return self.transform().m11()
+
+    def paintEvent(self, event):
+        started = time.perf_counter()
+        # Garante que nenhuma conexão suja seja desenhada com a geometria antiga
+        scene = self.scene()
+        if hasattr(scene, 'has_pending_connections') and scene.has_pending_connections():
+            scene.flush_connections()
+        super().paintEvent(event)
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        if visible != self._visible_rect:
+            self._visible_rect = visible
+            self.viewport_changed.emit(visible)
+        self.last_frame_ms = LevelOfDetail.record_frame(self.zoom(), started)
+        if PerfMonitor.enabled:
+            PerfMonitor.end_frame(started, self.last_frame_ms)
+
+    def extend_scroll_area(self, force=False):
+        """
+        Área de rolagem da view: os limites da cena mais uma tela para cada
+        lado do que está visível, para o pan e o zoom nunca baterem na borda.
+        Só é refeita quando a folga em volta da tela cai pela metade.
+        """
+        scene = self.scene()
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        w, h = visible.width(), visible.height()
+        if not force and self.sceneRect().contains(visible.adjusted(-w / 2, -h / 2, w / 2, h / 2)):
+            return
+        self.setSceneRect(scene.sceneRect().united(visible.adjusted(-w, -h, w, h)))
+
+    def scrollContentsBy(self, dx, dy):
+        # Pan, centerOn (minimapa, busca) e zoom com âncora passam por aqui
+        super().scrollContentsBy(dx, dy)
+        self.extend_scroll_area()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.extend_scroll_area()
 
     def wheelEvent(self, event: QWheelEvent):
         factor = 1.15 if event.angleDelta().y() > 0 else 0.85
         self.scale(factor, factor)
+        self.extend_scroll_area()
+        self.apply_level_of_detail()
+
+    def apply_level_of_detail(self):
+        """Atualiza o que depende do zoom (as sombras são omitidas pelo próprio paint)"""
+        snapping = getattr(self.scene(), 'snapping', None)
+        if snapping is not None:
+            # Tolerância do magnetismo em pixels de tela, qualquer que seja o zoom
+            snapping.scale = self.zoom()
+        window = self.window()
+        if isinstance(window, QMainWindow):
+            window.statusBar().showMessage(
+                f"Zoom: {self.zoom():.0%} | Detalhe: {LevelOfDetail.tier(self.zoom())} | "
+                f"Último frame: {self.last_frame_ms:.1f} ms")
 
     def mousePressEvent(self, event):
         item = self.itemAt(event.position().toPoint())
@@ -61,6 +138,13 @@ class InfiniteCanvas(QGraphicsView):
         if event.button() == Qt.LeftButton:
             self.setDragMode(QGraphicsView.NoDrag if item else QGraphicsView.RubberBandDrag)
         super().mousePressEvent(event)
+        # Alça de redimensionamento: o overlay registra o próprio comando
+        if event.button() == Qt.LeftButton and item and item is not getattr(self.scene(), 'selection_overlay', None):
+            # Posições de partida do arraste, para registrar o movimento na pilha de desfazer
+            self._drag_origin = {i: i.pos() for i in self.scene().selectedItems()
+                                 if i.flags() & i.GraphicsItemFlag.ItemIsMovable}
+            if hasattr(self.scene(), 'begin_drag'):
+                self.scene().begin_drag(self._drag_origin)
 
     def mouseMoveEvent(self, event):
         if self._is_panning:
@@ -75,12 +159,62 @@ class InfiniteCanvas(QGraphicsView):
         self._is_panning = False
         self.setCursor(Qt.ArrowCursor)
         super().mouseReleaseEvent(event)
+        if hasattr(self.scene(), 'end_drag'):
+            self.scene().end_drag()
+        self.commit_drag()
+
+    def commit_drag(self):
+        """Transforma o arraste concluído em comandos de movimento (um passo de desfazer)"""
+        origin, self._drag_origin = self._drag_origin, {}
+        stack = getattr(self.scene(), 'undo_stack', None)
+        moved = [(i, old) for i, old in origin.items() if i.scene() is self.scene() and i.pos() != old]
+        if stack is None or not moved:
+            return
+        # Nós vão num único MoveNodesCommand (que se funde com arrastes seguidos)
+        nodes = [(i, old) for i, old in moved if hasattr(i, 'node_id')]
+        others = [(i, old) for i, old in moved if not hasattr(i, 'node_id')]
+        if others:
+            stack.beginMacro("Mover Objetos")
+        if nodes:
+            # O comando usa coordenadas da cena; membros de grupo guardam pos() relativa
+            # (o grupo não se move durante o arraste do membro: o desvio é constante)
+            old_scene = [old + (i.scenePos() - i.pos()) for i, old in nodes]
+            stack.push(MoveNodesCommand(self.scene(), [i for i, _ in nodes],
+                                        [(p.x(), p.y()) for p in old_scene],
+                                        [(i.scenePos().x(), i.scenePos().y()) for i, _ in nodes]))
+        for item, old in others:
+            stack.push(MoveCommand(item, old, item.pos()))
+        if others:
+            stack.endMacro()
+
+    NUDGE_KEYS = {Qt.Key_Left: (-1, 0), Qt.Key_Right: (1, 0), Qt.Key_Up: (0, -1), Qt.Key_Down: (0, 1)}
+
+    def keyPressEvent(self, event):
+        if event.key() in self.NUDGE_KEYS and self.nudge_selected(event):
+            return
+        super().keyPressEvent(event)
+
+    def nudge_selected(self, event):
+        """Setas movem a seleção (Shift: 10 px); segurar a tecla vira um só passo de desfazer"""
+        scene = self.scene()
+        stack = getattr(scene, 'undo_stack', None)
+        # Com um texto em edição, as setas continuam movendo o cursor
+        focus = scene.focusItem()
+        if stack is None or (isinstance(focus, QGraphicsTextItem) and focus.hasFocus()):
+            return False
+        nodes = [i for i in scene.selectedItems() if hasattr(i, 'node_id')]
+        if not nodes: return False
+        dx, dy = self.NUDGE_KEYS[event.key()]
+        step = 10 if event.modifiers() & Qt.ShiftModifier else 1
+        old = [(n.scenePos().x(), n.scenePos().y()) for n in nodes]
+        stack.push(MoveNodesCommand(scene, nodes, old, [(x + dx * step, y + dy * step) for x, y in old]))
+        return True
 
 class AmareloMainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Amarelo Mind")
-        self.undo_stack = QUndoStack(self)
+        self.undo_stack = UndoHistory(self)
         self.current_file = None
         
         self.setStyleSheet("""
@@ -91,10 +225,33 @@ class AmareloMainWindow(QMainWindow):
             }
         """)
 
-        self.scene = QGraphicsScene(-10000, -10000, 20000, 20000)
+        self.scene = MindMapScene()
+        self.scene.undo_stack = self.undo_stack
         self.view = InfiniteCanvas(self.scene, self)
         self.setCentralWidget(self.view)
+        # Busca (Ctrl+F) num painel lateral, escondido até ser usado
+        self.search_panel = SearchPanel(self.scene, self.view, self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.search_panel)
+        self.search_panel.hide()
+        # Minimapa (Ctrl+M) no mesmo lado, escondido até ser pedido
+        self.minimap_panel = MinimapPanel(self.scene, self.view, self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.minimap_panel)
+        self.minimap_panel.hide()
         
+        self.persistence = PersistenceManager(self.scene)
+        self.persistence.signals.finished.connect(self.on_save_finished)
+        self.persistence.signals.failed.connect(self.on_save_failed)
+        self.layout_runner = LayoutRunner(self.scene, self)
+        self.layout_runner.finished.connect(self.on_layout_finished)
+        self.layout_runner.progress.connect(lambda done, total: self.statusBar().showMessage(f"Organizando o mapa... {done}/{total}"))
+        self.layout_runner.failed.connect(lambda message: self.statusBar().showMessage(f"Erro no layout: {message}"))
+
+        # Autosave: a cada poucos segundos só o diário de alterações vai para o disco
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(5000)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start()
+
         self.setup_toolbar()
         self.showMaximized()
 
@@ -117,6 +274,24 @@ class AmareloMainWindow(QMainWindow):
         p.drawEllipse(25, 15, 50, 50) # Bola 3D
         p.end(); return QIcon(pixmap)
 
+    def draw_layout_icon(self):
+        pixmap = QPixmap(100, 100); pixmap.fill(Qt.transparent)
+        p = QPainter(pixmap); p.setRenderHint(QPainter.Antialiasing)
+        p.setPen(QPen(Qt.white, 5))
+        p.drawLine(25, 50, 75, 20); p.drawLine(25, 50, 75, 50); p.drawLine(25, 50, 75, 80) # Ramos
+        p.setBrush(QColor("#f2f71d")); p.setPen(Qt.transparent)
+        for cx, cy in ((25, 50), (75, 20), (75, 50), (75, 80)):
+            p.drawEllipse(QPointF(cx, cy), 11, 11)
+        p.end(); return QIcon(pixmap)
+
+    def draw_align_icon(self):
+        pixmap = QPixmap(100, 100); pixmap.fill(Qt.transparent)
+        p = QPainter(pixmap); p.setPen(QPen(Qt.white, 6))
+        p.drawLine(15, 10, 15, 90) # Borda de referência
+        p.setBrush(QColor("#f2f71d")); p.setPen(Qt.transparent)
+        p.drawRect(22, 20, 60, 20); p.drawRect(22, 60, 40, 20)
+        p.end(); return QIcon(pixmap)
+
     def setup_toolbar(self):
         self.toolbar = QToolBar()
         self.toolbar.setIconSize(QSize(40, 40))
@@ -128,11 +303,21 @@ class AmareloMainWindow(QMainWindow):
         act_save.setShortcut("Ctrl+S")
         self.toolbar.addAction(act_save)
 
+        # Exportação em ladrilhos (PNG em qualquer DPI, SVG e PDF)
+        export_menu = QMenu(self)
+        export_menu.addAction("Mapa inteiro...", lambda: self.export_image(False))
+        export_menu.addAction("Seleção...", lambda: self.export_image(True))
+        act_export = QAction(self.style().standardIcon(QStyle.SP_DialogSaveButton), "Exportar", self)
+        act_export.setMenu(export_menu)
+        self.toolbar.addAction(act_export)
+        self.toolbar.widgetForAction(act_export).setPopupMode(QToolButton.InstantPopup)
+
         self.toolbar.addSeparator()
 
         # Magnetismo
         self.cb_magnetismo = QCheckBox("Magnetismo (M)")
         self.cb_magnetismo.setStyleSheet("color: white;")
+        self.cb_magnetismo.toggled.connect(self.scene.snapping.set_enabled)
         self.toolbar.addWidget(self.cb_magnetismo)
 
         self.toolbar.addSeparator()
@@ -155,26 +340,103 @@ class AmareloMainWindow(QMainWindow):
         self.toolbar.addAction(QAction(self.style().standardIcon(QStyle.SP_BrowserReload), "Conectar (C)", self, triggered=self.connect_nodes, shortcut="C"))
         self.toolbar.addAction(QAction(self.draw_font_icon(), "Fonte", self, triggered=self.unified_font))
         self.toolbar.addAction(QAction(self.style().standardIcon(QStyle.SP_DialogResetButton), "Cor", self, triggered=self.apply_color))
+        self.toolbar.addAction(QAction(self.style().standardIcon(QStyle.SP_DialogApplyButton), "Mesmo Estilo", self, triggered=self.select_same_style))
         self.toolbar.addAction(QAction(self.draw_shadow_ball_icon(), "Sombra", self, triggered=self.toggle_shadow))
+
+        # Alinhamento da seleção (calculado no documento em arrays)
+        align_menu = QMenu(self)
+        for label, edge in (("Esquerda", "left"), ("Centro", "hcenter"), ("Direita", "right"),
+                            ("Topo", "top"), ("Meio", "vcenter"), ("Base", "bottom")):
+            align_menu.addAction(label, lambda edge=edge: self.align_selected(edge))
+        act_align = QAction(self.draw_align_icon(), "Alinhar", self)
+        act_align.setMenu(align_menu)
+        self.toolbar.addAction(act_align)
+        self.toolbar.widgetForAction(act_align).setPopupMode(QToolButton.InstantPopup)
+
+        # Layout automático (calculado numa thread, aplicado como um passo de desfazer)
+        layout_menu = QMenu(self)
+        for label, mode in (("Árvore", "tree"), ("Radial", "radial"), ("Forças", "force")):
+            layout_menu.addAction(label, lambda mode=mode: self.auto_layout(mode))
+        act_layout = QAction(self.draw_layout_icon(), "Organizar", self)
+        act_layout.setMenu(layout_menu)
+        self.toolbar.addAction(act_layout)
+        self.toolbar.widgetForAction(act_layout).setPopupMode(QToolButton.InstantPopup)
+
+        # Rotas das conexões: retas, curvas ou ortogonais desviando dos nós
+        route_menu = QMenu(self)
+        route_group = QActionGroup(self)
+        for label, mode in (("Retas", "straight"), ("Curvas", "curved"), ("Ortogonais", "orthogonal")):
+            action = route_menu.addAction(label, lambda mode=mode: self.scene.set_routing(mode))
+            action.setCheckable(True)
+            action.setChecked(mode == self.scene.router.mode)
+            route_group.addAction(action)
+        act_route = QAction(self.style().standardIcon(QStyle.SP_ArrowRight), "Rotas", self)
+        act_route.setMenu(route_menu)
+        self.toolbar.addAction(act_route)
+        self.toolbar.widgetForAction(act_route).setPopupMode(QToolButton.InstantPopup)
+
+        # Grupos (aninháveis): mover o grupo move tudo; duplo clique recolhe
+        group_menu = QMenu(self)
+        for label, shortcut, slot in (("Agrupar", "Ctrl+G", self.group_selected),
+                                      ("Desagrupar", "Ctrl+Shift+G", self.ungroup_selected),
+                                      ("Recolher/Expandir", "Ctrl+.", self.toggle_groups)):
+            action = group_menu.addAction(label, slot)
+            action.setShortcut(shortcut)
+            self.addAction(action)
+        act_group = QAction(self.style().standardIcon(QStyle.SP_DirClosedIcon), "Grupo", self)
+        act_group.setMenu(group_menu)
+        self.toolbar.addAction(act_group)
+        self.toolbar.widgetForAction(act_group).setPopupMode(QToolButton.InstantPopup)
+
+        # Ramos: recolhidos ficam só no documento (selo "+N"), sem itens na cena
+        branch_menu = QMenu(self)
+        for label, shortcut, slot in (("Recolher/Expandir Ramo", "Alt+.", self.toggle_branches),
+                                      ("Expandir Tudo", "Alt+Shift+.", self.expand_all_branches)):
+            action = branch_menu.addAction(label, slot)
+            action.setShortcut(shortcut)
+            self.addAction(action)
+        act_branch = QAction(self.style().standardIcon(QStyle.SP_ToolBarHorizontalExtensionButton), "Ramos", self)
+        act_branch.setMenu(branch_menu)
+        self.toolbar.addAction(act_branch)
+        self.toolbar.widgetForAction(act_branch).setPopupMode(QToolButton.InstantPopup)
         self.toolbar.addAction(QAction(self.style().standardIcon(QStyle.SP_TrashIcon), "Excluir", self, triggered=self.delete_sel, shortcut="Delete"))
+        self.toolbar.addAction(QAction(self.style().standardIcon(QStyle.SP_FileDialogContentsView), "Buscar (Ctrl+F)", self, triggered=self.search_panel.open, shortcut="Ctrl+F"))
+        act_minimap = self.minimap_panel.toggleViewAction()
+        act_minimap.setIcon(self.style().standardIcon(QStyle.SP_FileDialogDetailedView))
+        act_minimap.setText("Minimapa (Ctrl+M)")
+        act_minimap.setShortcut("Ctrl+M")
+        self.toolbar.addAction(act_minimap)
+
+        # Diagnóstico: HUD de desempenho e trace no formato do Chrome
+        perf_menu = QMenu(self)
+        self.act_hud = perf_menu.addAction("Mostrar HUD (F3)")
+        self.act_hud.setCheckable(True)
+        self.act_hud.setShortcut("F3")
+        self.act_hud.toggled.connect(self.view.hud.set_active)
+        self.addAction(self.act_hud)
+        act_trace = perf_menu.addAction("Gravar trace")
+        act_trace.setCheckable(True)
+        act_trace.toggled.connect(self.toggle_trace)
+        perf_menu.addAction("Exportar trace...", self.export_trace)
+        act_perf = QAction(self.style().standardIcon(QStyle.SP_ComputerIcon), "Desempenho", self)
+        act_perf.setMenu(perf_menu)
+        self.toolbar.addAction(act_perf)
+        self.toolbar.widgetForAction(act_perf).setPopupMode(QToolButton.InstantPopup)
 
     # --- LÓGICA DE FUNCIONAMENTO ---
 
     def add_smart_node(self):
         sel = self.scene.selectedItems()
-        new_brush = None
+        new_style = None
         if len(sel) == 1 and isinstance(sel[0], MindMapNode):
-            new_brush = sel[0].brush() # Copia o degradê/cor do selecionado
-            pos = sel[0].pos() + QPointF(40, 40)
+            new_style = sel[0].style # Compartilha o estilo (degradê, fonte, sombra) do selecionado
+            pos = sel[0].scenePos() + QPointF(40, 40)
         else:
             pos = self.view.mapToScene(self.view.rect().center())
 
-        node = MindMapNode(pos.x(), pos.y(), brush=new_brush)
-        self.scene.addItem(node)
-        
-        # Foco automático no texto
-        node.setSelected(True)
-        node.text_item.setFocus()
+        node = MindMapNode(pos.x(), pos.y(), style=new_style)
+        # O comando adiciona, seleciona e dá foco ao texto (Requisitos de interação)
+        self.undo_stack.push(AddNodeCommand(self.scene, node))
         # Seleciona todo o texto para facilitar a substituição
         cursor = node.text_item.textCursor()
         cursor.select(cursor.SelectionType.Document)
@@ -182,26 +444,110 @@ class AmareloMainWindow(QMainWindow):
 
     def save_project(self):
         if not self.current_file:
-            path, _ = QFileDialog.getSaveFileName(self, "Salvar Como", "", "Amarelo (*.amarelo)")
+            path, _ = QFileDialog.getSaveFileName(self, "Salvar Como", "", "Amarelo Mind (*.amind);;Amarelo (*.amarelo)")
             if not path: return
             self.current_file = path
-        
-        data = [{"pos": [i.x(), i.y()], "text": i.text_item.toPlainText(), "color": i.brush().color().name()} 
-                for i in self.scene.items() if isinstance(i, MindMapNode)]
-        with open(self.current_file, 'w') as f: json.dump(data, f)
-        self.statusBar().showMessage(f"Salvo: {self.current_file}")
+
+        self.compact(self.current_file)
+
+    def compact(self, path):
+        """
+        Salvamento completo: congela o diário e tira o retrato no mesmo instante;
+        a gravação roda em segundo plano e, ao terminar, o diário congelado é descartado.
+        """
+        if path.endswith(".amind"):
+            self.attach_journal(path)
+        if self.scene.journal is not None:
+            self.scene.journal.begin_compaction()
+        # Só o retrato da cena é feito aqui; a gravação roda em segundo plano
+        self.current_file = self.persistence.save_async(path)
+        self.statusBar().showMessage(f"Salvando: {self.current_file}...")
+
+    def attach_journal(self, path):
+        journal = self.scene.journal
+        if journal is not None and journal.map_path == path:
+            return journal
+        if journal is not None:
+            journal.flush()
+        self.scene.journal = ChangeJournal(path) if path.endswith(".amind") else None
+        return self.scene.journal
+
+    def autosave(self):
+        journal = self.scene.journal
+        if journal is None or not self.current_file:
+            return
+        journal.flush()
+        if journal.needs_compaction():
+            self.compact(self.current_file)
+
+    def on_save_finished(self, path, snapshot_ms, write_ms):
+        journal = self.scene.journal
+        if journal is not None and journal.map_path == path:
+            journal.end_compaction()
+        self.statusBar().showMessage(f"Salvo: {path} (retrato {snapshot_ms:.0f} ms, gravação {write_ms:.0f} ms)")
+
+    def on_save_failed(self, path, message):
+        self.statusBar().showMessage(f"Erro ao salvar {path}: {message}")
+
+    def closeEvent(self, event):
+        # Não deixa uma gravação pela metade ao fechar; o diário guarda o que não foi salvo
+        self.layout_runner.cancel()
+        PersistenceManager.wait_for_saves()
+        if self.scene.journal is not None:
+            self.scene.journal.flush()
+        super().closeEvent(event)
 
     def open_project(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Abrir", "", "Amarelo (*.amarelo)")
-        if path:
-            self.scene.clear()
+        path, _ = QFileDialog.getOpenFileName(self, "Abrir", "", "Mapas (*.amind *.amarelo *.mm *.opml *.md *.markdown);;"
+                                              "Amarelo Mind (*.amind *.amarelo);;"
+                                              "Importar FreeMind, OPML, Markdown (*.mm *.opml *.md *.markdown)")
+        if not path: return
+        self.open_path(path)
+
+    def open_path(self, path):
+        """Abre o mapa sem diálogo (também usado pelos benchmarks); devolve o MapLoader"""
+        if getattr(self, 'loader', None) is not None and self.loader.is_running():
+            self.loader.cancel()
+
+        # Leitura em segundo plano; os nós entram na cena aos poucos
+        if self.scene.journal is not None:
+            self.scene.journal.flush()
+        self.scene.journal = None
+        self.undo_stack.clear()
+        self.search_panel.reset()
+        self.minimap_panel.reset()
+        self.current_file = None
+        self.loader = self.persistence.load_from_file(path, parent=self)
+
+        progress = QProgressDialog("Carregando mapa...", "Cancelar", 0, 1000, self)
+        progress.setWindowTitle("Abrir")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(400)
+        progress.canceled.connect(self.loader.cancel)
+        self.loader.progress.connect(lambda done, total: progress.setValue(int(done * 1000 / total)))
+
+        def finished(nodes, connections):
+            progress.reset()
+            if is_importable(path):
+                # Mapa importado: o primeiro "Salvar" pergunta onde gravar o .amind
+                self.statusBar().showMessage(f"Importado: {path} ({nodes} objetos, {connections} conexões)")
+                return
             self.current_file = path
-            with open(path, 'r') as f:
-                for n in json.load(f):
-                    node = MindMapNode(n["pos"][0], n["pos"][1])
-                    node.text_item.setPlainText(n["text"])
-                    node.setBrush(QBrush(QColor(n["color"])))
-                    self.scene.addItem(node)
+            message = f"Aberto: {path} ({nodes} objetos, {connections} conexões)"
+            # Recuperação: reaplica o que ficou só no diário (queda ou fechamento sem salvar)
+            journal = self.attach_journal(path)
+            if journal is not None and journal.has_recovery():
+                message += f" | {journal.replay(self.scene)} alterações recuperadas do diário"
+            self.statusBar().showMessage(message)
+
+        def failed(message):
+            progress.reset()
+            self.statusBar().showMessage(f"Erro ao abrir {path}: {message}")
+
+        self.loader.finished.connect(finished)
+        self.loader.failed.connect(failed)
+        self.loader.canceled.connect(lambda: self.statusBar().showMessage("Abertura cancelada"))
+        return self.loader
 
     def keyPressEvent(self, event):
         # ESC para des-selecionar
@@ -218,41 +564,155 @@ class AmareloMainWindow(QMainWindow):
         ok, font = QFontDialog.getFont(self)
         if ok:
             color = QColorDialog.getColor(Qt.black, self, "Cor da Fonte")
-            for item in sel:
-                if hasattr(item, 'text_item'):
-                    item.text_item.setFont(font)
-                    if color.isValid(): item.text_item.setDefaultTextColor(color)
+            changes = {"font": font.toString()}
+            if color.isValid(): changes["text_color"] = color.rgba()
+            # Nós com o mesmo estilo de origem acabam com o mesmo estilo (e a mesma QFont)
+            self.restyle([i for i in sel if isinstance(i, MindMapNode)], changes, "Alterar Fonte")
 
     def apply_color(self):
         sel = self.scene.selectedItems()
         if not sel: return
         color = QColorDialog.getColor(Qt.yellow, self)
         if color.isValid():
-            for item in sel:
-                if isinstance(item, MindMapNode):
-                    grad = QLinearGradient(0, 0, 0, 60)
-                    grad.setColorAt(0, color.lighter(120))
-                    grad.setColorAt(1, color.darker(110))
-                    item.setBrush(grad)
+            fill = {"fill": color.lighter(120).rgba(), "fill_end": color.darker(110).rgba()}
+            self.restyle([i for i in sel if isinstance(i, MindMapNode)], fill, "Alterar Cor")
+
+    def restyle(self, nodes, changes, text):
+        """Deriva o novo estilo de cada nó e aplica tudo num único passo de desfazer"""
+        if not nodes: return
+        old = [n.style for n in nodes]
+        # Um derive por estilo distinto, não por nó
+        derived = {s.id: StyleManager.registry.derive(s, **changes) for s in old}
+        self.undo_stack.push(StyleNodesCommand(self.scene, nodes, old, [derived[s.id] for s in old], text))
+
+    def select_same_style(self):
+        """Seleciona todos os nós que compartilham o estilo dos selecionados (reestilizar em lote)"""
+        styles = {item.style.id for item in self.scene.selectedItems() if isinstance(item, MindMapNode)}
+        if not styles: return
+        doc = self.scene.document
+        for row in doc.rows_with_style(styles).tolist():
+            doc.views[row].setSelected(True)
 
     def toggle_shadow(self):
         for item in self.scene.selectedItems():
-            if item.graphicsEffect(): item.setGraphicsEffect(None)
-            else:
-                s = QGraphicsDropShadowEffect(); s.setBlurRadius(15); s.setOffset(5, 5)
-                item.setGraphicsEffect(s)
-        self.view.viewport().update()
+            if not hasattr(item, 'set_shadow'): continue
+            if item.shadow is not None: item.set_shadow(None)
+            else: StyleManager.apply_shadow(item, blur=15, offset=5)
+
+    def align_selected(self, edge):
+        doc = self.scene.document
+        nodes = [i for i in self.scene.selectedItems() if getattr(i, 'doc_row', None) is not None]
+        if len(nodes) < 2: return
+        new_x, new_y = doc.aligned_positions(doc.rows_of(nodes), edge)
+        old = [(n.scenePos().x(), n.scenePos().y()) for n in nodes]
+        self.undo_stack.push(MoveNodesCommand(self.scene, nodes, old, zip(new_x.tolist(), new_y.tolist()),
+                                              "Alinhar Objetos"))
+
+    def auto_layout(self, mode):
+        if self.layout_runner.is_running(): return
+        sel = [i for i in self.scene.selectedItems() if isinstance(i, MindMapNode)]
+        self.statusBar().showMessage("Organizando o mapa...")
+        self.layout_runner.run(mode, root=sel[0] if sel else None)
+
+    def on_layout_finished(self, count, compute_ms):
+        self.statusBar().showMessage(f"Layout aplicado a {count} objetos (cálculo em {compute_ms:.0f} ms)")
+
+    def toggle_trace(self, on):
+        PerfMonitor.set_tracing(on)
+        if not on and not self.act_hud.isChecked():
+            PerfMonitor.set_enabled(False)
+        self.statusBar().showMessage("Gravando trace de desempenho..." if on else
+                                     f"Trace pausado ({len(PerfMonitor.events)} eventos)")
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Exportar Trace", "amarelo-trace.json", "Trace do Chrome (*.json)")
+        if not path: return
+        count = PerfMonitor.export_trace(path)
+        self.statusBar().showMessage(f"Trace exportado: {path} ({count} eventos; abra em chrome://tracing ou ui.perfetto.dev)")
+
+    def export_image(self, selection_only=False):
+        rect = export_rect(self.scene, selection_only)
+        if rect.isEmpty():
+            self.statusBar().showMessage("Nada a exportar")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Exportar", "mapa.png",
+                                              "Imagem PNG (*.png);;SVG (*.svg);;PDF (*.pdf)")
+        if not path: return
+        if os.path.splitext(path)[1].lower() not in (".png", ".svg", ".pdf"):
+            path += ".png"
+        dpi, ok = QInputDialog.getInt(self, "Exportar", "Resolução (DPI):", 150, 24, 2400, 1)
+        if not ok: return
+
+        exporter = MapExporter(self.scene, rect, dpi=dpi)
+        progress = QProgressDialog("Exportando...", "Cancelar", 0, 1000, self)
+        progress.setWindowTitle("Exportar")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(400)
+
+        def step(done, total):
+            # A cena só pode ser desenhada nesta thread: o diálogo responde entre as faixas
+            progress.setValue(int(done * 1000 / total))
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
+        started = time.perf_counter()
+        try:
+            exporter.export(path, step)
+        except ExportCanceled:
+            self.statusBar().showMessage("Exportação cancelada")
+            return
+        except Exception as e:
+            self.statusBar().showMessage(f"Erro ao exportar {path}: {e}")
+            return
+        finally:
+            progress.reset()
+        w, h = exporter.pixel_size()
+        self.statusBar().showMessage(f"Exportado: {path} ({w}x{h} px, {dpi} DPI, "
+                                     f"{time.perf_counter() - started:.1f} s)")
 
     def connect_nodes(self):
         sel = self.scene.selectedItems()
         if len(sel) >= 2:
             try:
                 conn = SmartConnection(sel[0], sel[1])
-                self.scene.addItem(conn)
+                self.undo_stack.push(ConnectCommand(self.scene, conn))
             except: pass
 
+    def group_selected(self):
+        sel = [i for i in self.scene.selectedItems() if isinstance(i, (MindMapNode, GroupNode))]
+        if sel:
+            self.undo_stack.push(GroupCommand(self.scene, sel))
+
+    def ungroup_selected(self):
+        groups = [i for i in self.scene.selectedItems() if isinstance(i, GroupNode)]
+        if groups:
+            self.undo_stack.push(UngroupCommand(self.scene, groups))
+
+    def toggle_groups(self):
+        # Grupo selecionado ou o grupo de um nó selecionado
+        groups = {}
+        for item in self.scene.selectedItems():
+            group = item if isinstance(item, GroupNode) else item.parentItem()
+            if isinstance(group, GroupNode):
+                groups[group] = None
+        for group in groups:
+            group.set_collapsed(not group.collapsed)
+
+    def toggle_branches(self):
+        nodes = [i for i in self.scene.selectedItems() if isinstance(i, MindMapNode)]
+        if nodes:
+            self.scene.folding.toggle(nodes)
+
+    def expand_all_branches(self):
+        folded = self.scene.folding.folded_ids()
+        if folded:
+            self.scene.folding.push(folded, False, "Expandir Tudo")
+
     def delete_sel(self):
-        for i in self.scene.selectedItems(): self.scene.removeItem(i)
+        # Remove também as conexões dos nós excluídos (sem deixar linhas órfãs)
+        sel = self.scene.selectedItems()
+        if sel:
+            self.undo_stack.push(DeleteCommand(self.scene, sel))
 
 if __name__ == "__main__":
     app = QApplication(sys.argv); win = AmareloMainWindow(); win.show(); sys.exit(app.exec())
\ No newline at end of file